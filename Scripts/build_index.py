@@ -3,10 +3,33 @@
 # from src.core.embedding import get_embed_texts, get_embedding_model
 # from src.core.faiss_manager import create_faiss_index_from_vectors
 
+import argparse
+from src.core.observability import configure_logging
 from src.core.pipeline import run_indexing_pipeline
 
 if __name__ == "__main__":
-    run_indexing_pipeline(region="Occitanie")
+    parser = argparse.ArgumentParser(description="Construit l'index FAISS des événements.")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Met à jour l'index existant avec les seuls événements modifiés depuis la dernière exécution."
+    )
+    parser.add_argument(
+        "--allow-partial", action="store_true",
+        help="Construit l'index même si certains chunks n'ont pas pu être embeddés."
+    )
+    parser.add_argument(
+        "--index-factory", default="Flat",
+        help="Type d'index FAISS (ex : Flat, IVF1024,Flat, HNSW32, IVF1024,PQ64)."
+    )
+    args = parser.parse_args()
+    configure_logging()
+
+    run_indexing_pipeline(
+        region="Occitanie",
+        incremental=args.incremental,
+        allow_partial=args.allow_partial,
+        index_factory=args.index_factory
+    )
     # # Étape 1 : Initialise le modèle d'embedding une seule fois
     # embedding_model = get_embedding_model()
 
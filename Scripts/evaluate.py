@@ -1,23 +1,38 @@
 import os
 import sys
 from dotenv import load_dotenv
-from datasets import Dataset
-from ragas import evaluate
-from ragas.metrics import (
-    faithfulness,
-    answer_relevancy,
-    context_precision,
-    context_recall,
-)
 
 # Importer les fonctions de votre chatbot
 from src.core.chatbot import create_rag_chain, get_retriever, create_prompt_template
 from src.core.embedding import get_embedding_model
 from langchain_mistralai.chat_models import ChatMistralAI
 
+# Jeu de test, aussi utilisé hors ligne par benchmarks/bench_hybrid_retrieval.py
+# Pour Ragas, nous avons besoin de 'question' et 'ground_truth' (réponse de référence)
+EVAL_QUESTIONS = [
+    "Je cherche un atelier créatif pour les enfants à Toulouse",
+    "Y a-t-il des expositions d'art en Occitanie ?",
+    "Est ce qu'il y a eu des visites de cave à vin à Vézénobres ?",
+    "Quel événement de noël est prévu à Montpellier en décembre 2025 ?"
+]
+EVAL_GROUND_TRUTHS = [
+    "L'Atelier créatif et l'Atelier Les petits créateurs sont deux options à Toulouse pour les enfants.",
+    "Oui, il y a plusieurs expositions, notamment sur des thèmes comme l'art contemporain.",
+    "Oui, il y a eu des visites de cave à vin à Vézénobres dans le cadre des Journées du Patrimoine",
+    "Je n'ai pas trouvé d'information spécifique relative à un événement de noël à Montpellier pour la période de décembre 2025."
+]
+
 def run_ragas_evaluation():
     """Prépare les données et lance l'évaluation avec Ragas."""
-    
+    from datasets import Dataset
+    from ragas import evaluate
+    from ragas.metrics import (
+        faithfulness,
+        answer_relevancy,
+        context_precision,
+        context_recall,
+    )
+
     # --- 1. Préparation de la chaîne RAG ---
     embedding_model = get_embedding_model()
     retriever = get_retriever(embedding_model)
@@ -25,20 +40,9 @@ def run_ragas_evaluation():
     prompt = create_prompt_template()
     rag_chain = create_rag_chain(retriever, prompt, embedding_model)
 
-    # --- 2. Création du jeu de données de test ---
-    # Pour Ragas, nous avons besoin de 'question' et 'ground_truth' (réponse de référence)
-    eval_questions = [
-        "Je cherche un atelier créatif pour les enfants à Toulouse",
-        "Y a-t-il des expositions d'art en Occitanie ?",
-        "Est ce qu'il y a eu des visites de cave à vin à Vézénobres ?",
-        "Quel événement de noël est prévu à Montpellier en décembre 2025 ?"
-    ]
-    eval_ground_truths = [
-        "L'Atelier créatif et l'Atelier Les petits créateurs sont deux options à Toulouse pour les enfants.",
-        "Oui, il y a plusieurs expositions, notamment sur des thèmes comme l'art contemporain.",
-        "Oui, il y a eu des visites de cave à vin à Vézénobres dans le cadre des Journées du Patrimoine",
-        "Je n'ai pas trouvé d'information spécifique relative à un événement de noël à Montpellier pour la période de décembre 2025."
-    ]
+    # --- 2. Jeu de données de test ---
+    eval_questions = EVAL_QUESTIONS
+    eval_ground_truths = EVAL_GROUND_TRUTHS
 
     # --- 3. Générer les réponses et récupérer le contexte pour chaque question ---
     answers = []
@@ -0,0 +1,95 @@
+from langchain_core.runnables import RunnableLambda
+from src.core.answer_cache import AnswerCache, normalize_question
+from src.core.metadata_index import SearchFilters
+from src.core.rag_service import RAGService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_answer_cache_exact_semantic_ttl_and_lru():
+    """
+    Vérifie les deux niveaux du cache (question normalisée, puis similarité
+    cosinus), l'expiration, l'éviction LRU et les compteurs.
+    """
+    clock = FakeClock()
+    cache = AnswerCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.9, clock=clock)
+
+    assert normalize_question("  Expositions   d'ART ?") == "expositions d'art"
+
+    cache.put("Expositions d'art ?", "Réponse art", vector=[1.0, 0.0])
+    assert cache.get("expositions  d'art") == "Réponse art"
+
+    # Niveau sémantique : cos = 0.995 au-dessus du seuil, cos = 0.707 en dessous
+    assert cache.get("Des expos d'art ?") is None
+    assert cache.get_similar([1.0, 0.1]) == "Réponse art"
+    assert cache.get_similar([1.0, 1.0]) is None
+
+    # LRU : "art" vient d'être utilisée, "cinéma" est évincée par "danse"
+    cache.put("Cinéma", "Réponse cinéma", vector=[0.0, 1.0])
+    cache.get("Expositions d'art")
+    cache.put("Danse", "Réponse danse", vector=[-1.0, 0.0])
+    assert cache.get("Cinéma") is None and cache.get_similar([0.0, 1.0]) is None
+
+    # TTL
+    clock.now = 61
+    assert cache.get("Expositions d'art") is None
+    assert cache.get_similar([1.0, 0.0]) is None
+
+    assert cache.stats() == {"entries": 0, "exact_hits": 2, "semantic_hits": 1, "misses": 3, "hit_rate": 0.5}
+
+
+def test_rag_service_serves_cached_answers_until_reload(mocker):
+    """
+    Vérifie que RAGService n'interroge la chaîne qu'une fois par question
+    (même reformulée) et que le rechargement réussi de l'index vide le cache.
+    """
+    calls = []
+    service = RAGService(load=False, answer_cache=AnswerCache(similarity_threshold=0.9))
+    service.rag_chain = RunnableLambda(lambda question: calls.append(question) or f"Réponse {len(calls)}")
+    service.query_embedder = mocker.Mock()
+    service.query_embedder.embed_query.side_effect = lambda question: [1.0, 0.05] if "atelier" in question.lower() else [0.0, 1.0]
+
+    assert service.ask("Atelier enfants Toulouse ?") == "Réponse 1"
+    assert service.ask("atelier enfants toulouse") == "Réponse 1"
+    assert service.ask("Un atelier pour enfants à Toulouse") == "Réponse 1"
+    assert service.ask("Concerts ce week-end") == "Réponse 2"
+    assert len(calls) == 2
+
+    # Un rechargement en échec laisse l'ancien index en service, avec ses réponses en cache
+    mocker.patch('src.core.rag_service.get_embedding_model', side_effect=ValueError("pas de clé"))
+    assert not service.load_components()
+    assert len(service.answer_cache) == 2
+
+    mocker.patch('src.core.rag_service.get_embedding_model', return_value=mocker.Mock())
+    mocker.patch('src.core.rag_service.load_faiss_index')
+    mocker.patch('src.core.rag_service.create_llm')
+    mocker.patch('src.core.rag_service.create_rag_chain')
+    assert service.load_components()
+    assert len(service.answer_cache) == 0
+
+
+def test_semantic_cache_does_not_mix_questions_with_different_filters(mocker):
+    """Deux questions proches mais sur deux villes différentes ne partagent pas leur réponse."""
+    calls = []
+    service = RAGService(load=False, answer_cache=AnswerCache(similarity_threshold=0.9))
+    service.rag_chain = RunnableLambda(lambda question: calls.append(question) or f"Réponse {len(calls)}")
+    service.query_embedder = mocker.Mock()
+    service.query_embedder.embed_query.return_value = [1.0, 0.0]
+    service.retriever = mocker.Mock()
+    service.retriever.filters_for.side_effect = lambda question: SearchFilters(city="albi" if "Albi" in question else "toulouse")
+
+    assert service.ask("Concerts à Toulouse en décembre ?") == "Réponse 1"
+    assert service.ask("Des concerts à Toulouse en décembre") == "Réponse 1"
+    assert service.ask("Concerts à Albi en décembre ?") == "Réponse 2"
+
+
+def test_exact_only_lookups_count_their_misses():
+    cache = AnswerCache(similarity_threshold=0.9)
+    assert cache.get("Question filtrée", exact_only=True) is None
+    assert cache.stats()["misses"] == 1
@@ -70,6 +70,202 @@ def test_ask_endpoint_empty_query():
     assert response.status_code == 400
     assert "La question ne peut pas être vide" in response.json()["detail"]
 
+def test_ask_endpoint_runs_questions_concurrently(mocker):
+    """
+    Vérifie que /ask n'est pas bloquant : plusieurs questions sont traitées
+    en parallèle, dans la limite du sémaphore du service.
+    """
+    import asyncio
+    import time
+    import httpx
+    from langchain_core.runnables import RunnableLambda
+    from src.core.rag_service import RAGService
+
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    async def slow_chain(question):
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(0.1)
+        state["in_flight"] -= 1
+        return f"Réponse à : {question}"
+
+    service = RAGService(max_concurrency=3, load=False)
+    service.rag_chain = RunnableLambda(slow_chain)
+    mocker.patch('src.api.main.rag_service', service)
+
+    async def ask_many():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post("/ask", json={"question": f"Question {i}"}) for i in range(6)
+            ))
+
+    start = time.perf_counter()
+    responses = asyncio.run(ask_many())
+    elapsed = time.perf_counter() - start
+
+    assert [r.json()["answer"] for r in responses] == [f"Réponse à : Question {i}" for i in range(6)]
+    assert state["max_in_flight"] == 3
+    # 2 vagues de 3 questions, au lieu de 6 questions l'une après l'autre
+    assert elapsed < 0.5
+
+def test_ask_stream_endpoint_sends_sources_then_tokens(mocker):
+    """
+    Vérifie que /ask/stream envoie d'abord les sources, puis la réponse
+    fragment par fragment, au format NDJSON.
+    """
+    import json
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+    from src.core.chatbot import create_prompt_template, create_generation_chain
+    from src.core.rag_service import RAGService
+
+    docs = [Document(page_content="Concert de jazz.", metadata={'titre': "Jazz", 'ville': "Albi", 'date_fin': float('nan')})]
+    service = RAGService(load=False)
+    service.retriever = RunnableLambda(lambda question: docs)
+    service.generation_chain = create_generation_chain(
+        create_prompt_template(),
+        GenericFakeChatModel(messages=iter([AIMessage(content="Un concert de jazz à Albi.")]))
+    )
+    mocker.patch('src.api.main.rag_service', service)
+
+    response = client.post("/ask/stream", json={"question": "Du jazz ?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0]["type"] == "sources"
+    assert events[0]["sources"][0]["titre"] == "Jazz"
+    assert events[0]["sources"][0]["date_fin"] is None
+    tokens = [event["content"] for event in events[1:-1]]
+    assert all(event["type"] == "token" for event in events[1:-1]) and len(tokens) > 1
+    assert "".join(tokens) == "Un concert de jazz à Albi."
+    assert events[-1] == {"type": "done"}
+
+def test_ask_batch_endpoint_returns_ordered_answers_and_item_errors(mocker, tmp_path):
+    """
+    Vérifie que /ask/batch embedde toutes les questions en un seul appel,
+    renvoie les réponses dans l'ordre et isole les erreurs par question.
+    """
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from langchain_core.runnables import RunnableLambda
+    from src.core.faiss_manager import add_vectors_to_index
+    from src.core.query_embedder import QueryEmbedder
+    from src.core.rag_service import RAGService
+    from src.core.retrieval import EventRetriever
+
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = ["Concert de jazz à Albi.", "Atelier poterie pour enfants.", "Exposition de peinture."]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), None, embedding_model)
+
+    def generate(inputs):
+        if "panne" in inputs["question"]:
+            raise RuntimeError("LLM indisponible")
+        return f"{inputs['question']} -> {inputs['context'].splitlines()[0]}"
+
+    service = RAGService(load=False)
+    service.query_embedder = QueryEmbedder(embedding_model)
+    service.vectorstore = vectorstore
+    service.retriever = EventRetriever(vectorstore=vectorstore, k=1)
+    service.generation_chain = RunnableLambda(generate)
+    service.rag_chain = RunnableLambda(lambda question: None)
+    mocker.patch('src.api.main.rag_service', service)
+
+    questions = [texts[2], "En panne ?", "   ", texts[0]]
+    response = client.post("/ask/batch", json={"questions": questions})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["question"] for r in results] == questions
+    assert results[0] == {"question": texts[2], "answer": f"{texts[2]} -> {texts[2]}", "error": None}
+    assert results[1]["answer"] is None and "LLM indisponible" in results[1]["error"]
+    assert results[2]["error"] == "La question ne peut pas être vide."
+    assert results[3]["answer"] == f"{texts[0]} -> {texts[0]}"
+    assert service.query_embedder.stats["upstream_calls"] == 1
+
+    # Les réponses réussies sont en cache ; la question en échec est retentée
+    response = client.post("/ask/batch", json={"questions": [texts[0], "En panne ?"]})
+    assert response.json()["results"][0]["answer"] == f"{texts[0]} -> {texts[0]}"
+    assert service.query_embedder.stats["upstream_calls"] == 1
+    assert client.post("/ask/batch", json={"questions": []}).status_code == 422
+
+def test_ask_endpoint_forwards_filters(mocker):
+    """Vérifie que /ask transmet les filtres au service et refuse une période inversée."""
+    from datetime import date
+    from src.core.metadata_index import SearchFilters
+
+    service = mocker.Mock()
+    service.aask = mocker.AsyncMock(return_value="Un concert.")
+    mocker.patch('src.api.main.rag_service', service)
+
+    response = client.post("/ask", json={
+        "question": "Des concerts ?",
+        "filters": {"city": "Albi", "date_from": "2025-12-01", "date_to": "2025-12-31"}
+    })
+    assert response.status_code == 200
+    service.aask.assert_awaited_once_with(
+        "Des concerts ?", SearchFilters(city="Albi", date_from=date(2025, 12, 1), date_to=date(2025, 12, 31))
+    )
+
+    response = client.post("/ask", json={
+        "question": "Des concerts ?", "filters": {"date_from": "2025-12-31", "date_to": "2025-12-01"}
+    })
+    assert response.status_code == 400
+
+def test_rollback_is_refused_while_a_rebuild_is_running(mocker):
+    """Vérifie que /index/rollback répond 409, sans toucher à l'index, tant qu'une reconstruction est en cours."""
+    service = mocker.Mock()
+    service.rollback_index.return_value = "20250101-030000-000000"
+    mocker.patch('src.api.main.rag_service', service)
+    jobs = mocker.Mock()
+    jobs.active.return_value = {"job_id": "abc123", "status": "running"}
+    mocker.patch('src.api.main.rebuild_jobs', jobs)
+
+    response = client.post("/index/rollback")
+    assert response.status_code == 409
+    assert "abc123" in response.json()["detail"]
+    service.rollback_index.assert_not_called()
+
+    jobs.active.return_value = None
+    response = client.post("/index/rollback")
+    assert response.status_code == 200
+    assert response.json()["version"] == "20250101-030000-000000"
+
+def test_metrics_endpoint_exposes_stage_latencies(mocker):
+    """Vérifie que /metrics expose, au format Prometheus, les durées des étapes d'une question et des requêtes."""
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from src.core.chatbot import create_prompt_template, create_generation_chain
+    from src.core.faiss_manager import add_vectors_to_index
+    from src.core.observability import LLMMetricsCallback
+    from src.core.rag_service import RAGService
+    from src.core.retrieval import EventRetriever
+
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = ["Concert de jazz à Albi.", "Atelier poterie pour enfants."]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), None, embedding_model)
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content="Un concert de jazz.")]), callbacks=[LLMMetricsCallback()])
+
+    service = RAGService(load=False)
+    service.retriever = EventRetriever(vectorstore=vectorstore, k=1)
+    service.generation_chain = create_generation_chain(create_prompt_template(), llm)
+    mocker.patch('src.api.main.rag_service', service)
+    assert client.post("/ask/stream", json={"question": "Du jazz ?"}).status_code == 200
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    for stage in ("embed_query", "search", "build_context", "generate"):
+        assert any(line.startswith(f'rag_stage_seconds_count{{stage="{stage}"}}') for line in lines), stage
+    assert any(line.startswith('rag_http_request_seconds_count{method="POST",route="/ask/stream",status="200"}') for line in lines)
+    assert "# TYPE rag_index_chunks gauge" in lines
+
 # if __name__ == "__main__":
 #     # Assurez-vous que l'API est lancée (uvicorn src.api.main:app)
     
@@ -0,0 +1,39 @@
+import asyncio
+from langchain_core.messages import HumanMessage
+from benchmarks.fakes import FakeChatMistral, FakeMistralEmbeddings
+from benchmarks.run import compare, run
+from benchmarks.synthetic import make_openagenda_records
+from src.api import main
+from src.core.processing import clean_df, filter_and_dedup, list_to_df
+
+
+def test_fake_backends_follow_the_mistral_interfaces():
+    embeddings = FakeMistralEmbeddings(size=32)
+    assert embeddings.embed_query("Concert à Albi") == asyncio.run(embeddings.aembed_documents(["Concert à Albi"]))[0]
+    assert (embeddings.calls, embeddings.texts) == (2, 2)
+
+    result = FakeChatMistral().generate([[HumanMessage(content="Contexte :\n### Concert de jazz (2025-07-01 | Albi)\nQuestion : ?")]])
+    assert result.generations[0][0].text == "Je vous recommande : Concert de jazz."
+    assert result.llm_output["token_usage"]["prompt_tokens"] > 0
+
+
+def test_synthetic_records_exercise_cleaning_and_dedup():
+    records = make_openagenda_records(200, seed=1)
+    assert records == make_openagenda_records(200, seed=1)
+    df = clean_df(list_to_df(records))
+    assert df['description_complete'].str.contains("<p>").sum() == 0
+    # Doublons et textes trop courts sont écartés
+    assert 0 < len(filter_and_dedup(df)) < len(df)
+
+
+def test_run_times_every_stage_and_compares_with_a_previous_run():
+    service = main.rag_service
+    report = run(n_events=60, dim=32, repeats=1, n_questions=5)
+    assert main.rag_service is service  # le service de l'API est rétabli
+    assert [row["name"] for row in report["results"]] == [
+        "list_to_df", "clean_df", "filter_and_dedup", "create_chunks_with_metadata", "create_faiss_index_from_vectors",
+        "load_faiss_index[mmap=True]", "load_faiss_index[mmap=False]",
+        "retrieval.search_by_vector", "retrieval.search", "ask", "ask_cached",
+    ]
+    assert report["parameters"]["n_events"] == 60 and report["corpus"]["chunks"] > 0
+    assert [row["change"] for row in compare(report, report)][:1] == ["+0.0%"]
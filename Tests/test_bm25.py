@@ -0,0 +1,59 @@
+import numpy as np
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.core.bm25 import BM25Index, tokenize, reciprocal_rank_fusion
+from src.core.faiss_manager import add_vectors_to_index, save_faiss_index, load_faiss_index
+from src.core.retrieval import EventRetriever, load_bm25_index
+
+TEXTS = [
+    "Concert de jazz à Toulouse, en plein air.",
+    "Exposition d'art contemporain à Montpellier.",
+    "Visites de caves à vin à Vézénobres pour les Journées du Patrimoine.",
+    "Atelier créatif pour les enfants à Toulouse.",
+    "Marché de Noël à Montpellier.",
+]
+
+
+def test_tokenize_normalizes_accents_stopwords_and_plurals():
+    assert tokenize("Les Visites de caves à Vézénobres !") == ["visite", "cave", "vezenobre"]
+
+
+def test_bm25_ranks_documents_sharing_rare_terms_first(tmp_path):
+    """Vérifie le classement BM25, le masque de positions et la sauvegarde compacte de l'index."""
+    bm25 = BM25Index.build(TEXTS)
+
+    positions, scores = bm25.search("Une cave à vin à Vézénobres ?", k=3)
+    assert positions.tolist() == [2]
+    assert scores[0] > 0
+    positions, _ = bm25.search("Quoi faire à Toulouse ?", k=3)
+    assert sorted(positions.tolist()) == [0, 3]
+    mask = np.array([True, False, False, False, False])
+    assert bm25.search("Quoi faire à Toulouse ?", k=3, mask=mask)[0].tolist() == [0]
+    assert len(bm25.search("Rien de connu", k=3)[0]) == 0
+
+    bm25.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.scores("vin Vézénobres").tolist() == bm25.scores("vin Vézénobres").tolist()
+    assert BM25Index.load(str(tmp_path / "absent")) is None
+
+
+def test_reciprocal_rank_fusion_favours_documents_found_by_both_rankings():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]], k=2) == [1, 3]
+
+
+def test_hybrid_retriever_finds_proper_nouns_missed_by_the_vector_search(tmp_path):
+    """
+    Avec des embeddings sans rapport avec le sens des textes, seule la
+    recherche lexicale retrouve le chunk de Vézénobres ; l'index BM25 est
+    sauvegardé avec l'index FAISS.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    vectorstore = add_vectors_to_index(None, TEXTS, embedding_model.embed_documents(TEXTS), None, embedding_model, index_factory="Flat")
+    save_faiss_index(vectorstore, str(tmp_path))
+    vectorstore = load_faiss_index(embedding_model, str(tmp_path), mmap=True)
+
+    question = "Est ce qu'il y a eu des visites de cave à vin à Vézénobres ?"
+    hybrid = EventRetriever(vectorstore=vectorstore, bm25=load_bm25_index(vectorstore, str(tmp_path)), k=1)
+
+    assert "Vézénobres" in hybrid.invoke(question)[0].page_content
+    docs = hybrid.search_many([embedding_model.embed_query(question)] * 2, None, [question, "Marché de Noël"])
+    assert "Vézénobres" in docs[0][0].page_content and "Noël" in docs[1][0].page_content
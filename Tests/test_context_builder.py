@@ -0,0 +1,65 @@
+from langchain_core.documents import Document
+from src.core.chatbot import format_docs
+from src.core.context_builder import ContextBuilder, metadata_line, trim_overlap
+from src.core.embedding import estimate_tokens
+
+EVENT = {'id': "42", 'titre': "Festival de jazz", 'ville': "Toulouse", 'url': "https://openagenda.com/e/42",
+         'date_debut': "2025-07-10T20:00:00+00:00", 'date_fin': "2025-07-12T23:00:00+00:00"}
+
+
+def chunk(metadata: dict, number: int, text: str) -> Document:
+    return Document(page_content=text, metadata={**metadata, 'chunk_id': f"{metadata['id']}_{number}"})
+
+
+def test_trim_overlap_removes_the_repeated_prefix_only():
+    previous = "Trois soirées de concerts en plein air sur la place du Capitole."
+    assert trim_overlap(previous, "en plein air sur la place du Capitole. Entrée libre.") == "Entrée libre."
+    # Un recouvrement trop court n'est pas retiré
+    assert trim_overlap(previous, "e. Entrée libre.") == "e. Entrée libre."
+
+
+def test_context_groups_chunks_by_event_under_a_metadata_line():
+    """
+    Vérifie l'en-tête de l'événement, l'ordre des chunks, la suppression du
+    chevauchement, du titre et de la ville répétés, et un contexte plus court
+    que la simple concaténation.
+    """
+    docs = [
+        chunk(EVENT, 1, "sur la place du Capitole, avec des artistes locaux. Entrée libre . Toulouse"),
+        chunk({'id': "7", 'titre': "Marché de Noël"}, 0, "Marché de Noël . Chalets et vin chaud."),
+        chunk(EVENT, 0, "Festival de jazz . Trois soirées de concerts sur la place du Capitole, avec des artistes"),
+    ]
+    context = ContextBuilder(max_tokens=1000)(docs)
+
+    assert context.split("\n\n") == [
+        "### Festival de jazz (2025-07-10 → 2025-07-12 | Toulouse | openagenda.com/e/42)\n"
+        "Trois soirées de concerts sur la place du Capitole, avec des artistes\n"
+        "locaux. Entrée libre",
+        "### Marché de Noël\nChalets et vin chaud.",
+    ]
+    assert estimate_tokens(context) < estimate_tokens(format_docs(docs)) + estimate_tokens(metadata_line(EVENT))
+
+
+def test_context_respects_the_token_budget():
+    """
+    Les chunks qui ne tiennent pas sont écartés, ou réduits à leurs premières
+    phrases ; le plus pertinent est tronqué si besoin. Une phrase déjà dans
+    le contexte n'est pas répétée.
+    """
+    docs = [
+        chunk({'id': str(i)}, 0, f"Événement {i}. " + " ".join(f"Phrase {j} de l'événement {i}." for j in range(12)))
+        for i in range(5)
+    ]
+    context = ContextBuilder(max_tokens=330)(docs)
+    assert estimate_tokens(context) <= 330
+    assert "Phrase 11 de l'événement 1." in context
+    # Seul le début du troisième chunk tient dans la place restante
+    assert "Phrase 0 de l'événement 2." in context and "Phrase 11 de l'événement 2." not in context
+    assert "Événement 3" not in context
+
+    context = ContextBuilder(max_tokens=50)(docs)
+    assert context.startswith("Événement 0") and estimate_tokens(context) <= 50
+    assert ContextBuilder()([]) == ""
+
+    repeated = [chunk({'id': str(i)}, 0, "Entrée libre sur réservation auprès de l'office de tourisme. " + f"Lieu {i}.") for i in range(2)]
+    assert ContextBuilder()(repeated).count("Entrée libre") == 1
@@ -1,6 +1,7 @@
+import logging
 import pytest
 import requests
-from src.core.data_loader import fetch_events # On importe la fonction à tester
+from src.core.data_loader import fetch_events, build_where_clause, FetchError # On importe les fonctions à tester
 
 def test_fetch_events_success_with_pagination(mocker):
     """
@@ -42,7 +43,7 @@ def test_fetch_events_success_with_pagination(mocker):
     assert events[0]['id'] == 'evt1'
     assert events[2]['id'] == 'evt3'
 
-def test_fetch_events_no_events_found(mocker, capsys):
+def test_fetch_events_no_events_found(mocker, caplog):
     """
     Teste le cas où l'API répond qu'il n'y a aucun événement.
     """
@@ -55,16 +56,16 @@ def test_fetch_events_no_events_found(mocker, capsys):
     mocker.patch('requests.get', return_value=mock_response_empty)
     
     # 3. Exécution
+    caplog.set_level(logging.INFO)
     events = fetch_events(region="Occitanie")
     
     # 4. Vérification
     assert len(events) == 0, "Doit retourner une liste vide."
     
-    # On vérifie aussi que le message correct a été affiché
-    captured = capsys.readouterr()
-    assert "Aucun événement trouvé." in captured.out
+    # On vérifie aussi que le message correct a été journalisé
+    assert "Aucun événement trouvé." in caplog.text
 
-def test_fetch_events_http_error(mocker, capsys):
+def test_fetch_events_http_error(mocker, caplog):
     """
     Teste la gestion d'une erreur HTTP (ex: 404, 500)
     """
@@ -86,14 +87,13 @@ def test_fetch_events_http_error(mocker, capsys):
     
     # 5. Vérification
     assert len(events) == 0, "Doit retourner une liste vide en cas d'erreur HTTP."
-    captured = capsys.readouterr()
     
-    # On vérifie que les deux prints de notre bloc except sont bien passés
-    assert "URL de la requête qui a échoué : http://fake-url-that-failed.com" in captured.out
-    assert 'Contenu de la réponse : {"error": "Not Found"}' in captured.out
+    # On vérifie que les deux messages de notre bloc except ont bien été journalisés
+    assert "URL de la requête qui a échoué : http://fake-url-that-failed.com" in caplog.text
+    assert 'Contenu de la réponse : {"error": "Not Found"}' in caplog.text
 
 
-def test_fetch_events_network_error(mocker, capsys):
+def test_fetch_events_network_error(mocker, caplog):
     """
     Teste la gestion d'une erreur réseau (ex: Timeout)
     """
@@ -105,5 +105,114 @@ def test_fetch_events_network_error(mocker, capsys):
     events = fetch_events(region="Occitanie")
     
     assert len(events) == 0
-    captured = capsys.readouterr()
-    assert "Erreur réseau: Connection Timeout" in captured.out
\ No newline at end of file
+    assert "Erreur réseau: Connection Timeout" in caplog.text
+
+def test_fetch_events_strict_raises_on_network_error(mocker):
+    """En mode strict (mises à jour incrémentales), une récupération interrompue n'est pas silencieuse."""
+    mocker.patch('requests.get', side_effect=requests.exceptions.RequestException("Connection Timeout"))
+
+    with pytest.raises(FetchError) as excinfo:
+        fetch_events(region="Occitanie", strict=True)
+    assert excinfo.value.failed_offsets == [0]
+
+
+def test_where_clause_also_selects_events_entering_the_window():
+    where = build_where_clause("Occitanie", updated_since="2025-01-03", entered_after="2026-01-01")
+    assert "(updatedat > date'2025-01-03' OR firstdate_begin > date'2026-01-01')" in where
+
+# --- Tests du mode parallèle contre un faux serveur local ---
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import time
+from src.core.data_loader import fetch_events_concurrent, iter_event_pages
+
+
+@pytest.fixture
+def fake_openagenda_server():
+    """
+    Démarre un petit serveur HTTP local qui imite l'API Open Agenda :
+    250 événements, servis par pages selon 'limit' et 'offset'.
+    'failures' indique combien de fois chaque offset doit répondre 503.
+    """
+    events = [{'uid': f'evt{i}'} for i in range(250)]
+    state = {'failures': {}, 'requested_offsets': []}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            offset = int(query['offset'][0])
+            limit = int(query['limit'][0])
+            with lock:
+                state['requested_offsets'].append(offset)
+                remaining_failures = state['failures'].get(offset, 0)
+                if remaining_failures:
+                    state['failures'][offset] = remaining_failures - 1
+
+            if remaining_failures:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            body = json.dumps({'total_count': len(events), 'results': events[offset:offset + limit]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/records", state
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_events_concurrent_retries_transient_errors(fake_openagenda_server):
+    """Les pages sont toutes récupérées, dans l'ordre, malgré une erreur 503 passagère."""
+    api_url, state = fake_openagenda_server
+    state['failures'] = {200: 1}
+
+    events = fetch_events_concurrent("Occitanie", api_url=api_url, max_workers=3, backoff_factor=0)
+
+    assert [e['uid'] for e in events] == [f'evt{i}' for i in range(250)]
+    assert state['requested_offsets'].count(200) == 2
+
+
+def test_fetch_events_concurrent_resumes_from_checkpoint(fake_openagenda_server, tmp_path):
+    """Une récupération interrompue lève FetchError puis reprend sans retélécharger les pages finies."""
+    api_url, state = fake_openagenda_server
+    state['failures'] = {100: 10}
+
+    with pytest.raises(FetchError) as exc_info:
+        fetch_events_concurrent("Occitanie", api_url=api_url, max_retries=1, backoff_factor=0, checkpoint_dir=str(tmp_path))
+    assert exc_info.value.failed_offsets == [100]
+
+    # Le serveur est rétabli : seule la page manquante doit être redemandée
+    state['failures'] = {}
+    state['requested_offsets'] = []
+    events = fetch_events_concurrent("Occitanie", api_url=api_url, backoff_factor=0, checkpoint_dir=str(tmp_path))
+
+    assert len(events) == 250
+    assert state['requested_offsets'] == [100]
+    assert not any(p.name.startswith('page_') for p in tmp_path.iterdir())
+
+
+def test_concurrent_pages_are_fetched_within_a_bounded_window(fake_openagenda_server, mocker):
+    """Un consommateur lent ne laisse pas les pages s'accumuler : au plus 2 x max_workers d'avance."""
+    api_url, state = fake_openagenda_server
+    mocker.patch('src.core.data_loader.LIMIT_PER_PAGE', 10)
+
+    pages = iter_event_pages("Occitanie", concurrent=True, api_url=api_url, max_workers=2, backoff_factor=0)
+    first_page = next(pages)
+    time.sleep(0.2)  # le pool aurait eu le temps de télécharger les 25 pages
+    assert len(state['requested_offsets']) <= 1 + 2 * 2
+
+    events = first_page + [event for page in pages for event in page]
+    assert [e['uid'] for e in events] == [f'evt{i}' for i in range(250)]
@@ -0,0 +1,69 @@
+import faiss
+import numpy as np
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.core.diversity import collapse_by_event, maximal_marginal_relevance, reconstruct_vectors
+from src.core.faiss_manager import add_vectors_to_index, save_faiss_index, load_faiss_index
+from src.core.metadata_index import MetadataIndex
+from src.core.retrieval import EventRetriever, load_metadata_index
+
+
+def test_collapse_by_event_keeps_the_best_chunk_of_each_event():
+    events = np.array([0, 0, 1, 1, 2])
+    assert collapse_by_event([1, 0, 3, 4, 2], events).tolist() == [1, 3, 4]
+
+
+def test_maximal_marginal_relevance_skips_near_duplicates():
+    """Le deuxième candidat, quasi identique au premier, passe après un candidat moins pertinent mais différent."""
+    vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+    relevance = np.array([0.9, 0.89, 0.5])
+    assert maximal_marginal_relevance(relevance, vectors, k=2, lambda_mult=0.5).tolist() == [0, 2]
+    assert maximal_marginal_relevance(relevance, vectors, k=2, lambda_mult=1.0).tolist() == [0, 1]
+    assert maximal_marginal_relevance(relevance, vectors, k=5).tolist() == [0, 2, 1]
+
+
+def test_retriever_returns_distinct_events(tmp_path):
+    """
+    Un long événement découpé en plusieurs chunks proches de la question
+    n'occupe qu'une place dans les résultats ; les codes d'événements sont
+    sauvegardés avec l'index des métadonnées.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    question_vector = np.array(embedding_model.embed_query("Festival de jazz"), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    # Événement 1 : cinq chunks presque identiques à la question ; événements 2 à 5 : un chunk chacun, plus éloigné
+    vectors = [question_vector + 0.01 * rng.standard_normal(16) for _ in range(5)]
+    vectors += [question_vector + 0.5 * rng.standard_normal(16) for _ in range(4)]
+    metadatas = [{'id': "1", 'chunk_id': f"1_{i}"} for i in range(5)]
+    metadatas += [{'id': str(event), 'chunk_id': f"{event}_0"} for event in range(2, 6)]
+    texts = [f"Chunk {m['chunk_id']}" for m in metadatas]
+    vectorstore = add_vectors_to_index(None, texts, np.array(vectors).tolist(), metadatas, embedding_model, index_factory="Flat")
+    save_faiss_index(vectorstore, str(tmp_path))
+    vectorstore = load_faiss_index(embedding_model, str(tmp_path), mmap=True)
+    metadata_index = load_metadata_index(vectorstore, str(tmp_path))
+    assert metadata_index.events.tolist() == MetadataIndex.from_metadatas(metadatas).events.tolist()
+
+    plain = EventRetriever(vectorstore=vectorstore, k=3, collapse_events=False, mmr_lambda=None)
+    assert {doc.metadata['id'] for doc in plain.search_by_vector(question_vector)} == {"1"}
+
+    retriever = EventRetriever(vectorstore=vectorstore, metadata_index=metadata_index, k=3)
+    docs = retriever.search_by_vector(question_vector)
+    assert len(docs) == 3 and len({doc.metadata['id'] for doc in docs}) == 3
+    assert docs[0].metadata['id'] == "1"
+
+
+def test_served_ivf_index_reconstructs_vectors_without_being_modified(tmp_path):
+    """La table position -> liste d'un index IVF est construite au chargement de l'index servi, pas pendant les requêtes."""
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = [f"Concert numéro {i}" for i in range(200)]
+    vectors = embedding_model.embed_documents(texts)
+    metadatas = [{'id': str(i), 'chunk_id': f"{i}_0"} for i in range(200)]
+    vectorstore = add_vectors_to_index(None, texts, vectors, metadatas, embedding_model, index_factory="IVF4,Flat")
+    assert reconstruct_vectors(vectorstore.index, [0, 1]) is None
+    save_faiss_index(vectorstore, str(tmp_path))
+
+    vectorstore = load_faiss_index(embedding_model, str(tmp_path), mmap=True)
+    assert faiss.extract_index_ivf(vectorstore.index).direct_map.type != faiss.DirectMap.NoMap
+    np.testing.assert_allclose(reconstruct_vectors(vectorstore.index, [3, 7]), np.array(vectors, dtype=np.float32)[[3, 7]], rtol=1e-6)
+
+    retriever = EventRetriever(vectorstore=vectorstore, k=3, mmr_lambda=0.7)
+    assert len(retriever.search_by_vector(np.array(vectors[5], dtype=np.float32))) == 3
@@ -1,6 +1,6 @@
 import pytest
 import time
-from src.core.embedding import get_embedding_model, get_embed_texts
+from src.core.embedding import get_embedding_model, get_embed_texts, failed_positions
 from langchain_mistralai import MistralAIEmbeddings
 
 # --- Test pour get_embedding_model ---
@@ -44,7 +44,7 @@ def test_get_embedding_model_failure_no_key(mocker):
 
 # --- Test pour get_embed_texts ---
 
-def test_get_embed_texts_multiple_batches(mocker, capsys):
+def test_get_embed_texts_multiple_batches(mocker, caplog):
     """
     Vérifie que la fonction traite les textes par lots, gère les pauses
     et les exceptions, et retourne la liste complète des vecteurs.
@@ -83,7 +83,8 @@ def test_get_embed_texts_multiple_batches(mocker, capsys):
     mock_model.embed_documents.side_effect = [
         [[0.1, 0.2]] * 50,         # Lot 1 (50 textes) -> Succès
         Exception("Erreur API"), # Lot 2 (50 textes) -> Échec
-        [[0.3, 0.4]] * 1           # Lot 3 (1 texte)  -> Succès
+        [[0.3, 0.4]] * 1,          # Lot 3 (1 texte)  -> Succès
+        [[0.5, 0.6]] * 50          # Lot 2, nouvelle tentative -> Succès
     ]
     
     # 4. Exécution
@@ -91,20 +92,40 @@ def test_get_embed_texts_multiple_batches(mocker, capsys):
     
     # 5. Vérification
     
-    # On doit avoir 51 vecteurs (50 du lot 1 + 1 du lot 3)
-    assert len(vectors) == 51
+    # Les vecteurs sont alignés sur les textes, le lot 2 ayant été retenté
+    assert len(vectors) == 101
     assert vectors[0] == [0.1, 0.2] # Vérifie le premier vecteur
-    assert vectors[50] == [0.3, 0.4] # Vérifie le dernier vecteur
+    assert vectors[50] == [0.5, 0.6] # Vérifie le lot retenté
+    assert vectors[100] == [0.3, 0.4] # Vérifie le dernier vecteur
     
-    # On vérifie que 'embed_documents' a été appelé 3 fois
-    assert mock_model.embed_documents.call_count == 3
+    # On vérifie que 'embed_documents' a été appelé 4 fois (3 lots + 1 nouvelle tentative)
+    assert mock_model.embed_documents.call_count == 4
     
-    # On vérifie que 'time.sleep' a été appelé 2 fois (pour les 2 lots réussis)
-    assert mock_sleep.call_count == 2
+    # On vérifie que 'time.sleep' a été appelé 3 fois (2 lots réussis + l'attente avant la nouvelle tentative)
+    assert mock_sleep.call_count == 3
     
-    # On vérifie que le message d'erreur a bien été affiché
-    captured = capsys.readouterr()
-    assert "Une erreur est survenue sur le lot 50-100: Erreur API" in captured.out
+    # On vérifie que le message d'erreur a bien été journalisé
+    assert "Une erreur est survenue sur le lot 50-100: Erreur API" in caplog.text
+
+def test_get_embed_texts_keeps_failed_positions(mocker):
+    """
+    Vérifie qu'un lot toujours en échec après les nouvelles tentatives laisse
+    des None à sa place, sans décaler les autres vecteurs, et que l'attente
+    entre les tentatives est exponentielle et plafonnée.
+    """
+    mock_model = mocker.Mock(spec=MistralAIEmbeddings)
+    mock_model.embed_documents.side_effect = lambda batch: (
+        [[1.0]] * len(batch) if len(batch) == 50 else (_ for _ in ()).throw(Exception("Erreur API"))
+    )
+    mock_sleep = mocker.patch('time.sleep')
+    mocker.patch('src.core.embedding.tqdm', lambda x, **kwargs: x)
+
+    vectors = get_embed_texts(["text"] * 52, mock_model, max_retries=3, backoff_base=2.0, max_backoff=5.0)
+
+    assert vectors[:50] == [[1.0]] * 50
+    assert failed_positions(vectors) == [50, 51]
+    # 1 pause après le lot réussi, puis 2 s, 4 s et 5 s (plafond) avant chaque tentative
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [1, 2.0, 4.0, 5.0]
 
 def test_get_embed_texts_empty_list(mocker):
     """Vérifie le comportement si la liste d'entrée est vide."""
@@ -116,4 +137,105 @@ def test_get_embed_texts_empty_list(mocker):
     
     assert len(vectors) == 0
     assert mock_model.embed_documents.call_count == 0
-    assert mock_sleep.call_count == 0
\ No newline at end of file
+    assert mock_sleep.call_count == 0
+
+# --- Test pour EmbeddingScheduler ---
+
+import threading
+from src.core.embedding_scheduler import EmbeddingScheduler
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class FakeRateLimitedEmbeddings:
+    """Faux backend d'embedding qui répond 429 au-delà de `limit` requêtes par fenêtre de `window` secondes."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            now = time.monotonic()
+            self.calls = [t for t in self.calls if now - t < self.window]
+            if len(self.calls) >= self.limit:
+                raise FakeRateLimitError("429 Too Many Requests")
+            self.calls.append(now)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return [[float(len(text))] for text in texts]
+
+
+def test_embedding_scheduler_respects_rate_limit():
+    """
+    Vérifie que le planificateur découpe par tokens, garde plusieurs lots en vol,
+    se remet des réponses 429 et renvoie des vecteurs alignés sur les textes.
+    """
+    texts = [f"texte numéro {i}" * (1 + i % 5) for i in range(60)]
+    backend = FakeRateLimitedEmbeddings(limit=4, window=0.1)
+    scheduler = EmbeddingScheduler(
+        requests_per_second=200, tokens_per_minute=10_000_000, max_in_flight=4,
+        max_batch_tokens=60, max_retries=10, backoff_base=0.01
+    )
+
+    vectors = scheduler.embed(texts, backend)
+
+    assert vectors == [[float(len(text))] for text in texts]
+    assert scheduler.stats["batches"] > 1
+    assert scheduler.stats["throttled"] > 0
+    assert scheduler.stats["failed_batches"] == 0
+    assert 1 < backend.max_in_flight <= 4
+    assert scheduler.stats["texts_per_second"] > 0
+
+
+# --- Test pour EmbeddingCache ---
+
+from src.core.embedding_cache import EmbeddingCache, get_embed_texts_cached
+
+
+def test_embedding_cache_only_embeds_misses(mocker, tmp_path):
+    """
+    Vérifie qu'après un premier passage, seuls les nouveaux textes sont envoyés
+    au modèle, que le cache survit au rechargement et que l'éviction LRU
+    respecte la taille maximale.
+    """
+    mocker.patch('time.sleep')
+    mocker.patch('src.core.embedding.tqdm', lambda x, **kwargs: x)
+    mock_model = mocker.Mock()
+    mock_model.embed_documents.side_effect = lambda batch: [[float(len(t)), 1.0] for t in batch]
+
+    cache = EmbeddingCache(str(tmp_path), model_name="mistral-embed")
+    get_embed_texts_cached(["a", "bb"], mock_model, cache)
+    cache.save()
+
+    # Nouveau processus : le cache est relu depuis le disque
+    cache = EmbeddingCache(str(tmp_path), model_name="mistral-embed")
+    vectors = get_embed_texts_cached(["bb", "ccc", "a"], mock_model, cache)
+
+    assert vectors == [[2.0, 1.0], [3.0, 1.0], [1.0, 1.0]]
+    assert mock_model.embed_documents.call_args_list[-1].args[0] == ["ccc"]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    # "ccc", pas encore sauvegardé, est déjà servi par le cache
+    assert get_embed_texts_cached(["ccc"], mock_model, cache) == [[3.0, 1.0]]
+    assert mock_model.embed_documents.call_count == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    # Un autre modèle ne partage pas les clés
+    assert EmbeddingCache(str(tmp_path), model_name="autre-modele").get_many(["a"]) == [None]
+
+    # Budget de 2 vecteurs (2 x 2 float32 = 16 octets) : "ccc", le moins récemment utilisé, est évincé
+    cache.max_bytes = 16
+    cache.get_many(["a", "bb"])
+    cache.save()
+    assert len(cache) == 2
+    assert cache.get_many(["ccc"]) == [None]
@@ -0,0 +1,107 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.core.faiss_manager import add_vectors_to_index, save_faiss_index, load_faiss_index, delete_chunks, build_faiss_index, training_size
+from src.core.chunk_store import ChunkStore
+
+
+def test_ivf_index_is_trained_searchable_and_reloadable(tmp_path):
+    """
+    Vérifie qu'un index IVF est entraîné sur le premier lot, que `nprobe`
+    est appliqué au chargement et que les chunks peuvent être supprimés.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = [f"Concert numéro {i}" for i in range(200)]
+    vectors = embedding_model.embed_documents(texts)
+    metadatas = [{'id': i // 2, 'chunk_id': f"{i // 2}_{i % 2}"} for i in range(200)]
+
+    vectorstore = add_vectors_to_index(None, texts, vectors, metadatas, embedding_model, index_factory="IVF4,Flat")
+    assert vectorstore.index.is_trained
+    assert vectorstore.index.ntotal == 200
+
+    save_faiss_index(vectorstore, str(tmp_path))
+    vectorstore = load_faiss_index(embedding_model, str(tmp_path), nprobe=4)
+    assert faiss.extract_index_ivf(vectorstore.index).nprobe == 4
+
+    # Avec nprobe = nlist, la recherche est exacte
+    assert vectorstore.similarity_search("Concert numéro 42", k=1)[0].page_content == "Concert numéro 42"
+
+    # Après suppression, chaque résultat pointe toujours vers son propre chunk
+    delete_chunks(vectorstore, ["21_0", "21_1"])
+    assert vectorstore.index.ntotal == 198
+    assert vectorstore.similarity_search_by_vector(vectors[100], k=1)[0].page_content == "Concert numéro 100"
+    assert all(doc.metadata['id'] != 21 for doc in vectorstore.similarity_search("Concert numéro 42", k=198))
+    assert vectorstore.similarity_search("Concert numéro 199", k=1)[0].page_content == "Concert numéro 199"
+
+
+
+
+def test_chunks_already_indexed_are_skipped_from_batch_to_batch():
+    """Les identifiants déjà indexés, tenus à jour par l'appelant, écartent les chunks reçus deux fois."""
+    embedding_model = DeterministicFakeEmbedding(size=8)
+    known_ids = set()
+    vectorstore = None
+    for batch in ([0, 1, 2], [2, 3], [3, 4, 4]):
+        texts = [f"Chunk {i}" for i in batch]
+        metadatas = [{'id': i, 'chunk_id': f"{i}_0"} for i in batch]
+        vectorstore = add_vectors_to_index(
+            vectorstore, texts, embedding_model.embed_documents(texts), metadatas, embedding_model, known_ids=known_ids
+        )
+    assert vectorstore.index.ntotal == 5
+    assert known_ids == set(vectorstore.index_to_docstore_id.values()) == {f"{i}_0" for i in range(5)}
+
+
+def test_index_too_large_for_its_training_sample_is_reduced():
+    """
+    Vérifie qu'un échantillon d'entraînement plus petit que le nombre de listes
+    IVF réduit ce nombre au lieu de faire échouer FAISS (`nx >= k`), et qu'un PQ
+    impossible à entraîner se replie sur une recherche exacte.
+    """
+    vectors = np.random.default_rng(0).random((500, 64), dtype=np.float32)
+    index = build_faiss_index(vectors, "IVF1024,Flat")
+    assert index.is_trained and faiss.extract_index_ivf(index).nlist == 500 // 39
+    index = build_faiss_index(vectors[:100], "IVF1024,PQ8")
+    assert index.is_trained and isinstance(index, faiss.IndexFlat)
+
+    assert training_size("Flat", 64) == 0
+    assert training_size("IVF16,Flat", 64) == 16 * 39
+    assert training_size("IVF4,PQ8", 64) == 256
+
+
+def test_mmap_index_reads_chunks_lazily_without_pickle(tmp_path):
+    """
+    Vérifie que l'index est sauvegardé sans pickle, que le chargement projeté
+    en mémoire renvoie les mêmes résultats que le chargement complet, et que
+    les index au format pickle restent lisibles.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = [f"Exposition numéro {i}" for i in range(50)]
+    metadatas = [{'id': i, 'chunk_id': f"{i}_0", 'ville': "Montpellier", 'code_postal': np.int64(34000)} for i in range(50)]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), metadatas, embedding_model)
+    save_faiss_index(vectorstore, str(tmp_path))
+
+    assert not (tmp_path / "index.pkl").exists()
+
+    full = load_faiss_index(embedding_model, str(tmp_path))
+    lazy = load_faiss_index(embedding_model, str(tmp_path), mmap=True)
+    assert isinstance(lazy.docstore, ChunkStore)
+
+    expected = full.similarity_search_with_score("Exposition numéro 7", k=5)
+    results = lazy.similarity_search_with_score("Exposition numéro 7", k=5)
+    assert [(doc.page_content, doc.metadata, score) for doc, score in results] == \
+           [(doc.page_content, doc.metadata, score) for doc, score in expected]
+    assert results[0][0].metadata == {'id': 7, 'chunk_id': "7_0", 'ville': "Montpellier", 'code_postal': 34000}
+    assert results[0][0].id == "7_0"
+
+    # L'index projeté en mémoire est en lecture seule
+    with pytest.raises(ValueError, match="lecture seule"):
+        add_vectors_to_index(lazy, ["x"], embedding_model.embed_documents(["x"]), [{'id': 99, 'chunk_id': "99_0"}], embedding_model)
+    with pytest.raises(ValueError, match="lecture seule"):
+        lazy.docstore.delete(["7_0"])
+
+    # Ancien format pickle
+    legacy_path = tmp_path / "legacy"
+    vectorstore.save_local(str(legacy_path))
+    legacy = load_faiss_index(embedding_model, str(legacy_path))
+    assert legacy.similarity_search("Exposition numéro 7", k=1)[0].page_content == "Exposition numéro 7"
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+from src.core.faiss_manager import add_vectors_to_index, save_faiss_index
+from src.core.index_registry import IndexRegistry
+from src.core.rag_service import RAGService
+
+
+class FakeMistralEmbeddings(DeterministicFakeEmbedding):
+    """Embeddings déterministes, avec l'attribut de clé API lu par RAGService."""
+    mistral_api_key: str | None = None
+
+
+def publish_version(registry, embedding_model, text):
+    """Construit et publie une version de l'index contenant un seul chunk."""
+    vectorstore = add_vectors_to_index(None, [text], embedding_model.embed_documents([text]), None, embedding_model)
+    staging_path = registry.create_staging()
+    save_faiss_index(vectorstore, staging_path)
+    return registry.publish(staging_path)
+
+
+def test_publish_keeps_recent_versions_and_rolls_back(tmp_path):
+    """Vérifie la publication atomique, la purge des anciennes versions et le retour arrière."""
+    embedding_model = DeterministicFakeEmbedding(size=8)
+    registry = IndexRegistry(str(tmp_path), keep_versions=2)
+    assert registry.current_version() is None and registry.current_path() == str(tmp_path)
+
+    versions = [publish_version(registry, embedding_model, f"Version {i}") for i in range(3)]
+    assert registry.current_version() == versions[2]
+    assert registry.versions() == versions[1:]
+
+    assert registry.rollback() == versions[1]
+    assert registry.current_path() == registry.version_path(versions[1])
+
+    # Une reconstruction ratée ne laisse rien derrière elle
+    staging_path = registry.create_staging()
+    registry.discard(staging_path)
+    assert registry.versions() == versions[1:]
+
+
+def test_rag_service_swaps_index_without_interrupting_questions(mocker, tmp_path):
+    """
+    Vérifie qu'une question en cours termine sur l'ancien index pendant le
+    rechargement, que les suivantes utilisent le nouveau, et que le retour
+    arrière remet l'ancien en service.
+    """
+    embedding_model = FakeMistralEmbeddings(size=8)
+    mocker.patch('src.core.rag_service.get_embedding_model', return_value=embedding_model)
+    generation_started = threading.Event()
+    release_generation = threading.Event()
+
+    async def generate(prompt):
+        generation_started.set()
+        await asyncio.to_thread(release_generation.wait)
+        return prompt.to_string()
+    mocker.patch('src.core.rag_service.create_llm', return_value=RunnableLambda(lambda prompt: prompt.to_string(), afunc=generate))
+
+    registry = IndexRegistry(str(tmp_path))
+    old_version = publish_version(registry, embedding_model, "Concert de jazz (ancien index)")
+    service = RAGService(index_path=str(tmp_path))
+    assert service.index_version == old_version
+
+    async def ask_during_swap():
+        question = asyncio.create_task(service.aask("Concerts de jazz ?"))
+        await asyncio.to_thread(generation_started.wait)
+        publish_version(registry, embedding_model, "Concert de jazz (nouvel index)")
+        assert await asyncio.to_thread(service.load_components)
+        release_generation.set()
+        return await question
+
+    assert "ancien index" in asyncio.run(ask_during_swap())
+    assert service.index_version == registry.current_version() != old_version
+    assert "nouvel index" in service.ask("Quels concerts ?")
+
+    assert service.rollback_index() == old_version
+    assert "ancien index" in service.ask("Et maintenant ?")
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+import pytest
+from src.core.jobs import RebuildJob, RebuildJobManager, JobConflictError
+from src.core.observability import PIPELINE_STAGE_SECONDS, REBUILDS, pipeline_span
+
+
+def fake_pipeline(progress, index_path, n_batches=5, delay=0.05):
+    """Pipeline simulé, exécuté dans le processus de reconstruction."""
+    progress("fetch", 100, 100)
+    with pipeline_span("embed"):
+        for batch in range(1, n_batches + 1):
+            time.sleep(delay)
+            progress("embed", batch * 10, n_batches * 10)
+    return True
+
+
+def instant_pipeline(progress, index_path):
+    """Pipeline simulé qui réussit et rend la main aussitôt."""
+    return True
+
+
+def wait_until_finished(manager, job_id, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job["status"] not in ("running", "cancelling"):
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(f"Le job {job_id} ne s'est pas terminé.")
+
+
+def test_rebuild_job_reports_progress_and_notifies_when_ready(tmp_path):
+    """
+    Vérifie qu'une reconstruction tourne dans un autre processus, qu'une
+    seule peut être active, que sa progression est remontée étape par étape
+    et que le service est prévenu quand le nouvel index est prêt.
+    Les métriques du pipeline sont remontées au processus de l'API.
+    """
+    embed_spans, succeeded = PIPELINE_STAGE_SECONDS.count(stage="embed"), REBUILDS.value(status="succeeded")
+    ready = []
+    manager = RebuildJobManager(index_path=str(tmp_path), on_ready=lambda: ready.append(True), target=fake_pipeline)
+
+    job = manager.start(n_batches=10)
+    assert job["status"] == "running"
+    with pytest.raises(JobConflictError):
+        manager.start()
+
+    job = wait_until_finished(manager, job["job_id"])
+    assert job["status"] == "succeeded" and job["reloaded"] is True
+    assert ready == [True]
+    assert job["stage"] == "embed"
+    assert job["stages"]["fetch"]["done"] == 100
+    assert job["stages"]["embed"]["done"] == job["stages"]["embed"]["total"] == 100
+    assert job["stages"]["embed"]["items_per_second"] > 0
+    assert PIPELINE_STAGE_SECONDS.count(stage="embed") == embed_spans + 1
+    assert REBUILDS.value(status="succeeded") == succeeded + 1
+
+    # Une fois la première terminée, une nouvelle reconstruction peut démarrer
+    assert manager.start(n_batches=1)["job_id"] != job["job_id"]
+
+
+def test_rebuild_job_can_be_cancelled(tmp_path):
+    """Vérifie que l'annulation arrête le pipeline au prochain point d'avancement, sans mise en service."""
+    ready = []
+    manager = RebuildJobManager(index_path=str(tmp_path), on_ready=lambda: ready.append(True), target=fake_pipeline)
+
+    job = manager.start(n_batches=1000, delay=0.05)
+    while manager.get(job["job_id"])["stage"] != "embed":
+        time.sleep(0.05)
+    assert manager.cancel(job["job_id"])["status"] == "cancelling"
+
+    job = wait_until_finished(manager, job["job_id"], timeout=10.0)
+    assert job["status"] == "cancelled"
+    assert job["stages"]["embed"]["done"] < 10_000
+    assert ready == []
+    assert manager.cancel("inconnu") is None
+
+
+def test_last_message_of_an_exited_process_is_not_lost(tmp_path):
+    """
+    Un processus qui poste "finished" et s'arrête aussitôt est bien compté
+    comme réussi, et le nouvel index mis en service, même si son message
+    arrive après la dernière attente du suivi.
+    """
+    ready = []
+    manager = RebuildJobManager(index_path=str(tmp_path), on_ready=lambda: ready.append(True), target=instant_pipeline)
+    job = wait_until_finished(manager, manager.start()["job_id"])
+    assert job["status"] == "succeeded" and ready == [True]
+
+    class LateQueue:
+        """File dont le message n'arrive qu'après la première attente."""
+        def __init__(self, messages):
+            self.messages = list(messages)
+            self.waited = False
+
+        def get(self, timeout=None):
+            if not self.waited:
+                self.waited = True
+                raise queue.Empty
+            return self.get_nowait()
+
+        def get_nowait(self):
+            if not self.messages:
+                raise queue.Empty
+            return self.messages.pop(0)
+
+    class ExitedProcess:
+        exitcode = 0
+
+        def is_alive(self):
+            return False
+
+        def join(self, timeout=None):
+            pass
+
+    job = RebuildJob("tardif")
+    job._events = LateQueue([("progress", "index", 1, 1), ("finished", "succeeded", None)])
+    job._process, job._cancel_event = ExitedProcess(), threading.Event()
+    manager._monitor(job)
+    assert job.status == "succeeded" and job.error is None
+    assert ready == [True, True]
@@ -0,0 +1,103 @@
+from datetime import date
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.core.faiss_manager import add_vectors_to_index, save_faiss_index, load_faiss_index
+from src.core.metadata_index import MetadataIndex, SearchFilters
+from src.core.retrieval import EventRetriever, load_metadata_index
+
+METADATAS = [
+    {'chunk_id': "1_0", 'ville': "Toulouse", 'code_postal': "31000", 'date_debut': "2025-12-05T20:00:00+00:00", 'date_fin': "2025-12-05T23:00:00+00:00"},
+    {'chunk_id': "2_0", 'ville': "Albi", 'code_postal': "81000", 'date_debut': "2025-12-10T20:00:00+00:00", 'date_fin': None},
+    {'chunk_id': "3_0", 'ville': "Toulouse", 'code_postal': "31500", 'date_debut': "2026-01-15T10:00:00+00:00", 'date_fin': "2026-02-15T18:00:00+00:00"},
+    {'chunk_id': "4_0", 'ville': "Saint-Jean", 'code_postal': "31240", 'date_debut': "2025-11-01T10:00:00+00:00", 'date_fin': "2025-12-31T18:00:00+00:00"},
+    {'chunk_id': "5_0", 'ville': "Montpellier", 'code_postal': "34000"},
+]
+
+
+def positions(mask):
+    return [int(i) for i in mask.nonzero()[0]]
+
+
+def test_metadata_index_filters_by_city_department_and_period():
+    """Vérifie les bitmaps par ville / département et les périodes (chevauchement des dates)."""
+    metadata_index = MetadataIndex.from_metadatas(METADATAS)
+
+    assert metadata_index.mask(SearchFilters()) is None
+    assert positions(metadata_index.mask(SearchFilters(city="toulouse"))) == [0, 2]
+    assert positions(metadata_index.mask(SearchFilters(department="Haute-Garonne"))) == [0, 2, 3]
+    assert positions(metadata_index.mask(SearchFilters(city="Paris"))) == []
+
+    december = SearchFilters(date_from=date(2025, 12, 1), date_to=date(2025, 12, 31))
+    assert positions(metadata_index.mask(december)) == [0, 1, 3]
+    december.department = "31"
+    assert positions(metadata_index.mask(december)) == [0, 3]
+    # Un événement sans date de fin dure une journée
+    assert positions(metadata_index.mask(SearchFilters(date_from=date(2025, 12, 11)))) == [2, 3]
+
+
+def test_filters_are_extracted_from_the_question():
+    """Vérifie la détection de la ville, du département et de la période dans une question."""
+    metadata_index = MetadataIndex.from_metadatas(METADATAS)
+    today = date(2025, 11, 20)  # un jeudi
+
+    filters = metadata_index.extract_filters("Des concerts à Toulouse en décembre ?", today=today)
+    assert filters == SearchFilters(city="toulouse", date_from=date(2025, 12, 1), date_to=date(2025, 12, 31))
+
+    filters = metadata_index.extract_filters("Que faire à saint-jean ce week-end ?", today=today)
+    assert filters == SearchFilters(city="saint jean", date_from=date(2025, 11, 22), date_to=date(2025, 11, 23))
+
+    filters = metadata_index.extract_filters("Des expositions dans le Tarn en mars ?", today=today)
+    assert filters == SearchFilters(department="81", date_from=date(2026, 3, 1), date_to=date(2026, 3, 31))
+
+    assert metadata_index.extract_filters("Un lot de jeux pour enfants ?", today=today).is_empty()
+
+
+def test_retriever_applies_filters_during_the_faiss_search(tmp_path):
+    """
+    Vérifie que les k résultats respectent tous les filtres, même quand les
+    chunks les plus proches de la question ne les respectent pas, et que
+    l'index des métadonnées est sauvegardé avec l'index FAISS.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = [f"Concert numéro {i}" for i in range(len(METADATAS))]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), METADATAS, embedding_model, index_factory="Flat")
+    save_faiss_index(vectorstore, str(tmp_path))
+    vectorstore = load_faiss_index(embedding_model, str(tmp_path), mmap=True)
+    retriever = EventRetriever(vectorstore=vectorstore, metadata_index=load_metadata_index(vectorstore, str(tmp_path)), k=2)
+
+    # Sans filtre, le chunk identique à la question arrive en tête
+    assert retriever.invoke("Concert numéro 1")[0].page_content == "Concert numéro 1"
+    # La ville citée dans la question écarte Albi, même s'il est le plus proche
+    docs = retriever.invoke("Concert numéro 1 à Toulouse")
+    assert {doc.metadata['ville'] for doc in docs} == {"Toulouse"} and len(docs) == 2
+    # Filtres explicites, combinés à ceux de la question
+    docs = retriever.search("Concert numéro 1", SearchFilters(department="31", date_from=date(2026, 1, 1)))
+    assert [doc.metadata['chunk_id'] for doc in docs] == ["3_0"]
+    assert retriever.search("Concert numéro 1", SearchFilters(city="Paris")) == []
+
+
+def test_guessed_filters_are_relaxed_when_nothing_matches():
+    """
+    Une période ou une ville déduites de la question qui ne retiennent aucun
+    chunk sont relâchées (la période d'abord) ; les filtres explicites restent stricts.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = [f"Concert numéro {i}" for i in range(len(METADATAS))]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), METADATAS, embedding_model, index_factory="Flat")
+    metadata_index = MetadataIndex.from_metadatas(METADATAS)
+    retriever = EventRetriever(vectorstore=vectorstore, metadata_index=metadata_index, k=5, collapse_events=False)
+
+    # Aucun concert à Albi en mars : la ville est gardée, la période abandonnée
+    filters = metadata_index.extract_filters("Concert à Albi en mars 2026 ?")
+    assert filters.guessed == ("city", "date_from", "date_to")
+    assert [doc.metadata['chunk_id'] for doc in retriever.search_by_vector(embedding_model.embed_query("Concert"), filters)] == ["2_0"]
+    assert filters.relaxed() == [SearchFilters(city="albi"), SearchFilters()]
+
+    docs = retriever.search("Concert numéro 1 à Toulouse en mai 2030")
+    assert {doc.metadata['ville'] for doc in docs} == {"Toulouse"} and len(docs) == 2
+    # Aucun chunk dans le Gard : recherche sans filtre
+    assert len(retriever.search("Concert numéro 1 dans le Gard")) == 5
+
+    # Une période explicite n'est pas relâchée, même combinée à une ville déduite
+    explicit = SearchFilters(date_from=date(2030, 5, 1), date_to=date(2030, 5, 31))
+    assert retriever.search("Concert numéro 1 à Toulouse", explicit) == []
+    assert retriever.filters_for("Concert à Toulouse", explicit).guessed == ("city",)
@@ -0,0 +1,98 @@
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.messages import AIMessage
+from src.core.faiss_manager import add_vectors_to_index
+from src.core.observability import (
+    MetricsRegistry, STAGE_SECONDS, ERRORS, LLM_TOKENS, LLMMetricsCallback, span, _token_usage
+)
+from src.core.retrieval import EventRetriever
+
+
+def test_registry_renders_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requêtes.", ("route",))
+    size = registry.gauge("index_chunks", "Taille de l'index.")
+    latency = registry.histogram("latency_seconds", "Durées.", ("stage",), buckets=(0.1, 1.0))
+
+    requests.inc(route='/ask "v1"')
+    requests.inc(2, route='/ask "v1"')
+    size.set(42)
+    for seconds in (0.05, 0.5, 3.0):
+        latency.observe(seconds, stage="search")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requêtes.",
+        "# TYPE requests_total counter",
+        'requests_total{route="/ask \\"v1\\""} 3',
+        "# HELP index_chunks Taille de l'index.",
+        "# TYPE index_chunks gauge",
+        "index_chunks 42",
+        "# HELP latency_seconds Durées.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="search",le="0.1"} 1',
+        'latency_seconds_bucket{stage="search",le="1"} 2',
+        'latency_seconds_bucket{stage="search",le="+Inf"} 3',
+        'latency_seconds_sum{stage="search"} 3.55',
+        'latency_seconds_count{stage="search"} 3',
+    ]
+    with pytest.raises(ValueError):
+        requests.inc()
+    with pytest.raises(ValueError):
+        registry.counter("requests_total", "Doublon.")
+
+
+def test_forwarded_updates_are_replayed_by_another_registry():
+    """Mécanisme de remontée des métriques du processus de reconstruction."""
+    child, parent = MetricsRegistry(), MetricsRegistry()
+    for registry in (child, parent):
+        registry.histogram("stage_seconds", "Durées.", ("stage",))
+    messages = []
+    child.forward(lambda *message: messages.append(message))
+
+    child._metrics["stage_seconds"].observe(2.0, stage="embed")
+    for message in messages:
+        parent.apply(*message)
+    parent.apply("inconnue", "inc", 1, {})
+
+    assert parent._metrics["stage_seconds"].count(stage="embed") == 1
+
+
+def test_span_records_durations_and_errors():
+    before = STAGE_SECONDS.count(stage="test"), ERRORS.value(stage="test")
+    with span("test"):
+        pass
+    with pytest.raises(RuntimeError):
+        with span("test"):
+            raise RuntimeError("échec")
+    assert STAGE_SECONDS.count(stage="test") == before[0] + 2
+    assert ERRORS.value(stage="test") == before[1] + 1
+
+
+def test_retriever_times_query_embedding_and_search():
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = [f"Événement {i}" for i in range(4)]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), None, embedding_model, index_factory="Flat")
+    stages = ("embed_query", "search", "rerank")
+    before = {stage: STAGE_SECONDS.count(stage=stage) for stage in stages}
+
+    EventRetriever(vectorstore=vectorstore, k=2).invoke("Événement 1")
+
+    # Sans reranker, pas d'étape de reranking
+    assert {stage: STAGE_SECONDS.count(stage=stage) - before[stage] for stage in stages} == {"embed_query": 1, "search": 1, "rerank": 0}
+
+
+def test_llm_callback_counts_tokens_and_generation_time():
+    result = LLMResult(generations=[[ChatGeneration(message=AIMessage(content="Réponse"))]],
+                       llm_output={"token_usage": {"prompt_tokens": 120, "completion_tokens": 30}})
+    assert _token_usage(result) == (120, 30)
+    message = AIMessage(content="Réponse", usage_metadata={"input_tokens": 7, "output_tokens": 3, "total_tokens": 10})
+    assert _token_usage(LLMResult(generations=[[ChatGeneration(message=message)]])) == (7, 3)
+
+    before = STAGE_SECONDS.count(stage="generate"), LLM_TOKENS.value(type="prompt"), LLM_TOKENS.value(type="completion")
+    callback = LLMMetricsCallback()
+    callback.on_chat_model_start({}, [], run_id="run")
+    callback.on_llm_end(result, run_id="run")
+    assert (STAGE_SECONDS.count(stage="generate"), LLM_TOKENS.value(type="prompt"), LLM_TOKENS.value(type="completion")) == (
+        before[0] + 1, before[1] + 120, before[2] + 30
+    )
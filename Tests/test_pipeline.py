@@ -0,0 +1,196 @@
+import json
+from datetime import datetime, timedelta
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.core.data_loader import FetchError
+from src.core import pipeline
+from src.core.pipeline import run_indexing_pipeline
+from src.core.faiss_manager import load_faiss_index, load_manifest
+from src.core.index_registry import IndexRegistry
+
+
+def make_event(uid: int, updated_at: str, days_from_now: int = 10, title: str = "Concert") -> dict:
+    """Événement brut, au format de l'API Open Agenda."""
+    begin = (datetime.now() + timedelta(days=days_from_now)).strftime('%Y-%m-%dT20:00:00+00:00')
+    return {
+        'uid': uid,
+        'title_fr': f"{title} {uid}",
+        'description_fr': "Une soirée exceptionnelle. " * 10,
+        'longdescription_fr': f"Programme détaillé de l'événement {uid}. " * 5,
+        'firstdate_begin': begin,
+        'location_city': "Toulouse",
+        'updatedat': updated_at,
+    }
+
+
+def test_incremental_update_replaces_changed_and_expired_events(mocker, tmp_path):
+    """
+    Vérifie que la mise à jour incrémentale n'interroge l'API que depuis le
+    high-water mark, remplace les chunks des événements modifiés, supprime
+    les événements sortis de la fenêtre et ajoute les nouveaux.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=8)
+    mocker.patch('src.core.pipeline.get_embedding_model', return_value=embedding_model)
+    index_path = str(tmp_path / "index")
+
+    # 1. Construction complète
+    mocker.patch('src.core.pipeline.fetch_events', return_value=[
+        make_event(1, "2025-01-01T00:00:00+00:00"),
+        make_event(2, "2025-01-02T00:00:00+00:00"),
+        make_event(3, "2025-01-03T00:00:00+00:00", days_from_now=-400),
+    ])
+    assert run_indexing_pipeline(index_path=index_path, cache_dir=None)
+    manifest = load_manifest(index_path)
+    assert manifest['high_water_mark'] == "2025-01-03T00:00:00+00:00"
+    assert set(manifest['events']) == {"1", "2", "3"}
+
+    # 2. Mise à jour : l'événement 2 est modifié, le 4 est nouveau, le 3 a expiré
+    fetch = mocker.patch('src.core.pipeline.fetch_events', return_value=[
+        make_event(2, "2025-02-01T00:00:00+00:00", title="Spectacle"),
+        make_event(4, "2025-02-02T00:00:00+00:00"),
+    ])
+    assert run_indexing_pipeline(index_path=index_path, cache_dir=None, incremental=True)
+
+    assert fetch.call_args.kwargs['updated_since'] == "2025-01-03T00:00:00+00:00"
+    # Les événements entrés dans la fenêtre depuis la construction sont aussi demandés
+    assert fetch.call_args.kwargs['entered_after'] == manifest['window_end']
+    assert fetch.call_args.kwargs['strict']
+    manifest = load_manifest(index_path)
+    assert manifest['high_water_mark'] == "2025-02-02T00:00:00+00:00"
+    assert set(manifest['events']) == {"1", "2", "4"}
+
+    vectorstore = load_faiss_index(embedding_model, index_path)
+    titles = {
+        vectorstore.docstore.search(docstore_id).metadata['titre']
+        for docstore_id in vectorstore.index_to_docstore_id.values()
+    }
+    assert titles == {"Concert 1", "Spectacle 2", "Concert 4"}
+    assert vectorstore.index.ntotal == sum(len(event['chunk_ids']) for event in manifest['events'].values())
+
+
+def test_incremental_update_dedups_against_indexed_events(mocker, tmp_path):
+    """
+    Un nouvel événement qui reprend le texte d'un événement déjà indexé est
+    écarté par la mise à jour incrémentale, comme par une reconstruction
+    complète : les deux donnent les mêmes chunks.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=8)
+    mocker.patch('src.core.pipeline.get_embedding_model', return_value=embedding_model)
+    events = [make_event(1, "2025-01-01T00:00:00+00:00"), make_event(2, "2025-01-02T00:00:00+00:00")]
+    # L'événement 3 est republié sous un autre identifiant avec le texte du 1
+    copy = {**events[0], 'uid': 3, 'updatedat': "2025-02-01T00:00:00+00:00"}
+    changes = [copy, make_event(4, "2025-02-02T00:00:00+00:00")]
+
+    def chunk_ids(index_path):
+        return set(load_faiss_index(embedding_model, index_path).index_to_docstore_id.values())
+
+    incremental_path = str(tmp_path / "incremental")
+    mocker.patch('src.core.pipeline.fetch_events', return_value=events)
+    assert run_indexing_pipeline(index_path=incremental_path, cache_dir=None)
+    mocker.patch('src.core.pipeline.fetch_events', return_value=changes)
+    assert run_indexing_pipeline(index_path=incremental_path, cache_dir=None, incremental=True)
+
+    full_path = str(tmp_path / "full")
+    mocker.patch('src.core.pipeline.fetch_events', return_value=events + changes)
+    assert run_indexing_pipeline(index_path=full_path, cache_dir=None)
+
+    assert chunk_ids(incremental_path) == chunk_ids(full_path)
+    assert not any(chunk_id.startswith("3_") for chunk_id in chunk_ids(incremental_path))
+    assert set(load_manifest(incremental_path)['events']) == {"1", "2", "4"}
+
+
+def test_partial_build_skips_failed_embeddings(mocker, tmp_path):
+    """
+    Vérifie qu'avec `allow_partial`, l'index est construit avec les chunks
+    embeddés et que les chunks manquants sont listés dans un rapport ;
+    sans `allow_partial`, le pipeline échoue.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=8)
+    mocker.patch('src.core.pipeline.get_embedding_model', return_value=embedding_model)
+    mocker.patch('src.core.pipeline.fetch_events', return_value=[
+        make_event(1, "2025-01-01T00:00:00+00:00"),
+        make_event(2, "2025-01-02T00:00:00+00:00", title="Spectacle"),
+    ])
+
+    def flaky_embed(texts, model, scheduler=None, progress=None):
+        if progress is not None:
+            progress(len(texts))
+        return [None if "Spectacle" in text else model.embed_query(text) for text in texts]
+    mocker.patch('src.core.pipeline.get_embed_texts', side_effect=flaky_embed)
+    index_path = str(tmp_path / "index")
+
+    registry = IndexRegistry(index_path)
+    assert not run_indexing_pipeline(index_path=index_path, cache_dir=None)
+    assert registry.versions() == []  # rien n'est publié après un échec
+    stages = []
+    assert run_indexing_pipeline(
+        index_path=index_path, cache_dir=None, allow_partial=True,
+        progress=lambda stage, done, total=None: stages.append(stage)
+    )
+    assert list(dict.fromkeys(stages)) == ["fetch", "prepare", "embed", "index", "publish"]
+
+    manifest = load_manifest(index_path)
+    assert set(manifest['events']) == {"1"}
+    with open(f"{registry.current_path()}/missing_embeddings.json", encoding="utf-8") as f:
+        missing = json.load(f)["missing_chunk_ids"]
+    assert missing and all(chunk_id.startswith("2_") for chunk_id in missing)
+
+
+def test_interrupted_incremental_fetch_keeps_the_high_water_mark(mocker, tmp_path):
+    """Une récupération incomplète ne publie rien : les changements non récupérés seront repris."""
+    mocker.patch('src.core.pipeline.get_embedding_model', return_value=DeterministicFakeEmbedding(size=8))
+    index_path = str(tmp_path / "index")
+    mocker.patch('src.core.pipeline.fetch_events', return_value=[make_event(1, "2025-01-01T00:00:00+00:00")])
+    assert run_indexing_pipeline(index_path=index_path, cache_dir=None)
+
+    mocker.patch('src.core.pipeline.fetch_events', side_effect=FetchError("Échec de la page offset=100", [100]))
+    assert not run_indexing_pipeline(index_path=index_path, cache_dir=None, incremental=True)
+    assert load_manifest(index_path)['high_water_mark'] == "2025-01-01T00:00:00+00:00"
+    assert len(IndexRegistry(index_path).versions()) == 1
+
+
+def test_incremental_update_retries_chunks_missing_after_a_partial_build(mocker, tmp_path):
+    """
+    Après un embedding partiel, l'événement incomplet (chunk du milieu
+    manquant) est récupéré de nouveau par la mise à jour incrémentale
+    suivante : ses chunks restants sont supprimés sans reconstruction complète.
+    """
+    embedding_model = DeterministicFakeEmbedding(size=8)
+    mocker.patch('src.core.pipeline.get_embedding_model', return_value=embedding_model)
+    event = make_event(5, "2025-01-05T00:00:00+00:00")
+    event['longdescription_fr'] = "Programme détaillé de la soirée. " * 80
+    mocker.patch('src.core.pipeline.fetch_events', return_value=[make_event(1, "2025-01-01T00:00:00+00:00"), event])
+
+    def embed_without_second_chunk(texts, model, scheduler=None, progress=None):
+        return [None if i == 2 else model.embed_query(text) for i, text in enumerate(texts)]
+    mocker.patch('src.core.pipeline.get_embed_texts', side_effect=embed_without_second_chunk)
+    index_path = str(tmp_path / "index")
+    assert run_indexing_pipeline(index_path=index_path, cache_dir=None, allow_partial=True)
+
+    manifest = load_manifest(index_path)
+    assert manifest['events']["5"]['chunk_ids'][:2] == ["5_0", "5_2"]
+    assert manifest['high_water_mark'] == "2025-01-04T23:59:59+00:00"
+
+    mocker.patch('src.core.pipeline.get_embed_texts', side_effect=lambda texts, model, **kwargs: model.embed_documents(texts))
+    fetch = mocker.patch('src.core.pipeline.fetch_events', return_value=[event])
+    assert run_indexing_pipeline(index_path=index_path, cache_dir=None, incremental=True)
+
+    assert fetch.call_count == 1  # pas de repli sur une reconstruction complète
+    manifest = load_manifest(index_path)
+    assert manifest['events']["5"]['chunk_ids'][:3] == ["5_0", "5_1", "5_2"]
+    assert manifest['high_water_mark'] == "2025-01-05T00:00:00+00:00"
+
+
+def test_streaming_build_waits_for_enough_vectors_to_train_the_index(mocker, tmp_path):
+    """Un index IVF n'est pas entraîné sur le premier lot, trop petit, mais sur tous les lots reçus."""
+    mocker.patch('src.core.pipeline.get_embedding_model', return_value=DeterministicFakeEmbedding(size=8))
+    pages = [[make_event(uid, "2025-01-01T00:00:00+00:00")] for uid in range(1, 7)]
+    mocker.patch('src.core.pipeline.iter_event_pages', return_value=iter(pages))
+    add_vectors = mocker.spy(pipeline, 'add_vectors_to_index')
+    index_path = str(tmp_path / "index")
+
+    assert run_indexing_pipeline(index_path=index_path, cache_dir=None, streaming=True, batch_size=1, index_factory="IVF4,Flat")
+    # Moins de 4 x 39 chunks en tout : un seul index, créé à la fin du flux
+    assert add_vectors.call_count == 1
+    vectorstore = load_faiss_index(DeterministicFakeEmbedding(size=8), index_path)
+    assert vectorstore.index.ntotal == sum(len(event['chunk_ids']) for event in load_manifest(index_path)['events'].values())
+    assert len(load_manifest(index_path)['events']) == 6
@@ -2,7 +2,10 @@ import pandas as pd
 import pytest
 #import re
 #from langchain_text_splitters import RecursiveCharacterTextSplitter
-from src.core.processing import clean_df, filter_and_dedup, create_chunks_with_metadata
+from src.core.processing import (
+    clean_df, filter_and_dedup, create_chunks_with_metadata, stream_chunks,
+    clean_df_parallel, create_chunks_parallel, build_chunk_table
+)
 
 @pytest.fixture
 def dirty_dataframe_for_cleaning() -> pd.DataFrame:
@@ -72,6 +75,24 @@ def test_clean_df_comprehensive(dirty_dataframe_for_cleaning):
     assert df_resultat.loc[0, 'titre'] == "Événement Spécial"
 
 
+def test_clean_df_entities_and_plain_text():
+    """
+    Vérifie que les entités HTML sont toujours décodées (cellules passées au
+    parser) et que les cellules sans balise donnent le même texte nettoyé.
+    """
+    df = pd.DataFrame({
+        'titre': ['Rock &amp; Pop', 'Fête\u00a0de   la\tmusique →'],
+        'code_postal': ['31000', None],
+        'ville': ['Toulouse', '<i>Albi</i>'],
+    })
+
+    df_resultat = clean_df(df)
+
+    assert df_resultat['titre'].tolist() == ['Rock Pop', 'Fête de la musique']
+    assert df_resultat['code_postal'].tolist() == ['31000', '']
+    assert df_resultat['texte_complet'].tolist() == ['Rock Pop . Toulouse', 'Fête de la musique . Albi']
+
+
 @pytest.fixture
 def dataframe_for_filtering() -> pd.DataFrame:
     """
@@ -187,4 +208,62 @@ def test_create_chunks_with_metadata(dataframe_for_chunking):
     # --- Vérification de la structure des métadonnées ---
     # On vérifie qu'une colonne non désirée n'a pas été incluse
     assert 'colonne_inutile' not in metadatas[0]
-    assert 'texte_complet' not in metadatas[0]
\ No newline at end of file
+    assert 'texte_complet' not in metadatas[0]
+
+
+def test_stream_chunks_dedups_across_batches():
+    """
+    Vérifie que le mode streaming produit un lot de chunks par lot d'événements
+    et supprime les doublons même lorsqu'ils arrivent dans des lots différents.
+    """
+    long_text = "Un texte de description suffisamment long pour passer le filtre de longueur minimale."
+    pages = [
+        [{'uid': 'evt1', 'title_fr': 'Concert', 'description_fr': long_text}],
+        [{'uid': 'evt2', 'title_fr': 'CONCERT', 'description_fr': long_text.upper()}],  # Doublon normalisé
+        [{'uid': 'evt3', 'title_fr': 'Exposition', 'description_fr': long_text}],
+    ]
+
+    batches = list(stream_chunks(iter(pages), batch_size=1, min_chars=50))
+
+    # Le lot du doublon ne produit aucun chunk : il n'est pas émis
+    assert len(batches) == 2
+    ids = [metadata['id'] for _, metadatas in batches for metadata in metadatas]
+    assert ids == ['evt1', 'evt3']
+
+
+def test_parallel_processing_matches_serial():
+    """
+    Vérifie que le traitement multiprocessus donne exactement les mêmes
+    données nettoyées, chunks et chunk_id que le traitement en série,
+    y compris quand les chunk_id proviennent de l'index (pas de colonne 'id').
+    """
+    df = pd.DataFrame({
+        'titre': [f'Événement <b>{i}</b>' for i in range(12)],
+        'description': [f'Partie un. Partie deux. Partie trois. Numéro {i}.' for i in range(12)],
+        'ville': ['Toulouse', None, 'Albi'] * 4,
+    })
+
+    df_serial = clean_df(df)
+    df_parallel = clean_df_parallel(df, n_workers=2)
+    pd.testing.assert_frame_equal(df_parallel, df_serial)
+
+    serial = create_chunks_with_metadata(df_serial, chunk_size=20, chunk_overlap=5)
+    parallel = create_chunks_parallel(df_serial, n_workers=2, chunk_size=20, chunk_overlap=5)
+    assert parallel == serial
+    assert parallel[1][-1]['chunk_id'].startswith('11_')
+
+
+def test_build_chunk_table_stores_metadata_once_per_event(dataframe_for_chunking):
+    """
+    Vérifie que la table columnar référence les métadonnées par événement
+    et que sa vue de compatibilité correspond à create_chunks_with_metadata.
+    """
+    table = build_chunk_table(dataframe_for_chunking, chunk_size=20, chunk_overlap=5)
+
+    assert len(table) == 4
+    assert len(table.events) == 2
+    assert table.event_index.tolist() == [0, 0, 0, 1]
+    assert table.chunk_number.tolist() == [0, 1, 2, 0]
+    assert table.chunk_id(2) == "evt_123_2"
+
+    assert table.to_lists() == create_chunks_with_metadata(dataframe_for_chunking, chunk_size=20, chunk_overlap=5)
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+from src.core.query_embedder import QueryEmbedder
+
+
+class CountingEmbeddings:
+    """Faux modèle d'embedding qui compte ses appels et simule la latence réseau."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        time.sleep(self.latency)
+        return [float(len(text))]
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        await asyncio.sleep(self.latency)
+        return [[float(len(text))] for text in texts]
+
+
+def test_async_queries_are_coalesced_batched_and_cached():
+    """
+    Vérifie qu'une rafale de questions (avec doublons) ne produit qu'un seul
+    appel au modèle, avec chaque question distincte une seule fois, et que
+    les questions suivantes sont servies par le cache.
+    """
+    backend = CountingEmbeddings()
+    embedder = QueryEmbedder(backend, batch_window=0.01)
+    questions = ["jazz", "expositions d'art", "jazz", "atelier enfants", "jazz", "expositions d'art"]
+
+    async def burst():
+        return await asyncio.gather(*(embedder.aembed_query(q) for q in questions))
+
+    vectors = asyncio.run(burst())
+
+    assert vectors == [[float(len(q))] for q in questions]
+    assert backend.calls == [["jazz", "expositions d'art", "atelier enfants"]]
+    assert embedder.stats["coalesced"] == 3
+
+    assert asyncio.run(embedder.aembed_query("jazz")) == [4.0]
+    assert len(backend.calls) == 1 and embedder.stats["hits"] == 1
+
+
+def test_sync_queries_are_coalesced_across_threads_and_lru_bounded():
+    """Vérifie la coalescence entre threads et la taille maximale du cache LRU."""
+    backend = CountingEmbeddings(latency=0.05)
+    embedder = QueryEmbedder(backend, max_size=2)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(embedder.embed_query("jazz"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [[4.0]] * 5
+    assert backend.calls == [["jazz"]]
+
+    embedder.embed_query("théâtre")
+    embedder.embed_query("cirque")  # évince "jazz", le moins récemment utilisé
+    embedder.embed_query("jazz")
+    assert backend.calls[-1] == ["jazz"] and len(backend.calls) == 4
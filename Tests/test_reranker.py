@@ -0,0 +1,80 @@
+import time
+import pytest
+from datetime import date
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+from src.core.faiss_manager import add_vectors_to_index
+from src.core.metadata_index import SearchFilters
+from src.core.reranker import Reranker, FeatureReranker, NoOpReranker, CrossEncoderReranker, create_reranker
+from src.core.retrieval import EventRetriever
+
+DOCS = [
+    Document(page_content="Concert de jazz en plein air.", metadata={'ville': "Albi", 'date_debut': "2025-12-05T20:00:00+00:00"}),
+    Document(page_content="Atelier créatif de Noël pour les enfants.", metadata={'ville': "Albi", 'date_debut': "2025-11-02T10:00:00+00:00"}),
+    Document(page_content="Atelier créatif de Noël pour les enfants.", metadata={'ville': "Toulouse", 'date_debut': "2025-12-10T10:00:00+00:00"}),
+]
+
+
+def contents(docs):
+    return [(doc.page_content, doc.metadata['ville']) for doc in docs]
+
+
+def test_feature_reranker_combines_lexical_city_and_date_matches():
+    """Le chunk qui partage les termes de la question, dans la ville et la période demandées, passe en tête."""
+    reranker = FeatureReranker()
+    question = "Un atelier créatif pour enfants à Toulouse en décembre ?"
+    filters = SearchFilters(city="toulouse", date_from=date(2025, 12, 1), date_to=date(2025, 12, 31))
+
+    assert contents(reranker.rerank(question, DOCS, k=3, filters=filters)) == [
+        ("Atelier créatif de Noël pour les enfants.", "Toulouse"),
+        ("Concert de jazz en plein air.", "Albi"),
+        ("Atelier créatif de Noël pour les enfants.", "Albi"),  # hors de la période
+    ]
+    # Sans filtre ni terme commun, l'ordre du retriever est conservé
+    assert reranker.rerank("Quoi de neuf ?", DOCS, k=3) == DOCS
+    assert NoOpReranker().rerank(question, DOCS, k=1) == DOCS[:1]
+
+
+def test_reranker_stops_scoring_when_the_time_budget_is_spent():
+    """Les lots non rescorés à l'échéance gardent leur rang, derrière les candidats rescorés."""
+
+    class SlowReverseReranker(Reranker):
+        def score_batch(self, question, docs, ranks, filters):
+            time.sleep(0.05)
+            return ranks.astype(float)  # inverse l'ordre du lot
+
+    docs = [Document(page_content=str(i)) for i in range(6)]
+    reranked = SlowReverseReranker(time_budget=0.01, batch_size=2).rerank("?", docs, k=6)
+    assert [doc.page_content for doc in reranked] == ["1", "0", "2", "3", "4", "5"]
+    # Un reranker doit définir `score_batch`
+    with pytest.raises(TypeError):
+        Reranker()
+
+
+def test_create_reranker_falls_back_to_no_op(mocker):
+    assert isinstance(create_reranker(None), NoOpReranker)
+    assert isinstance(create_reranker("features"), FeatureReranker)
+    assert type(create_reranker("inconnu")) is NoOpReranker
+    mocker.patch.object(CrossEncoderReranker, "__init__", side_effect=ImportError("sentence-transformers"))
+    assert type(create_reranker("cross-encoder:mon-modele")) is NoOpReranker
+
+
+def test_retriever_reranks_a_larger_candidate_pool():
+    """Le reranker reçoit `rerank_pool` candidats et le retriever n'en garde que `k`."""
+    embedding_model = DeterministicFakeEmbedding(size=16)
+    texts = [f"Événement {i}" for i in range(8)]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), None, embedding_model, index_factory="Flat")
+
+    class LastFirst(Reranker):
+        def score_batch(self, question, docs, ranks, filters):
+            self.pool = len(docs)
+            return ranks.astype(float)
+
+    reranker = LastFirst()
+    retriever = EventRetriever(vectorstore=vectorstore, reranker=reranker, rerank_pool=5, k=2, mmr_lambda=None)
+    plain = EventRetriever(vectorstore=vectorstore, k=5, mmr_lambda=None)
+
+    question = "Événement 3"
+    docs = retriever.invoke(question)
+    assert reranker.pool == 5
+    assert docs == plain.invoke(question)[::-1][:2]
@@ -0,0 +1,85 @@
+"""
+Compare, pour un lot de questions, une boucle d'appels `aask` (comme un
+client qui appelle /ask une question après l'autre) à `ask_many`
+(un seul appel d'embedding, une seule recherche FAISS, générations en
+parallèle). Le modèle d'embedding et le LLM sont simulés avec une latence
+fixe par appel, pour imiter des API distantes.
+
+Usage :
+    python -m benchmarks.bench_ask_batch --n-questions 200 --llm-latency 0.1 --embedding-latency 0.03
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from benchmarks.bench_ask_concurrency import make_fake_llm
+from src.core.chatbot import create_prompt_template, create_rag_chain, create_generation_chain
+from src.core.faiss_manager import add_vectors_to_index
+from src.core.query_embedder import QueryEmbedder
+from src.core.rag_service import RAGService
+from src.core.retrieval import EventRetriever, load_metadata_index
+
+
+class RemoteLikeEmbeddings(DeterministicFakeEmbedding):
+    """Embeddings déterministes, avec la latence d'un aller-retour réseau par appel."""
+    latency: float = 0.03
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(self.latency)
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self.embed_query(text)
+
+
+def make_service(llm_latency: float, embedding_latency: float, max_concurrency: int, n_chunks: int = 5000) -> RAGService:
+    embedding_model = RemoteLikeEmbeddings(size=256, latency=embedding_latency)
+    texts = [f"Événement numéro {i} : concert, exposition ou atelier." for i in range(n_chunks)]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), None, embedding_model)
+
+    service = RAGService(max_concurrency=max_concurrency, load=False)
+    service.query_embedder = QueryEmbedder(embedding_model)
+    service.vectorstore = vectorstore
+    vectorstore.embedding_function = service.query_embedder
+    service.retriever = EventRetriever(vectorstore=vectorstore, metadata_index=load_metadata_index(vectorstore), k=3)
+    llm = make_fake_llm(llm_latency)
+    service.generation_chain = create_generation_chain(create_prompt_template(), llm)
+    service.rag_chain = create_rag_chain(service.retriever, create_prompt_template(), embedding_model, llm=llm)
+    return service
+
+
+async def _loop(service, questions):
+    return [await service.aask(question) for question in questions]
+
+
+def run(n_questions: int, llm_latency: float, embedding_latency: float, max_concurrency: int) -> list:
+    service = make_service(llm_latency, embedding_latency, max_concurrency)
+    results = []
+    for name, func in (("boucle aask", _loop), ("ask_many", lambda s, q: s.ask_many(q))):
+        # Questions distinctes, caches vides : on mesure le pipeline complet
+        questions = [f"Quels événements le jour {i} ? ({name})" for i in range(n_questions)]
+        service.answer_cache.clear()
+        start = time.perf_counter()
+        asyncio.run(func(service, questions))
+        seconds = time.perf_counter() - start
+        results.append({
+            "mode": name,
+            "questions": n_questions,
+            "seconds": round(seconds, 2),
+            "questions_per_second": round(n_questions / seconds, 1),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-questions", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--embedding-latency", type=float, default=0.03)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    args = parser.parse_args()
+    for row in run(args.n_questions, args.llm_latency, args.embedding_latency, args.max_concurrency):
+        print(row)
@@ -0,0 +1,105 @@
+"""
+Test de charge de /ask avec un LLM simulé (latence fixe, sans appel réseau) :
+débit en questions/s selon le nombre de clients simultanés.
+
+- mode "async" : l'endpoint attend `RAGService.aask` (chaîne exécutée avec `ainvoke`) ;
+- mode "blocking" : l'endpoint appelle la chaîne de façon synchrone, comme
+  avant `aask` ; la boucle d'événements est bloquée pendant chaque réponse.
+
+Usage :
+    python -m benchmarks.bench_ask_concurrency --llm-latency 0.2 --clients 1 4 16 64
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import httpx
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+
+from src.api import main
+from src.core.chatbot import create_prompt_template, create_rag_chain
+from src.core.faiss_manager import add_vectors_to_index, save_faiss_index, load_faiss_index
+from src.core.rag_service import RAGService
+
+
+def make_fake_llm(latency: float):
+    """LLM simulé : répond après `latency` secondes, en synchrone comme en asynchrone."""
+    def invoke(prompt):
+        time.sleep(latency)
+        return "Réponse simulée."
+
+    async def ainvoke(prompt):
+        await asyncio.sleep(latency)
+        return "Réponse simulée."
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def make_service(llm_latency: float, max_concurrency: int, n_chunks: int = 1000) -> RAGService:
+    embedding_model = DeterministicFakeEmbedding(size=64)
+    texts = [f"Concert de jazz numéro {i} à Toulouse." for i in range(n_chunks)]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), None, embedding_model)
+    index_path = tempfile.mkdtemp()
+    save_faiss_index(vectorstore, index_path)
+
+    service = RAGService(max_concurrency=max_concurrency, load=False)
+    retriever = load_faiss_index(embedding_model, index_path, mmap=True).as_retriever(search_kwargs={'k': 3})
+    service.rag_chain = create_rag_chain(retriever, create_prompt_template(), embedding_model, llm=make_fake_llm(llm_latency))
+    return service
+
+
+async def _load(n_clients: int, n_requests: int) -> float:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        queue = asyncio.Queue()
+        for i in range(n_requests):
+            queue.put_nowait(f"Y a-t-il des concerts de jazz ? ({i})")
+
+        async def worker():
+            while not queue.empty():
+                question = queue.get_nowait()
+                response = await client.post("/ask", json={"question": question})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(n_clients)))
+        return time.perf_counter() - start
+
+
+def run(llm_latency: float, clients: list, requests_per_client: int, max_concurrency: int) -> list:
+    service = make_service(llm_latency, max_concurrency)
+    main.rag_service = service
+    results = []
+    for mode in ("blocking", "async"):
+        if mode == "blocking":
+            async def aask(question):
+                return service.ask(question)
+            service.aask = aask
+        else:
+            del service.aask
+        for n_clients in clients:
+            n_requests = n_clients * requests_per_client
+            # Questions toutes différentes et cache vide : le cache de réponses ne doit pas fausser la mesure
+            service.answer_cache.clear()
+            seconds = asyncio.run(_load(n_clients, n_requests))
+            results.append({
+                "mode": mode,
+                "clients": n_clients,
+                "requests": n_requests,
+                "seconds": round(seconds, 2),
+                "questions_per_second": round(n_requests / seconds, 1),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    args = parser.parse_args()
+    for row in run(args.llm_latency, args.clients, args.requests_per_client, args.max_concurrency):
+        print(row)
@@ -0,0 +1,72 @@
+"""
+Compare l'ancien découpage en chunks (`iterrows` + un dictionnaire de
+métadonnées copié par chunk) au constructeur columnar `build_chunk_table`,
+en temps et en pic mémoire (tracemalloc), et vérifie que la vue de
+compatibilité `to_lists()` donne exactement le même résultat.
+
+Usage :
+    python -m benchmarks.bench_chunking --n-events 20000
+"""
+import argparse
+import time
+import tracemalloc
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from benchmarks.bench_clean_df import make_events_frame
+from src.core.processing import clean_df, build_chunk_table, USEFUL_METADATA_COLUMNS
+
+
+def legacy_create_chunks(df, chunk_size: int = 1000, chunk_overlap: int = 100):
+    """Version d'origine de `create_chunks_with_metadata`, conservée comme référence."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    metadata_columns = [col for col in USEFUL_METADATA_COLUMNS if col in df.columns]
+    all_chunks_text, all_chunks_metadata = [], []
+    for index, row in df.iterrows():
+        for i, chunk_text in enumerate(text_splitter.split_text(row['texte_complet'])):
+            all_chunks_text.append(chunk_text)
+            metadata = {col: row[col] for col in metadata_columns}
+            metadata['chunk_id'] = f"{row.get('id', index)}_{i}"
+            metadata['source'] = 'openagenda'
+            all_chunks_metadata.append(metadata)
+    return all_chunks_text, all_chunks_metadata
+
+
+def _measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, round(seconds, 3), round(peak / 1e6, 1)
+
+
+def run(n_events: int, chunk_size: int = 300) -> dict:
+    # Des chunks courts multiplient le nombre de chunks par événement
+    df = clean_df(make_events_frame(n_events, html_ratio=0.0))
+
+    legacy, legacy_seconds, legacy_mb = _measure(legacy_create_chunks, df, chunk_size, 50)
+    table, table_seconds, table_mb = _measure(build_chunk_table, df, chunk_size, 50)
+    _, lists_seconds, _ = _measure(table.to_lists)
+
+    return {
+        "n_events": n_events,
+        "n_chunks": len(table),
+        "legacy_seconds": legacy_seconds,
+        "legacy_peak_mb": legacy_mb,
+        "chunk_table_seconds": table_seconds,
+        "chunk_table_peak_mb": table_mb,
+        "to_lists_seconds": lists_seconds,
+        "identical_output": table.to_lists() == legacy,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-events", type=int, default=20_000)
+    parser.add_argument("--chunk-size", type=int, default=300)
+    args = parser.parse_args()
+    print(run(args.n_events, args.chunk_size))
@@ -0,0 +1,112 @@
+"""
+Benchmark de `clean_df` sur un DataFrame synthétique d'événements.
+
+Compare l'implémentation actuelle à l'ancienne version (BeautifulSoup et
+`re.sub` appliqués cellule par cellule, puis `apply(axis=1)`) et vérifie que
+les deux produisent exactement le même résultat.
+
+Usage :
+    python -m benchmarks.bench_clean_df --n-events 100000
+"""
+import argparse
+import random
+import re
+import time
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from src.core.processing import clean_df
+
+
+def legacy_clean_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Version d'origine de `clean_df`, conservée comme référence."""
+    df_cleaned = df.copy()
+    if 'mots_cles' in df_cleaned.columns:
+        df_cleaned['mots_cles'] = df_cleaned['mots_cles'].fillna('').apply(
+            lambda x: ', '.join(x) if isinstance(x, list) else str(x)
+        )
+    text_columns = [
+        'titre', 'description', 'description_complete', 'mots_cles', 'lieu',
+        'adresse', 'code_postal', 'ville', 'departement', 'conditions'
+    ]
+    for col in [c for c in text_columns if c in df_cleaned.columns]:
+        series = df_cleaned[col].fillna('').astype(str)
+        series = series.apply(lambda x: BeautifulSoup(x, "html.parser").get_text(separator=" "))
+        series = series.apply(lambda x: re.sub(r"[^a-zA-Z0-9\s.,'?!àâéèêëîïôùûüçÀÂÉÈÊËÎÏÔÙÛÜÇ-]", " ", x))
+        series = series.apply(lambda x: re.sub(r'\s+', ' ', x).strip())
+        df_cleaned[col] = series
+    cols_to_join = ['titre', 'description', 'description_complete', 'mots_cles', 'lieu', 'ville']
+    existing_cols_to_join = [col for col in cols_to_join if col in df_cleaned.columns]
+    df_cleaned['texte_complet'] = df_cleaned[existing_cols_to_join].apply(
+        lambda row: ' . '.join(val for val in row if val), axis=1
+    )
+    return df_cleaned[df_cleaned['texte_complet'] != ''].reset_index(drop=True)
+
+
+WORDS = ["concert", "Atelier", "enfants", "Toulouse", "Vézénobres", "exposition", "Noël",
+         "l'été", "patrimoine", "«gratuit»", "musée", "visite", "œnologie", "jeu", "—", "♫", "→"]
+CITIES = ["Toulouse", "Montpellier", "Nîmes", "Perpignan", "Albi", "Vézénobres", None]
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def make_events_frame(n_events: int, html_ratio: float = 0.3, seed: int = 42) -> pd.DataFrame:
+    """Génère un DataFrame (colonnes de `list_to_df`) dont une partie des cellules contient du HTML."""
+    rng = random.Random(seed)
+
+    def maybe_html(text: str) -> str:
+        if rng.random() < html_ratio:
+            return f"<p>{text}</p><br/><b>{rng.choice(WORDS)}</b> &amp; &nbsp;fin"
+        return text
+
+    rows = []
+    for i in range(n_events):
+        rows.append({
+            'id': f"evt{i}",
+            'titre': maybe_html(_sentence(rng, 4)),
+            'description': maybe_html(_sentence(rng, 15)),
+            'description_complete': maybe_html(_sentence(rng, 80)) if rng.random() < 0.8 else None,
+            'mots_cles': [rng.choice(WORDS) for _ in range(3)] if rng.random() < 0.7 else None,
+            'lieu': _sentence(rng, 2),
+            'adresse': f"{rng.randint(1, 99)} rue   des Lilas",
+            'code_postal': str(rng.randint(30000, 34999)),
+            'ville': rng.choice(CITIES),
+            'departement': "Haute-Garonne",
+            'conditions': maybe_html("Entrée libre\\tsur\\n réservation") if rng.random() < 0.5 else None,
+        })
+    return pd.DataFrame(rows)
+
+
+def run(n_events: int, skip_legacy: bool = False) -> dict:
+    df = make_events_frame(n_events)
+
+    start = time.perf_counter()
+    result = clean_df(df)
+    new_seconds = time.perf_counter() - start
+    report = {"n_events": n_events, "clean_df_seconds": round(new_seconds, 3)}
+
+    if not skip_legacy:
+        start = time.perf_counter()
+        expected = legacy_clean_df(df)
+        legacy_seconds = time.perf_counter() - start
+        identical = bool(
+            list(result.columns) == list(expected.columns)
+            and all(result[col].astype(object).tolist() == expected[col].astype(object).tolist() for col in expected.columns)
+        )
+        report.update({
+            "legacy_clean_df_seconds": round(legacy_seconds, 3),
+            "speedup": round(legacy_seconds / new_seconds, 2),
+            "identical_output": identical,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-events", type=int, default=100_000)
+    parser.add_argument("--skip-legacy", action="store_true", help="Ne mesure pas l'ancienne implémentation.")
+    args = parser.parse_args()
+    print(run(args.n_events, args.skip_legacy))
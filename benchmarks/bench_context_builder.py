@@ -0,0 +1,131 @@
+"""
+Compare la concaténation des chunks (`format_docs`) au `ContextBuilder`
+(budget de tokens, regroupement par événement, chevauchement et champs
+répétés retirés) : tokens du contexte par question (moyenne et p95),
+part des phrases distinctes du contexte d'origine conservées et temps de construction.
+
+Les chunks sont produits par le vrai découpage (`build_chunk_table`, 1000
+caractères avec 100 de chevauchement) sur des événements synthétiques à
+longue description. Chaque "question" récupère k chunks :
+  - `--retrieval retriever` (par défaut) : ceux d'`EventRetriever`, comme
+    `RAGService` (un chunk par événement), pour une question tirée du début
+    d'un chunk au hasard ;
+  - `--retrieval random` : des chunks au hasard, dont une partie sont des
+    chunks voisins d'un même événement (cas sans regroupement dans le retriever).
+
+Usage :
+    python -m benchmarks.bench_context_builder --n-events 2000 --k 3 5 --max-tokens 900
+"""
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+
+from benchmarks.bench_clean_df import make_events_frame, _sentence
+from benchmarks.fakes import HashingEmbeddings
+from src.core.chatbot import format_docs
+from src.core.faiss_manager import add_vectors_to_index
+from src.core.metadata_index import MetadataIndex
+from src.core.retrieval import EventRetriever
+from src.core.context_builder import ContextBuilder, split_sentences, DEFAULT_CONTEXT_TOKENS
+from src.core.embedding import estimate_tokens
+from src.core.processing import clean_df, build_chunk_table
+from langchain_core.documents import Document
+
+
+def make_chunks(n_events: int, seed: int = 0) -> list:
+    """Chunks (Documents) d'événements dont la description fait de 1 à 4 chunks environ."""
+    rng = random.Random(seed)
+    df = make_events_frame(n_events, html_ratio=0.0, seed=seed)
+    # Comme souvent sur OpenAgenda, la description complète reprend la description courte
+    df['description_complete'] = [
+        f"{description}. " + ". ".join(_sentence(rng, 30) for _ in range(rng.randint(2, 16)))
+        for description in df['description']
+    ]
+    df['date_debut'] = [f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T20:00:00+00:00" for _ in range(n_events)]
+    df['date_fin'] = df['date_debut']
+    df['url'] = [f"https://openagenda.com/events/{i}" for i in range(n_events)]
+    texts, metadatas = build_chunk_table(clean_df(df)).to_lists()
+    return [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+
+
+def sample_retrievals(chunks: list, k: int, n_questions: int, neighbour_ratio: float = 0.5, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    position_of = {doc.metadata['chunk_id']: i for i, doc in enumerate(chunks)}
+    retrievals = []
+    for _ in range(n_questions):
+        picked = [rng.randrange(len(chunks))]
+        while len(picked) < k:
+            event_id, number = chunks[picked[-1]].metadata['chunk_id'].rsplit("_", 1)
+            neighbour = position_of.get(f"{event_id}_{int(number) + 1}")
+            if neighbour is not None and neighbour not in picked and rng.random() < neighbour_ratio:
+                picked.append(neighbour)
+            else:
+                picked.append(rng.randrange(len(chunks)))
+        retrievals.append([chunks[i] for i in picked])
+    return retrievals
+
+
+def retriever_retrievals(chunks: list, k: int, n_questions: int, seed: int = 0) -> list:
+    """Chunks retournés par `EventRetriever` (réglages par défaut) pour des questions tirées du début de chunks au hasard."""
+    rng = random.Random(seed)
+    embedding_model = HashingEmbeddings(size=256)
+    texts, metadatas = [doc.page_content for doc in chunks], [doc.metadata for doc in chunks]
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), metadatas, embedding_model)
+    retriever = EventRetriever(
+        vectorstore=vectorstore, metadata_index=MetadataIndex.from_metadatas(metadatas), k=k, extract_filters=False
+    )
+    questions = [" ".join(texts[rng.randrange(len(texts))].split()[:12]) for _ in range(n_questions)]
+    return [retriever.search_by_vector(vector) for vector in embedding_model.embed_documents(questions)]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def _sentences_kept(naive: str, built: str) -> float:
+    """Part des phrases distinctes du contexte d'origine qui se retrouvent dans le contexte construit (en-têtes compris)."""
+    sentences = {_normalize(sentence) for sentence in split_sentences(naive)} - {""}
+    built = _normalize(built)
+    return sum(sentence in built for sentence in sentences) / max(1, len(sentences))
+
+
+def run(n_events: int, k: int, max_tokens: int, n_questions: int = 500, retrieval: str = "retriever") -> dict:
+    chunks = make_chunks(n_events)
+    builder = ContextBuilder(max_tokens=max_tokens)
+    retrievals = (retriever_retrievals if retrieval == "retriever" else sample_retrievals)(chunks, k, n_questions)
+    naive_tokens, built_tokens, kept, seconds = [], [], [], []
+    for docs in retrievals:
+        naive = format_docs(docs)
+        start = time.perf_counter()
+        built = builder(docs)
+        seconds.append(time.perf_counter() - start)
+        naive_tokens.append(estimate_tokens(naive))
+        built_tokens.append(estimate_tokens(built))
+        kept.append(_sentences_kept(naive, built))
+    return {
+        "retrieval": retrieval,
+        "k": k,
+        "max_tokens": max_tokens,
+        "naive_tokens_mean": round(float(np.mean(naive_tokens)), 1),
+        "naive_tokens_p95": round(float(np.percentile(naive_tokens, 95)), 1),
+        "built_tokens_mean": round(float(np.mean(built_tokens)), 1),
+        "built_tokens_p95": round(float(np.percentile(built_tokens, 95)), 1),
+        "token_reduction": round(1 - float(np.mean(built_tokens)) / float(np.mean(naive_tokens)), 3),
+        "sentences_kept": round(float(np.mean(kept)), 3),
+        "build_ms_p50": round(float(np.percentile(seconds, 50)) * 1e3, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-events", type=int, default=2000)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_CONTEXT_TOKENS)
+    parser.add_argument("--n-questions", type=int, default=500)
+    parser.add_argument("--retrieval", choices=["retriever", "random"], default="retriever")
+    args = parser.parse_args()
+    for k in args.k:
+        print(run(args.n_events, k, args.max_tokens, args.n_questions, args.retrieval))
@@ -0,0 +1,84 @@
+"""
+Mesure l'effet du regroupement par événement et de la sélection MMR de
+`EventRetriever` : nombre moyen d'événements distincts parmi les k chunks
+retournés (distinct-events@k) et latence d'une recherche (p50 / p99,
+embedding de la question exclu), par rapport à la recherche FAISS seule.
+
+Les vecteurs sont synthétiques : des thèmes (grappes), des événements
+autour de chaque thème, et des chunks très proches de leur événement. Le
+nombre de chunks par événement suit une loi de Zipf, comme les longues
+descriptions d'OpenAgenda qui donnent beaucoup de chunks.
+
+Usage :
+    python -m benchmarks.bench_event_diversity --n-events 20000 --k 5
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from src.core.faiss_manager import add_vectors_to_index
+from src.core.metadata_index import MetadataIndex
+from src.core.retrieval import EventRetriever
+
+
+def make_events(n_events: int, dim: int, n_topics: int = 200, max_chunks: int = 12, seed: int = 0):
+    """Vecteurs unitaires des chunks et identifiant d'événement de chaque chunk."""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim), dtype=np.float32)
+    events = topics[rng.integers(0, n_topics, n_events)] + 0.6 * rng.standard_normal((n_events, dim), dtype=np.float32)
+    chunks_per_event = np.minimum(rng.zipf(1.6, n_events), max_chunks)
+    event_of_chunk = np.repeat(np.arange(n_events), chunks_per_event)
+    vectors = events[event_of_chunk] + 0.15 * rng.standard_normal((len(event_of_chunk), dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = topics[rng.integers(0, n_topics, 200)] + 0.6 * rng.standard_normal((200, dim), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, event_of_chunk, queries
+
+
+def run(n_events: int, dim: int, k: int = 5, candidates: int = 20) -> list:
+    vectors, event_of_chunk, queries = make_events(n_events, dim)
+    metadatas = [{'id': str(event), 'chunk_id': f"{event}_{i}"} for i, event in enumerate(event_of_chunk)]
+    texts = [metadata['chunk_id'] for metadata in metadatas]
+    embedding_model = DeterministicFakeEmbedding(size=dim)
+    vectorstore = add_vectors_to_index(None, texts, vectors.tolist(), metadatas, embedding_model, index_factory="Flat")
+    metadata_index = MetadataIndex.from_metadatas(metadatas)
+
+    configurations = {
+        "faiss": dict(collapse_events=False, mmr_lambda=None),
+        "collapse": dict(collapse_events=True, mmr_lambda=None),
+        "collapse+mmr": dict(collapse_events=True, mmr_lambda=0.7),
+    }
+    results, baseline_ms = [], None
+    for name, options in configurations.items():
+        retriever = EventRetriever(
+            vectorstore=vectorstore, metadata_index=metadata_index, k=k, candidates=candidates, **options
+        )
+        latencies, distinct = np.empty(len(queries)), np.empty(len(queries))
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            docs = retriever.search_by_vector(query)
+            latencies[i] = time.perf_counter() - start
+            distinct[i] = len({doc.metadata['id'] for doc in docs})
+        p50_ms = float(np.percentile(latencies, 50)) * 1e3
+        baseline_ms = baseline_ms or p50_ms
+        results.append({
+            "mode": name,
+            f"distinct_events@{k}": round(float(distinct.mean()), 2),
+            "p50_ms": round(p50_ms, 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)) * 1e3, 3),
+            "overhead_p50_ms": round(p50_ms - baseline_ms, 3),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-events", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=20)
+    args = parser.parse_args()
+    for row in run(args.n_events, args.dim, args.k, args.candidates):
+        print(row)
@@ -0,0 +1,101 @@
+"""
+Compare l'index exact (Flat) aux index approximatifs de `build_faiss_index`
+(IVF-Flat, HNSW, IVF-PQ) : temps de construction, taille en mémoire,
+latence d'une requête (p50 / p99, un vecteur à la fois comme dans l'API)
+et rappel@k par rapport à la recherche exacte, pour plusieurs réglages
+de `nprobe` / `efSearch`.
+
+Les vecteurs sont synthétiques : des grappes gaussiennes normalisées,
+de la dimension de mistral-embed, pour imiter des embeddings de textes proches.
+
+Usage :
+    python -m benchmarks.bench_faiss_ann --n-vectors 100000 --dim 1024
+"""
+import argparse
+import math
+import time
+
+import faiss
+import numpy as np
+
+from src.core.faiss_manager import build_faiss_index, set_search_params
+
+
+def make_vectors(n_vectors: int, dim: int, n_clusters: int = 500, seed: int = 0) -> np.ndarray:
+    """Vecteurs unitaires répartis en grappes, comme des embeddings de textes."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, n_clusters, n_vectors)]
+    vectors += 1.5 * rng.standard_normal((n_vectors, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _search_latencies(index, queries: np.ndarray, k: int):
+    # Latence d'une requête isolée, sur un seul cœur, comme dans un worker de l'API
+    n_threads = faiss.omp_get_max_threads()
+    faiss.omp_set_num_threads(1)
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids[i] = index.search(query[None, :], k)
+        latencies[i] = time.perf_counter() - start
+    faiss.omp_set_num_threads(n_threads)
+    return ids, latencies
+
+
+def _recall(ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(found, expected)) for found, expected in zip(ids, exact_ids))
+    return hits / exact_ids.size
+
+
+def run(n_vectors: int, dim: int, n_queries: int = 200, k: int = 10) -> list:
+    vectors = make_vectors(n_vectors + n_queries, dim)
+    vectors, queries = vectors[:n_vectors], vectors[n_vectors:]
+
+    nlist = max(1, int(math.sqrt(n_vectors)))
+    pq_m = next(m for m in (64, 32, 16, 8, 4, 2, 1) if dim % m == 0)
+    configurations = [
+        ("Flat", {}),
+        (f"IVF{nlist},Flat", {"nprobe": [1, 8, 32, 128]}),
+        ("HNSW32", {"ef_search": [16, 64, 256]}),
+        (f"IVF{nlist},PQ{pq_m}", {"nprobe": [8, 32, 128]}),
+    ]
+
+    results, exact_ids = [], None
+    for index_factory, sweeps in configurations:
+        start = time.perf_counter()
+        index = build_faiss_index(vectors, index_factory)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        settings = [(name, value) for name, values in sweeps.items() for value in values] or [(None, None)]
+        for name, value in settings:
+            if name is not None:
+                set_search_params(index, **{name: value})
+            ids, latencies = _search_latencies(index, queries, k)
+            if exact_ids is None:
+                exact_ids = ids
+            results.append({
+                "index": index_factory,
+                "setting": f"{name}={value}" if name else "-",
+                "build_seconds": round(build_seconds, 2),
+                "size_mb": round(size_mb, 1),
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1e3, 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)) * 1e3, 3),
+                f"recall@{k}": round(_recall(ids, exact_ids), 3),
+            })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-vectors", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    for row in run(args.n_vectors, args.dim, args.n_queries, args.k):
+        print(row)
@@ -0,0 +1,151 @@
+"""
+Compare la recherche vectorielle seule, la recherche lexicale (BM25) seule
+et la recherche hybride (fusion RRF de `EventRetriever`) sur les questions
+de `Scripts/evaluate.py` : rappel@k et latence d'une recherche (p50 / p99,
+embedding de la question exclu).
+
+Entièrement hors ligne : le corpus est synthétique (événements d'Occitanie,
+villes tirées selon une loi de Zipf, donc des petites communes comme
+Vézénobres très rares) et l'embedding est un sac de mots haché dans un
+petit nombre de dimensions, dont les collisions brouillent les termes
+rares comme le ferait un modèle dense. Un chunk est pertinent pour une
+question s'il contient tous ses termes clés ; le rappel est normalisé par
+min(k, nombre de chunks pertinents).
+
+Avec `--index-path`, le benchmark porte sur un index réel (clé Mistral
+nécessaire pour l'embedding des questions).
+
+Usage :
+    python -m benchmarks.bench_hybrid_retrieval --n-chunks 50000 --k 5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.fakes import HashingEmbeddings
+from Scripts.evaluate import EVAL_QUESTIONS
+from src.core.bm25 import tokenize
+from src.core.faiss_manager import add_vectors_to_index
+from src.core.retrieval import EventRetriever, load_bm25_index
+
+# Termes clés d'un chunk pertinent, pour chaque question de EVAL_QUESTIONS
+KEY_TERMS = [
+    "atelier enfants Toulouse",
+    "exposition art",
+    "cave vin Vézénobres",
+    "noël Montpellier",
+]
+
+CITIES = [
+    "Toulouse", "Montpellier", "Nîmes", "Perpignan", "Béziers", "Montauban", "Narbonne", "Albi",
+    "Carcassonne", "Sète", "Castres", "Tarbes", "Rodez", "Cahors", "Auch", "Millau", "Foix",
+    "Mende", "Lunel", "Uzès", "Figeac", "Lodève", "Pézenas", "Collioure", "Vézénobres",
+]
+
+THEMES = [
+    ("Atelier créatif pour enfants", "peinture, collage et bricolage pour les petits créateurs"),
+    ("Exposition d'art contemporain", "peintures et sculptures d'artistes de la région"),
+    ("Visite de cave à vin", "dégustation et découverte du domaine viticole"),
+    ("Marché de Noël", "chalets, artisans et vin chaud pour les fêtes"),
+    ("Concert de jazz", "soirée musicale en plein air avec un quartet"),
+    ("Randonnée commentée", "balade nature accompagnée par un guide"),
+    ("Spectacle de théâtre", "pièce classique jouée par une troupe locale"),
+    ("Festival de cinéma", "projections, rencontres et courts métrages"),
+]
+
+FILLER = "programme gratuit inscription réservation public famille horaires accueil parking salle centre".split()
+
+
+def make_corpus(n_chunks: int, seed: int = 0) -> list[str]:
+    """Descriptions d'événements synthétiques : thème, ville (loi de Zipf) et mots de remplissage."""
+    rng = np.random.default_rng(seed)
+    city_weights = 1.0 / np.arange(1, len(CITIES) + 1) ** 1.2
+    cities = rng.choice(len(CITIES), n_chunks, p=city_weights / city_weights.sum())
+    themes = rng.integers(0, len(THEMES), n_chunks)
+    texts = []
+    for city, theme in zip(cities, themes):
+        title, description = THEMES[theme]
+        filler = " ".join(rng.choice(FILLER, rng.integers(3, 15)))
+        texts.append(f"{title} à {CITIES[city]}. {description.capitalize()}. {filler}.")
+    return texts
+
+
+def is_relevant(text: str, key_terms: str) -> bool:
+    return set(tokenize(key_terms)) <= set(tokenize(text))
+
+
+def _time(search, repeats: int):
+    latencies = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = search()
+        latencies[i] = time.perf_counter() - start
+    return result, latencies
+
+
+def run(vectorstore, texts: list[str], k: int = 5, repeats: int = 50) -> list:
+    embedding_model = vectorstore.embedding_function
+    bm25 = load_bm25_index(vectorstore)
+    retrievers = {
+        "vector": EventRetriever(vectorstore=vectorstore, k=k),
+        "hybrid": EventRetriever(vectorstore=vectorstore, bm25=bm25, k=k),
+    }
+    n_relevant = [sum(is_relevant(text, key_terms) for text in texts) for key_terms in KEY_TERMS]
+    vectors = [embedding_model.embed_query(question) for question in EVAL_QUESTIONS]
+
+    searches = {
+        "vector": lambda vector, question: retrievers["vector"].search_by_vector(vector),
+        "bm25": lambda vector, question: retrievers["vector"]._documents(bm25.search(question, k)[0]),
+        "hybrid": lambda vector, question: retrievers["hybrid"].search_by_vector(vector, None, question),
+    }
+    results = []
+    for mode, search in searches.items():
+        recalls, latencies = [], []
+        for question, vector, key_terms, expected in zip(EVAL_QUESTIONS, vectors, KEY_TERMS, n_relevant):
+            docs, question_latencies = _time(lambda: search(vector, question), repeats)
+            latencies.append(question_latencies)
+            found = sum(is_relevant(doc.page_content, key_terms) for doc in docs)
+            recalls.append(found / max(1, min(k, expected)))
+        latencies = np.concatenate(latencies)
+        results.append({
+            "mode": mode,
+            f"recall@{k}": round(float(np.mean(recalls)), 3),
+            "recall_per_question": [round(recall, 2) for recall in recalls],
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1e3, 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)) * 1e3, 3),
+        })
+    return results
+
+
+def synthetic_vectorstore(n_chunks: int, dim: int):
+    texts = make_corpus(n_chunks)
+    embedding_model = HashingEmbeddings(size=dim)
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), None, embedding_model, index_factory="Flat")
+    return vectorstore, texts
+
+
+def real_vectorstore(index_path: str):
+    from src.core.embedding import get_embedding_model
+    from src.core.faiss_manager import load_faiss_index
+
+    vectorstore = load_faiss_index(get_embedding_model(), index_path, mmap=True)
+    docstore, index_to_docstore_id = vectorstore.docstore, vectorstore.index_to_docstore_id
+    texts = [docstore.search(index_to_docstore_id[position]).page_content for position in range(vectorstore.index.ntotal)]
+    return vectorstore, texts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-chunks", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--index-path", default=None, help="Index réel à évaluer au lieu du corpus synthétique")
+    args = parser.parse_args()
+    if args.index_path:
+        vectorstore, texts = real_vectorstore(args.index_path)
+    else:
+        vectorstore, texts = synthetic_vectorstore(args.n_chunks, args.dim)
+    for row in run(vectorstore, texts, args.k, args.repeats):
+        print(row)
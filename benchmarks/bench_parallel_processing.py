@@ -0,0 +1,52 @@
+"""
+Mesure le débit du nettoyage et du découpage en chunks selon le nombre de
+processus (`clean_df_parallel`, `create_chunks_parallel`), et vérifie que
+chaque configuration produit exactement les mêmes chunks que le traitement
+en série.
+
+Usage :
+    python -m benchmarks.bench_parallel_processing --n-events 50000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+from benchmarks.bench_clean_df import make_events_frame
+from src.core.processing import clean_df_parallel, create_chunks_parallel, filter_and_dedup
+
+
+def run(n_events: int, workers: list) -> list:
+    df = make_events_frame(n_events, html_ratio=0.1)
+    reports = []
+    reference = None
+
+    for n_workers in workers:
+        start = time.perf_counter()
+        df_cleaned = clean_df_parallel(df, n_workers)
+        clean_seconds = time.perf_counter() - start
+
+        df_final = filter_and_dedup(df_cleaned, min_chars=0)
+
+        start = time.perf_counter()
+        chunks = create_chunks_parallel(df_final, n_workers)
+        chunk_seconds = time.perf_counter() - start
+
+        if reference is None:
+            reference = chunks
+        reports.append({
+            "n_workers": n_workers,
+            "clean_seconds": round(clean_seconds, 3),
+            "chunk_seconds": round(chunk_seconds, 3),
+            "events_per_second": round(n_events / (clean_seconds + chunk_seconds)),
+            "identical_to_first": chunks == reference,
+        })
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-events", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+    for report in run(args.n_events, args.workers):
+        print(report)
@@ -0,0 +1,91 @@
+"""
+Mesure l'apport du reranking sur les questions de `Scripts/evaluate.py` :
+précision@k (part des k chunks retournés qui sont pertinents) et surcoût
+de latence du reranker (p50 / p95), pour plusieurs tailles de réservoir de
+candidats (`rerank_pool`).
+
+Reprend le corpus synthétique hors ligne de `bench_hybrid_retrieval`
+(événements d'Occitanie, embedding haché), avec des métadonnées (ville,
+date) pour les caractéristiques du `FeatureReranker`.
+
+Usage :
+    python -m benchmarks.bench_reranker --n-chunks 20000 --k 3
+"""
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+
+from benchmarks.bench_hybrid_retrieval import KEY_TERMS, make_corpus, is_relevant
+from benchmarks.fakes import HashingEmbeddings
+from Scripts.evaluate import EVAL_QUESTIONS
+from src.core.faiss_manager import add_vectors_to_index
+from src.core.metadata_index import MetadataIndex
+from src.core.reranker import create_reranker
+from src.core.retrieval import EventRetriever, load_bm25_index
+
+
+def make_vectorstore(n_chunks: int, dim: int, seed: int = 0):
+    rng = random.Random(seed)
+    texts = make_corpus(n_chunks, seed)
+    metadatas = [
+        {
+            'id': str(i), 'chunk_id': f"{i}_0",
+            'ville': re.search(r" à ([^.]+)\.", text).group(1),
+            'date_debut': f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T20:00:00+00:00",
+        }
+        for i, text in enumerate(texts)
+    ]
+    embedding_model = HashingEmbeddings(size=dim)
+    vectorstore = add_vectors_to_index(None, texts, embedding_model.embed_documents(texts), metadatas, embedding_model, index_factory="Flat")
+    return vectorstore, MetadataIndex.from_metadatas(metadatas)
+
+
+def _precision(docs, key_terms: str, k: int) -> float:
+    return sum(is_relevant(doc.page_content, key_terms) for doc in docs) / k
+
+
+def run(n_chunks: int, dim: int, k: int, pools: list, reranker_name: str, repeats: int = 20) -> list:
+    vectorstore, metadata_index = make_vectorstore(n_chunks, dim)
+    bm25 = load_bm25_index(vectorstore)
+    reranker = create_reranker(reranker_name)
+    configurations = [("none", None, k)] + [(reranker_name, reranker, pool) for pool in pools]
+
+    results = []
+    for name, configured_reranker, pool in configurations:
+        retriever = EventRetriever(
+            vectorstore=vectorstore, metadata_index=metadata_index, bm25=bm25,
+            reranker=configured_reranker, rerank_pool=pool, candidates=max(20, pool), k=k
+        )
+        precisions, latencies = [], []
+        for question, key_terms in zip(EVAL_QUESTIONS, KEY_TERMS):
+            vector = vectorstore.embedding_function.embed_query(question)
+            filters = retriever.filters_for(question)
+            for _ in range(repeats):
+                start = time.perf_counter()
+                docs = retriever.search_by_vector(vector, filters, question)
+                latencies.append(time.perf_counter() - start)
+            precisions.append(_precision(docs, key_terms, k))
+        results.append({
+            "reranker": name,
+            "pool": pool,
+            f"precision@{k}": round(float(np.mean(precisions)), 3),
+            "precision_per_question": [round(p, 2) for p in precisions],
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1e3, 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)) * 1e3, 3),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-chunks", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--pools", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--reranker", default="features", help='"features" ou "cross-encoder[:<modèle>]"')
+    args = parser.parse_args()
+    for row in run(args.n_chunks, args.dim, args.k, args.pools, args.reranker):
+        print(row)
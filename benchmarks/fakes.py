@@ -0,0 +1,135 @@
+"""
+Backends simulés pour les benchmarks hors ligne : ni clé Mistral ni réseau.
+
+- `HashingEmbeddings` : sac de mots haché et normalisé (les textes proches
+  ont des vecteurs proches, contrairement aux embeddings aléatoires) ;
+- `FakeMistralEmbeddings` : même embedding, avec l'interface de
+  `MistralAIEmbeddings` (`model`, `mistral_api_key`, méthodes asynchrones)
+  et une latence simulée par appel ;
+- `FakeChatMistral` : modèle de chat au comportement de `ChatMistralAI`
+  (réponse, usage des tokens), déterministe, avec une latence simulée.
+"""
+import asyncio
+import re
+import time
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.core.bm25 import tokenize
+from src.core.embedding import estimate_tokens
+
+# Titre du premier événement du contexte (en-tête "### <titre> (<dates> | <ville> | <lien>)", voir `metadata_line`)
+TITLE_PATTERN = re.compile(r"^\s*###\s*([^(\n]+?)\s*(?:\(|$)", re.MULTILINE)
+
+NO_ANSWER = "Je n'ai pas trouvé d'information à ce sujet."
+
+
+class HashingEmbeddings(Embeddings):
+    """Sac de mots haché (sans idf) dans `size` dimensions, normalisé."""
+
+    def __init__(self, size: int = 64):
+        self.size = size
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for term in tokenize(text):
+            vector[zlib.crc32(term.encode()) % self.size] += 1.0
+        return (vector / max(np.linalg.norm(vector), 1e-9)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class FakeMistralEmbeddings(HashingEmbeddings):
+    """
+    Remplaçant de `MistralAIEmbeddings` : 1024 dimensions comme "mistral-embed",
+    `latency` secondes par appel (un lot de textes = un appel). `calls`
+    compte les appels, `texts` les textes embeddés.
+    """
+
+    def __init__(self, size: int = 1024, latency: float = 0.0, model: str = "mistral-embed", mistral_api_key: str = "fake-key"):
+        super().__init__(size)
+        self.latency = latency
+        self.model = model
+        self.mistral_api_key = mistral_api_key
+        self.calls = 0
+        self.texts = 0
+
+    def _count(self, n_texts: int) -> None:
+        self.calls += 1
+        self.texts += n_texts
+
+    def embed_documents(self, texts):
+        self._count(len(texts))
+        if self.latency:
+            time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        self._count(len(texts))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatMistral(BaseChatModel):
+    """
+    Remplaçant de `ChatMistralAI` : répond, après `latency` secondes, par le
+    titre du premier événement du contexte (ou qu'il n'a rien trouvé), et
+    rapporte l'usage des tokens comme l'API Mistral (`llm_output["token_usage"]`
+    et `usage_metadata` du message), d'après `estimate_tokens`.
+    """
+    model: str = "open-mistral-7b"
+    temperature: float = 0.1
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-mistral-chat"
+
+    def _respond(self, messages) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        title = TITLE_PATTERN.search(prompt)
+        answer = f"Je vous recommande : {title.group(1)}." if title else NO_ANSWER
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(answer)
+        usage = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        message = AIMessage(content=answer, usage_metadata=usage)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={
+                "token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": usage["total_tokens"]},
+                "model_name": self.model,
+            },
+        )
+
+    def _combine_llm_outputs(self, llm_outputs: list) -> dict:
+        # Comme ChatMistralAI : usage cumulé des appels d'un même `generate`
+        token_usage = {}
+        for output in llm_outputs:
+            for name, count in ((output or {}).get("token_usage") or {}).items():
+                token_usage[name] = token_usage.get(name, 0) + count
+        return {"token_usage": token_usage, "model_name": self.model}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(messages)
@@ -0,0 +1,272 @@
+"""
+Suite de benchmarks hors ligne de l'indexation et des réponses, sans clé
+Mistral ni réseau : embeddings et LLM simulés (`benchmarks.fakes`),
+événements OpenAgenda synthétiques (`benchmarks.synthetic`).
+
+Étapes mesurées (p50 / p95 / moyenne, en ms par appel) :
+  - indexation : `list_to_df`, `clean_df`, `filter_and_dedup`,
+    `create_chunks_with_metadata`, `create_faiss_index_from_vectors`
+    (sauvegarde comprise), `load_faiss_index` (projeté en mémoire ou non) ;
+  - recherche : `EventRetriever.search_by_vector` (question déjà embeddée)
+    et `EventRetriever.search`, sur l'index chargé par `RAGService`, pour des
+    questions dont la ville et le mois sont ceux d'événements synthétiques
+    (les périodes sont comptées à partir de la date de référence des
+    événements, pas du jour de l'exécution) ;
+  - bout en bout : POST /ask via le `TestClient` de FastAPI, cache de
+    réponses vide ("ask") puis rempli ("ask_cached").
+
+Les résultats sont écrits en JSON avec le commit courant, pour comparer
+deux versions du code (`--compare` : écart des p50 avec un fichier précédent).
+
+Usage :
+    python -m benchmarks.run --n-events 5000 --output benchmarks/results/avant.json
+    python -m benchmarks.run --n-events 5000 --compare benchmarks/results/avant.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from benchmarks.fakes import NO_ANSWER, FakeChatMistral, FakeMistralEmbeddings
+from benchmarks.synthetic import REFERENCE_DATE, make_openagenda_records
+from Scripts.evaluate import EVAL_QUESTIONS
+from src.api import main
+from src.core.answer_cache import AnswerCache
+from src.core.faiss_manager import DEFAULT_INDEX_FACTORY, create_faiss_index_from_vectors, load_faiss_index
+from src.core.index_registry import IndexRegistry
+from src.core.observability import LLMMetricsCallback
+from src.core.processing import clean_df, create_chunks_with_metadata, filter_and_dedup, list_to_df
+from src.core.rag_service import RAGService
+
+MONTHS = ["janvier", "février", "mars", "avril", "mai", "juin", "juillet", "août", "septembre", "octobre", "novembre", "décembre"]
+
+
+def make_questions(n_questions: int, records: list, seed: int = 0) -> list[str]:
+    """
+    Les questions de `Scripts/evaluate.py`, complétées par des questions thème / ville / mois, toutes distinctes,
+    tirées d'événements synthétiques (avec une description complète) : leurs filtres retiennent au moins un chunk.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = [record for record in records if record["longdescription_fr"]]
+    questions = list(EVAL_QUESTIONS)
+    while len(questions) < n_questions and candidates:
+        record = candidates[rng.integers(len(candidates))]
+        title = record["title_fr"].rsplit(" n°", 1)[0]
+        month = MONTHS[datetime.fromisoformat(record["firstdate_begin"]).month - 1]
+        question = f"{title} à {record['location_city']} en {month} ?"
+        if question not in questions:
+            questions.append(question)
+    return questions[:n_questions]
+
+
+def _check_found(questions: list, found: list, stage: str) -> None:
+    """Une étape qui ne trouve rien pour une question mesurerait une recherche vide."""
+    missing = [question for question, ok in zip(questions, found) if not ok]
+    if missing:
+        raise RuntimeError(f"{stage} : aucun document pour {len(missing)} question(s), par exemple {missing[0]!r}.")
+
+
+def _row(name: str, latencies: list, items: int | None = None) -> dict:
+    """Statistiques de durée d'une étape ; `items` : nombre d'éléments traités par appel."""
+    latencies = np.asarray(latencies) * 1e3
+    row = {
+        "name": name,
+        "calls": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+    }
+    if items is not None:
+        row["items"] = items
+        row["items_per_s"] = round(items / max(float(np.percentile(latencies, 50)) / 1e3, 1e-9), 1)
+    return row
+
+
+def _timed(func, repeats: int):
+    """Appelle `func` `repeats` fois ; retourne son dernier résultat et les durées (en secondes)."""
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        latencies.append(time.perf_counter() - start)
+    return result, latencies
+
+
+def _timed_each(func, arguments: list):
+    """Appelle `func` sur chaque argument ; retourne les résultats et les durées (en secondes)."""
+    results, latencies = [], []
+    for argument in arguments:
+        start = time.perf_counter()
+        results.append(func(argument))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def bench_indexing(records: list, embedding_model, index_root: str, repeats: int, index_factory: str) -> tuple:
+    """Étapes du pipeline d'indexation ; publie le dernier index construit dans `index_root`."""
+    rows = []
+    raw, latencies = _timed(lambda: list_to_df(records), repeats)
+    rows.append(_row("list_to_df", latencies, len(records)))
+    cleaned, latencies = _timed(lambda: clean_df(raw), repeats)
+    rows.append(_row("clean_df", latencies, len(raw)))
+    deduped, latencies = _timed(lambda: filter_and_dedup(cleaned), repeats)
+    rows.append(_row("filter_and_dedup", latencies, len(cleaned)))
+    (chunks, metadatas), latencies = _timed(lambda: create_chunks_with_metadata(deduped), repeats)
+    rows.append(_row("create_chunks_with_metadata", latencies, len(deduped)))
+
+    # Embedding simulé : hors mesure, il ne dit rien du coût de l'API Mistral
+    vectors = embedding_model.embed_documents(chunks)
+    registry = IndexRegistry(index_root)
+    latencies = []
+    for _ in range(repeats):
+        staging_path = registry.create_staging()
+        start = time.perf_counter()
+        create_faiss_index_from_vectors(chunks, vectors, metadatas, embedding_model, staging_path, index_factory)
+        latencies.append(time.perf_counter() - start)
+        if len(latencies) < repeats:
+            registry.discard(staging_path)
+    registry.publish(staging_path)
+    rows.append(_row("create_faiss_index_from_vectors", latencies, len(chunks)))
+
+    for mmap in (True, False):
+        _, latencies = _timed(lambda: load_faiss_index(embedding_model, index_root, mmap=mmap), repeats)
+        rows.append(_row(f"load_faiss_index[mmap={mmap}]", latencies, len(chunks)))
+    return rows, {"events": len(records), "events_kept": len(deduped), "chunks": len(chunks)}
+
+
+def bench_retrieval(service: RAGService, questions: list) -> list:
+    retriever = service.retriever
+    vectors = service.embedding_model.embed_documents(questions)
+    results, latencies = _timed_each(
+        lambda item: retriever.search_by_vector(item[1], retriever.filters_for(item[0]), item[0]), list(zip(questions, vectors))
+    )
+    _check_found(questions, results, "retrieval.search_by_vector")
+    rows = [_row("retrieval.search_by_vector", latencies)]
+    # Avec l'embedding (simulé) de la question, via le cache de `QueryEmbedder`
+    results, latencies = _timed_each(retriever.search, questions)
+    _check_found(questions, results, "retrieval.search")
+    rows.append(_row("retrieval.search", latencies))
+    return rows
+
+
+def bench_ask(service: RAGService, questions: list) -> list:
+    """POST /ask de bout en bout, cache de réponses vide puis rempli par le premier passage."""
+    # Le service de l'API est remplacé le temps de la mesure seulement
+    previous_service, main.rag_service = main.rag_service, service
+    try:
+        client = TestClient(main.app)
+        service.answer_cache.clear()
+
+        def ask(question):
+            response = client.post("/ask", json={"question": question})
+            response.raise_for_status()
+            return response.json()["answer"]
+
+        rows = []
+        for name in ("ask", "ask_cached"):
+            answers, latencies = _timed_each(ask, questions)
+            # Le LLM simulé ne répond `NO_ANSWER` que si le contexte est vide
+            _check_found(questions, [answer != NO_ANSWER for answer in answers], name)
+            rows.append(_row(name, latencies))
+        return rows
+    finally:
+        main.rag_service = previous_service
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(n_events: int = 5000, dim: int = 256, repeats: int = 3, n_questions: int = 50,
+        llm_latency: float = 0.0, index_factory: str = DEFAULT_INDEX_FACTORY, seed: int = 0) -> dict:
+    # Événements et périodes des questions ("en mars") sont datés par rapport au même jour :
+    # les résultats ne dépendent pas de la date d'exécution
+    records = make_openagenda_records(n_events, seed=seed, reference_date=REFERENCE_DATE)
+    embedding_model = FakeMistralEmbeddings(size=dim)
+    questions = make_questions(n_questions, records, seed)
+    with tempfile.TemporaryDirectory() as index_root:
+        rows, corpus = bench_indexing(records, embedding_model, index_root, repeats, index_factory)
+        # Chargement réel de l'index publié ; cache sémantique désactivé pour que chaque question aille jusqu'au LLM
+        service = RAGService(
+            load=False, index_path=index_root, answer_cache=AnswerCache(similarity_threshold=None),
+            embedding_model=embedding_model, llm=FakeChatMistral(latency=llm_latency, callbacks=[LLMMetricsCallback()])
+        )
+        if not service.load_components():
+            raise RuntimeError("Le service RAG n'a pas pu charger l'index synthétique.")
+        service.retriever.today = REFERENCE_DATE.date()
+        rows += bench_retrieval(service, questions)
+        rows += bench_ask(service, questions)
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "n_events": n_events, "dim": dim, "repeats": repeats, "n_questions": n_questions,
+            "llm_latency": llm_latency, "index_factory": index_factory, "seed": seed,
+        },
+        "corpus": corpus,
+        "results": rows,
+    }
+
+
+def compare(previous: dict, current: dict) -> list:
+    """Écart relatif des p50 de chaque étape entre deux exécutions (positif = plus lent)."""
+    before = {row["name"]: row for row in previous["results"]}
+    rows = []
+    for row in current["results"]:
+        if row["name"] in before:
+            reference = before[row["name"]]["p50_ms"]
+            rows.append({
+                "name": row["name"],
+                "p50_ms_before": reference,
+                "p50_ms": row["p50_ms"],
+                "change": f"{(row['p50_ms'] / reference - 1) * 100:+.1f}%" if reference else None,
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-events", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256, help="Dimension des embeddings simulés (1024 pour mistral-embed)")
+    parser.add_argument("--repeats", type=int, default=3, help="Répétitions des étapes d'indexation")
+    parser.add_argument("--n-questions", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Latence simulée du LLM, en secondes")
+    parser.add_argument("--index-factory", default=DEFAULT_INDEX_FACTORY)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Fichier JSON (par défaut : benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Résultats JSON d'une exécution précédente")
+    args = parser.parse_args()
+    # Les étapes répétées journaliseraient à chaque appel
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = run(args.n_events, args.dim, args.repeats, args.n_questions, args.llm_latency, args.index_factory, args.seed)
+    for row in report["results"]:
+        print(row)
+
+    output = args.output or os.path.join("benchmarks", "results", f"{(report['commit'] or 'local')[:12]}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Résultats écrits dans {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        for row in compare(previous, report):
+            print(row)
@@ -0,0 +1,128 @@
+"""
+Générateur d'événements OpenAgenda synthétiques, au format brut de l'API
+(champs `*_fr`, `location_*`, dates ISO...), tel que le reçoit `list_to_df`.
+
+Les thèmes, les villes (tirées selon une loi de Zipf) et les mots de
+remplissage sont ceux de `bench_hybrid_retrieval`. Une part des événements
+exerce les cas particuliers du nettoyage : descriptions en HTML, doublons
+(même texte sous un autre identifiant) et textes trop courts, écartés par
+`filter_and_dedup`.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.bench_hybrid_retrieval import CITIES, FILLER, THEMES
+
+# Département, code postal et coordonnées (lon, lat) approximatives de chaque ville de CITIES
+CITY_LOCATIONS = {
+    "Toulouse": ("Haute-Garonne", "31000", (1.444, 43.604)),
+    "Montpellier": ("Hérault", "34000", (3.877, 43.611)),
+    "Nîmes": ("Gard", "30000", (4.360, 43.837)),
+    "Perpignan": ("Pyrénées-Orientales", "66000", (2.895, 42.699)),
+    "Béziers": ("Hérault", "34500", (3.215, 43.344)),
+    "Montauban": ("Tarn-et-Garonne", "82000", (1.355, 44.018)),
+    "Narbonne": ("Aude", "11100", (3.004, 43.184)),
+    "Albi": ("Tarn", "81000", (2.148, 43.929)),
+    "Carcassonne": ("Aude", "11000", (2.353, 43.213)),
+    "Sète": ("Hérault", "34200", (3.697, 43.403)),
+    "Castres": ("Tarn", "81100", (2.240, 43.606)),
+    "Tarbes": ("Hautes-Pyrénées", "65000", (0.078, 43.233)),
+    "Rodez": ("Aveyron", "12000", (2.575, 44.350)),
+    "Cahors": ("Lot", "46000", (1.441, 44.448)),
+    "Auch": ("Gers", "32000", (0.586, 43.646)),
+    "Millau": ("Aveyron", "12100", (3.078, 44.098)),
+    "Foix": ("Ariège", "09000", (1.607, 42.965)),
+    "Mende": ("Lozère", "48000", (3.499, 44.518)),
+    "Lunel": ("Hérault", "34400", (4.136, 43.675)),
+    "Uzès": ("Gard", "30700", (4.420, 44.012)),
+    "Figeac": ("Lot", "46100", (2.031, 44.609)),
+    "Lodève": ("Hérault", "34700", (3.319, 43.731)),
+    "Pézenas": ("Hérault", "34120", (3.424, 43.459)),
+    "Collioure": ("Pyrénées-Orientales", "66190", (3.083, 42.525)),
+    "Vézénobres": ("Gard", "30360", (4.139, 44.050)),
+}
+
+VENUES = ["Médiathèque", "Salle des fêtes", "Théâtre municipal", "Parc", "Musée", "Place du marché", "Domaine", "Centre culturel"]
+
+REFERENCE_DATE = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+def _paragraphs(rng: random.Random, title: str, description: str, city: str, n_paragraphs: int) -> list[str]:
+    """Paragraphes d'environ 800 caractères : autant de chunks (de 1000 caractères) que de paragraphes, à peu près."""
+    paragraphs = []
+    for number in range(n_paragraphs):
+        sentences = [f"{title} à {city}, {description}."]
+        while sum(len(sentence) + 1 for sentence in sentences) < 800:
+            words = rng.choices(FILLER, k=rng.randint(6, 14))
+            sentences.append(f"{' '.join(words).capitalize()} ({number}-{len(sentences)}).")
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+
+def _to_html(paragraphs: list[str]) -> str:
+    return "".join(f"<p><strong>{paragraph[:20]}</strong>{paragraph[20:]}<br/></p>" for paragraph in paragraphs)
+
+
+def make_openagenda_records(
+        n_events: int,
+        seed: int = 0,
+        html_ratio: float = 0.3,
+        duplicate_ratio: float = 0.05,
+        short_ratio: float = 0.05,
+        max_chunks: int = 4,
+        reference_date: datetime = REFERENCE_DATE
+    ) -> list[dict]:
+    """
+    Génère `n_events` événements bruts, de façon déterministe pour une même graine.
+
+    Args:
+        n_events (int): Nombre d'événements.
+        seed (int): Graine du générateur.
+        html_ratio (float): Part des descriptions complètes en HTML.
+        duplicate_ratio (float): Part des événements qui reprennent le texte d'un événement précédent.
+        short_ratio (float): Part des événements sans description complète (texte trop court).
+        max_chunks (int): Longueur maximale d'une description complète, en chunks.
+        reference_date (datetime): Début de la période (d'un an) des événements.
+    """
+    rng = random.Random(seed)
+    city_weights = [1.0 / rank ** 1.2 for rank in range(1, len(CITIES) + 1)]
+    records = []
+    for i in range(n_events):
+        draw = rng.random()
+        if records and draw < duplicate_ratio:
+            record = dict(rng.choice(records))
+        else:
+            title, description = rng.choice(THEMES)
+            city = rng.choices(CITIES, weights=city_weights)[0]
+            department, postal_code, (lon, lat) = CITY_LOCATIONS[city]
+            begin = reference_date + timedelta(days=rng.randrange(365), hours=rng.randint(9, 21))
+            end = begin + timedelta(days=rng.choice([0, 0, 0, 1, 2, 7]), hours=2)
+            venue = f"{rng.choice(VENUES)} de {city}"
+            record = {
+                "title_fr": f"{title} n°{i}",
+                "description_fr": f"{description.capitalize()}.",
+                "keywords_fr": [word for word in title.lower().split() if len(word) > 3][:3],
+                "firstdate_begin": begin.isoformat(),
+                "lastdate_end": end.isoformat(),
+                "location_name": venue,
+                "location_address": f"{rng.randint(1, 80)} rue de la République, {postal_code} {city}",
+                "location_postalcode": postal_code,
+                "location_city": city,
+                "location_department": department,
+                "location_region": "Occitanie",
+                "location_coordinates": {"lon": lon, "lat": lat},
+                "conditions_fr": rng.choice(["Gratuit", "Entrée libre", "Sur réservation", "10 €"]),
+            }
+            if draw >= 1 - short_ratio:
+                record["longdescription_fr"] = None
+            else:
+                paragraphs = _paragraphs(rng, title, description, city, rng.randint(1, max_chunks))
+                record["longdescription_fr"] = _to_html(paragraphs) if rng.random() < html_ratio else "\n\n".join(paragraphs)
+        uid = str(10_000_000 + i)
+        record.update(
+            uid=uid,
+            canonicalurl=f"https://openagenda.com/fr/evenements/{uid}",
+            updatedat=(reference_date - timedelta(days=rng.randrange(30))).isoformat(),
+        )
+        records.append(record)
+    return records
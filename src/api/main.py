@@ -1,19 +1,35 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, status
-from .schemas import QueryRequest, QueryResponse, RebuildResponse
+import asyncio
+import json
+import logging
+import time
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from src.core.observability import configure_logging, render_metrics, HTTP_REQUEST_SECONDS
+from .schemas import (
+    QueryRequest, QueryResponse, BatchQueryRequest, BatchQueryResponse,
+    RebuildResponse, RebuildJobStatus, RollbackResponse
+)
 
 # Ajoute le chemin racine pour importer 'src.core'
 # import sys
 # import os
 # sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+# Niveau des journaux : variable LOG_LEVEL (INFO par défaut)
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Importe l'instance unique de notre service RAG
 # C'est ici que les modèles sont chargés au DÉMARRAGE de l'API
 try:
-    from src.core.rag_service import rag_service
-    print("RAG Service importé avec succès dans l'API.")
+    from src.core.rag_service import rag_service, rebuild_jobs
+    from src.core.jobs import JobConflictError
+    from src.core.metadata_index import SearchFilters
+    logger.info("RAG Service importé avec succès dans l'API.")
 except Exception as e:
-    print(f"ERREUR CRITIQUE au démarrage : {e}")
+    logger.critical("ERREUR CRITIQUE au démarrage : %s", e)
     rag_service = None
+    rebuild_jobs = None
 
 # Ajout de 'tags_metadata' pour organiser l'API Swagger
 tags_metadata = [
@@ -25,6 +41,10 @@ tags_metadata = [
         "name": "Administration",
         "description": "Opérations de maintenance de l'index.",
     },
+    {
+        "name": "Supervision",
+        "description": "Métriques de l'API et du pipeline d'indexation.",
+    },
 ]
 
 app = FastAPI(
@@ -34,6 +54,36 @@ app = FastAPI(
     openapi_tags=tags_metadata
 )
 
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """Durée de chaque requête, par route (modèle de chemin) et code de réponse."""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "inconnue"),
+            status=status_code
+        )
+
+
+def _search_filters(query: QueryRequest):
+    """Filtres explicites d'une requête, au format du service (None s'il n'y en a pas)."""
+    if query.filters is None:
+        return None
+    filters = SearchFilters(**query.filters.model_dump())
+    if filters.date_from and filters.date_to and filters.date_from > filters.date_to:
+        raise HTTPException(status_code=400, detail="La date de début de la période est postérieure à sa date de fin.")
+    return filters
+
+
 @app.post(
     "/ask", 
     response_model=QueryResponse,
@@ -42,10 +92,11 @@ app = FastAPI(
     description=(
         "Pose une question en langage naturel au système RAG. "
         "Le système trouvera les documents pertinents dans la base vectorielle "
-        "et utilisera un LLM (MistralAI) pour générer une réponse."
+        "et utilisera un LLM (MistralAI) pour générer une réponse. "
+        "Des filtres optionnels (ville, département, période) restreignent la recherche."
     ),
     responses={
-        400: {"description": "La question fournie est vide."},
+        400: {"description": "La question fournie est vide, ou la période des filtres est invalide."},
         503: {"description": "Le service RAG n'a pas pu être initialisé (ex: modèle non trouvé)."}
     }
 )
@@ -59,10 +110,74 @@ async def ask_question(query: QueryRequest):
     if rag_service is None:
         raise HTTPException(status_code=503, detail="Service RAG non initialisé.")
 
-    answer = rag_service.ask(query.question)
+    # La chaîne est attendue de façon asynchrone : le worker continue de servir
+    # les autres requêtes pendant l'appel au LLM
+    answer = await rag_service.aask(query.question, _search_filters(query))
     return QueryResponse(answer=answer)
 
 
+@app.post(
+    "/ask/stream",
+    tags=["Système RAG"],
+    summary="Interroger le système RAG en streaming",
+    description=(
+        "Comme `/ask`, mais la réponse est envoyée au fil de sa génération, au format NDJSON "
+        "(un objet JSON par ligne) : d'abord les sources retrouvées (`type: sources`), "
+        "puis les fragments de la réponse (`type: token`), enfin `type: done` "
+        "(ou `type: error` en cas d'échec)."
+    ),
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "Flux d'événements NDJSON."},
+        400: {"description": "La question fournie est vide."},
+        503: {"description": "Le service RAG n'a pas pu être initialisé (ex: modèle non trouvé)."}
+    }
+)
+async def ask_question_stream(query: QueryRequest):
+    """
+    Pose une question au système RAG et reçoit la réponse au fur et à mesure.
+    """
+    if not query.question or query.question.strip() == "":
+        raise HTTPException(status_code=400, detail="La question ne peut pas être vide.")
+
+    if rag_service is None:
+        raise HTTPException(status_code=503, detail="Service RAG non initialisé.")
+
+    filters = _search_filters(query)
+
+    async def ndjson_events():
+        async for event in rag_service.astream(query.question, filters):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson_events(), media_type="application/x-ndjson")
+
+
+@app.post(
+    "/ask/batch",
+    response_model=BatchQueryResponse,
+    tags=["Système RAG"],
+    summary="Interroger le système RAG avec un lot de questions",
+    description=(
+        "Pose jusqu'à 1000 questions en une requête. Les questions sont embeddées en un seul appel, "
+        "recherchées en une seule passe dans l'index, et les réponses sont générées en parallèle. "
+        "Les réponses sont renvoyées dans l'ordre des questions ; une question en échec "
+        "porte son propre message d'erreur sans faire échouer le lot."
+    ),
+    responses={
+        503: {"description": "Le service RAG n'a pas pu être initialisé (ex: modèle non trouvé)."}
+    }
+)
+async def ask_questions_batch(query: BatchQueryRequest):
+    """
+    Pose un lot de questions au système RAG.
+    """
+    if rag_service is None:
+        raise HTTPException(status_code=503, detail="Service RAG non initialisé.")
+
+    results = await rag_service.ask_many(query.questions)
+    return BatchQueryResponse(results=results)
+
+
 @app.post(
     "/rebuild", 
     response_model=RebuildResponse,
@@ -70,28 +185,152 @@ async def ask_question(query: QueryRequest):
     summary="Lancer la reconstruction de l'index",
     description=(
         "Déclenche une reconstruction complète de l'index vectoriel FAISS. "
-        "Il s'agit d'une **opération longue** (plusieurs minutes) qui s'exécute en arrière-plan. "
-        "L'API répond immédiatement pour confirmer que la tâche est lancée."
+        "Il s'agit d'une **opération longue** (plusieurs minutes) qui s'exécute dans un processus séparé, "
+        "pour ne pas ralentir les réponses de l'API. "
+        "L'API répond immédiatement avec l'identifiant de la reconstruction (`job_id`), "
+        "à suivre avec `GET /rebuild/{job_id}`. "
+        "Les questions restent servies par l'index actuel jusqu'à ce que le nouveau soit prêt."
     ),
     # Utilise 202 "Accepté" pour indiquer une tâche de fond
     status_code=status.HTTP_202_ACCEPTED, 
     responses={
+        409: {"description": "Une reconstruction est déjà en cours."},
         503: {"description": "Le service RAG n'a pas pu être initialisé."}
     }
 )
-async def rebuild_vector_index(background_tasks: BackgroundTasks):
+async def rebuild_vector_index():
     """
     Lance la reconstruction complète de l'index vectoriel FAISS.
     Ceci est une opération longue (plusieurs minutes).
-    L'API répond immédiatement pendant que la tâche s'exécute en arrière-plan.
+    L'API répond immédiatement pendant que la tâche s'exécute dans un processus séparé.
     """
-    if rag_service is None:
+    if rag_service is None or rebuild_jobs is None:
         raise HTTPException(status_code=503, detail="Service RAG non initialisé.")
 
-    # Ajoute la tâche de reconstruction à l'arrière-plan
-    background_tasks.add_task(rag_service.rebuild_index)
+    try:
+        job = rebuild_jobs.start()
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
     return RebuildResponse(
         status="ok",
-        message="La reconstruction de l'index a été lancée en arrière-plan."
-    )
\ No newline at end of file
+        message="La reconstruction de l'index a été lancée en arrière-plan.",
+        job_id=job["job_id"]
+    )
+
+
+@app.get(
+    "/rebuild/{job_id}",
+    response_model=RebuildJobStatus,
+    tags=["Administration"],
+    summary="Suivre une reconstruction de l'index",
+    description=(
+        "Donne l'état d'une reconstruction : statut, étape en cours, et pour chaque étape "
+        "le nombre d'éléments traités, leur total s'il est connu et le débit."
+    ),
+    responses={
+        404: {"description": "Reconstruction inconnue."},
+        503: {"description": "Le service RAG n'a pas pu être initialisé."}
+    }
+)
+async def get_rebuild_status(job_id: str):
+    """
+    Retourne l'état d'une reconstruction de l'index.
+    """
+    if rebuild_jobs is None:
+        raise HTTPException(status_code=503, detail="Service RAG non initialisé.")
+
+    job = rebuild_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reconstruction inconnue.")
+    return RebuildJobStatus(**job)
+
+
+@app.delete(
+    "/rebuild/{job_id}",
+    response_model=RebuildJobStatus,
+    tags=["Administration"],
+    summary="Annuler une reconstruction de l'index",
+    description=(
+        "Demande l'arrêt d'une reconstruction en cours. La version en construction est abandonnée "
+        "et l'index actuel reste en service. Sans effet sur une reconstruction déjà terminée."
+    ),
+    responses={
+        404: {"description": "Reconstruction inconnue."},
+        503: {"description": "Le service RAG n'a pas pu être initialisé."}
+    }
+)
+async def cancel_rebuild(job_id: str):
+    """
+    Annule une reconstruction de l'index.
+    """
+    if rebuild_jobs is None:
+        raise HTTPException(status_code=503, detail="Service RAG non initialisé.")
+
+    job = rebuild_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reconstruction inconnue.")
+    return RebuildJobStatus(**job)
+
+
+@app.post(
+    "/index/rollback",
+    response_model=RollbackResponse,
+    tags=["Administration"],
+    summary="Revenir à la version précédente de l'index",
+    description=(
+        "Remet en service la version de l'index qui précédait la version actuelle "
+        "(les dernières versions construites sont conservées sur disque). "
+        "Le changement est immédiat et n'interrompt pas les questions en cours."
+    ),
+    responses={
+        409: {"description": "Aucune version antérieure de l'index n'est disponible, ou une reconstruction est en cours."},
+        500: {"description": "La version antérieure n'a pas pu être chargée."},
+        503: {"description": "Le service RAG n'a pas pu être initialisé."}
+    }
+)
+async def rollback_vector_index():
+    """
+    Revient à la version précédente de l'index vectoriel FAISS.
+    """
+    if rag_service is None:
+        raise HTTPException(status_code=503, detail="Service RAG non initialisé.")
+
+    # La reconstruction en cours remettrait sa propre version en service à la fin
+    active = rebuild_jobs.active() if rebuild_jobs is not None else None
+    if active is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Une reconstruction est en cours (job {active['job_id']}) : l'annuler ou attendre sa fin avant de revenir en arrière."
+        )
+
+    try:
+        version = await asyncio.to_thread(rag_service.rollback_index)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return RollbackResponse(
+        version=version,
+        message="L'index est revenu à la version précédente."
+    )
+
+
+@app.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    tags=["Supervision"],
+    summary="Métriques au format Prometheus",
+    description=(
+        "Expose les métriques du service au format texte de Prometheus : durée des étapes "
+        "de réponse (embedding de la question, recherche, reranking, construction du contexte, "
+        "appel au LLM) et du pipeline d'indexation, durée des requêtes HTTP, consultations "
+        "des caches, tokens consommés, erreurs, taille et version de l'index en service."
+    )
+)
+async def get_metrics():
+    """
+    Retourne les métriques du service, à collecter par Prometheus.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,16 @@
+from datetime import date
 from pydantic import BaseModel, Field
 
+class QueryFilters(BaseModel):
+    city: str | None = Field(None, description="Ville de l'événement.", json_schema_extra={"example": "Toulouse"})
+    department: str | None = Field(
+        None,
+        description="Département, par son numéro ou son nom.",
+        json_schema_extra={"example": "31"}
+    )
+    date_from: date | None = Field(None, description="Début de la période : l'événement doit se terminer après.")
+    date_to: date | None = Field(None, description="Fin de la période : l'événement doit commencer avant.")
+
 class QueryRequest(BaseModel):
     question: str = Field(
         ...,
@@ -7,6 +18,13 @@ class QueryRequest(BaseModel):
         # Change 'example=' par 'json_schema_extra='
         json_schema_extra={"example": "Y a-t-il des expositions d'art en Occitanie ?"}
     )
+    filters: QueryFilters | None = Field(
+        None,
+        description=(
+            "Filtres optionnels appliqués pendant la recherche. Sans filtre explicite, "
+            "la ville, le département et la période sont déduits de la question lorsqu'elle les mentionne."
+        )
+    )
 
 class QueryResponse(BaseModel):
     answer: str = Field(
@@ -15,6 +33,26 @@ class QueryResponse(BaseModel):
         json_schema_extra={"example": "Oui, il y a plusieurs expositions d'art..."}
     )
 
+class BatchQueryRequest(BaseModel):
+    questions: list[str] = Field(
+        ...,
+        min_length=1,
+        max_length=1000,
+        description="Les questions à poser au RAG (1000 au maximum).",
+        json_schema_extra={"example": ["Y a-t-il des expositions d'art ?", "Un atelier pour enfants à Toulouse ?"]}
+    )
+
+class BatchAnswer(BaseModel):
+    question: str = Field(..., description="La question posée.")
+    answer: str | None = Field(None, description="La réponse générée, ou null en cas d'erreur.")
+    error: str | None = Field(None, description="Le message d'erreur propre à cette question, le cas échéant.")
+
+class BatchQueryResponse(BaseModel):
+    results: list[BatchAnswer] = Field(
+        ...,
+        description="Une réponse par question, dans l'ordre de la requête."
+    )
+
 class RebuildResponse(BaseModel):
     status: str = Field(
         ..., 
@@ -23,4 +61,44 @@ class RebuildResponse(BaseModel):
     message: str = Field(
         ..., 
         json_schema_extra={"example": "La reconstruction de l'index a été lancée..."}
-    )
\ No newline at end of file
+    )
+    job_id: str | None = Field(
+        None,
+        description="Identifiant de la reconstruction, à suivre avec `GET /rebuild/{job_id}`.",
+        json_schema_extra={"example": "3f2b9c0e4d6a4e1f8b7a5c3d2e1f0a9b"}
+    )
+
+class StageProgress(BaseModel):
+    done: int = Field(..., description="Nombre d'éléments traités dans cette étape.")
+    total: int | None = Field(None, description="Nombre d'éléments attendus, s'il est connu.")
+    seconds: float = Field(..., description="Durée de l'étape jusqu'ici, en secondes.")
+    items_per_second: float | None = Field(None, description="Débit de l'étape (éléments par seconde).")
+
+class RebuildJobStatus(BaseModel):
+    job_id: str = Field(..., description="Identifiant de la reconstruction.")
+    status: str = Field(
+        ...,
+        description="running, cancelling, succeeded, failed ou cancelled.",
+        json_schema_extra={"example": "running"}
+    )
+    stage: str | None = Field(
+        None,
+        description="Étape en cours : fetch, prepare, embed, index ou publish.",
+        json_schema_extra={"example": "embed"}
+    )
+    stages: dict[str, StageProgress] = Field(default_factory=dict, description="Progression de chaque étape atteinte.")
+    error: str | None = Field(None, description="Cause de l'échec, le cas échéant.")
+    reloaded: bool | None = Field(None, description="Si le nouvel index a été mis en service par l'API.")
+    started_at: float = Field(..., description="Début de la reconstruction (timestamp Unix).")
+    finished_at: float | None = Field(None, description="Fin de la reconstruction (timestamp Unix).")
+
+class RollbackResponse(BaseModel):
+    version: str = Field(
+        ...,
+        description="La version de l'index désormais en service.",
+        json_schema_extra={"example": "20250101-030000-123456"}
+    )
+    message: str = Field(
+        ...,
+        json_schema_extra={"example": "L'index est revenu à la version précédente."}
+    )
@@ -0,0 +1,160 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from .observability import ANSWER_CACHE_LOOKUPS
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Forme canonique d'une question : casse, espaces et ponctuation finale ignorés."""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    return WHITESPACE_PATTERN.sub(" ", text).strip(" ?!.")
+
+
+class AnswerCache:
+    """
+    Cache des réponses du RAG, à deux niveaux :
+      1. correspondance exacte sur la question normalisée ;
+      2. correspondance sémantique : une question dont l'embedding a une
+         similarité cosinus d'au moins `similarity_threshold` avec celui d'une
+         question en cache reprend sa réponse, si elles ont la même portée
+         (`scope` : les filtres déduits de la question, car "concerts à Albi"
+         et "concerts à Toulouse" ont des embeddings très proches).
+
+    Les entrées expirent après `ttl_seconds` ; au-delà de `max_entries`, la
+    moins récemment utilisée est évincée. `clear` vide le cache (à appeler
+    quand l'index change). Thread-safe.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 1000,
+            ttl_seconds: float = 3600,
+            similarity_threshold: float | None = 0.95,
+            clock=time.monotonic
+        ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._clock = clock
+        self._entries = OrderedDict()  # question normalisée -> (réponse, vecteur normé ou None, expiration, portée)
+        self._matrix = None  # vecteurs des entrées, recalculés après chaque modification
+        self._matrix_keys = []
+        self._matrix_scopes = []
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.similarity_threshold is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, question: str, exact_only: bool = False) -> str | None:
+        """
+        Niveau 1 : réponse en cache pour exactement la même question (normalisée), sinon None.
+        Un échec n'est compté ici que sans niveau sémantique, ou avec `exact_only`
+        (l'appelant ne consultera pas `get_similar`).
+        """
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= self._clock():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                if exact_only or not self.semantic:
+                    self.misses += 1
+                    ANSWER_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            ANSWER_CACHE_LOOKUPS.inc(result="exact_hit")
+            return entry[0]
+
+    def get_similar(self, vector, scope=None) -> str | None:
+        """
+        Niveau 2 : réponse de la question en cache la plus proche de `vector`
+        (embedding de la nouvelle question) parmi celles de même portée `scope`,
+        si elle dépasse le seuil. À appeler après un échec de `get`, qui ne
+        compte pas d'échec quand ce niveau est actif.
+        """
+        query = self._unit(vector)
+        with self._lock:
+            self._purge_expired()
+            if self._matrix is None:
+                self._build_matrix()
+            if not len(self._matrix_keys):
+                self.misses += 1
+                ANSWER_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            similarities = np.where([entry_scope == scope for entry_scope in self._matrix_scopes], self._matrix @ query, -np.inf)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                ANSWER_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            key = self._matrix_keys[best]
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            ANSWER_CACHE_LOOKUPS.inc(result="semantic_hit")
+            return self._entries[key][0]
+
+    def put(self, question: str, answer: str, vector=None, scope=None) -> None:
+        """Met en cache la réponse à une question (et son embedding et sa portée, pour le niveau 2)."""
+        key = normalize_question(question)
+        unit = self._unit(vector) if vector is not None and self.semantic else None
+        with self._lock:
+            self._entries[key] = (answer, unit, self._clock() + self.ttl_seconds, scope)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self) -> None:
+        """Invalide toutes les réponses (par exemple après une reconstruction de l'index)."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        total = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key: str) -> None:
+        del self._entries[key]
+        self._matrix = None
+
+    def _purge_expired(self) -> None:
+        now = self._clock()
+        expired = [key for key, (_, _, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+
+    def _build_matrix(self) -> None:
+        self._matrix_keys = [key for key, (_, unit, _, _) in self._entries.items() if unit is not None]
+        self._matrix_scopes = [self._entries[key][3] for key in self._matrix_keys]
+        self._matrix = (
+            np.stack([self._entries[key][1] for key in self._matrix_keys])
+            if self._matrix_keys else np.empty((0, 0), dtype=np.float32)
+        )
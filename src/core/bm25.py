@@ -0,0 +1,166 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+import numpy as np
+
+BM25_INDEX_FILE = "bm25_index.npz"
+
+STOPWORDS = frozenset("""
+a ai au aux avec c ce ces cet cette d dans de des du elle en est et eu il ils je l la le les leur leurs
+lui m ma mais me mes moi mon n ne nos notre nous on ou par pas plus pour qu que quel quelle quelles quels
+qui s sa se ses si son sont sur t ta te tes toi ton tu un une vos votre vous y
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Termes d'un texte pour l'index lexical : minuscules, sans accents ni mots
+    vides, pluriels simples ramenés au singulier ("expositions" -> "exposition").
+    """
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    terms = []
+    for term in re.findall(r"[a-z0-9]+", text):
+        if term in STOPWORDS:
+            continue
+        if len(term) > 3 and term[-1] in "sx" and not term.isdigit():
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+class BM25Index:
+    """
+    Index inversé BM25 des chunks, par position dans l'index FAISS.
+
+    Les listes de postings sont stockées au format CSR : `indptr[t]:indptr[t+1]`
+    délimite, dans `doc_ids` / `term_freqs`, les chunks qui contiennent le
+    terme `t`. Le vocabulaire est un tableau trié (recherche par
+    `searchsorted`, sans dictionnaire Python). Le score d'une question
+    s'accumule dans un vecteur dense, terme par terme, sans boucle sur les chunks.
+    """
+
+    def __init__(self, vocabulary, indptr, doc_ids, term_freqs, doc_lengths, k1: float = 1.2, b: float = 0.75):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = float(k1)
+        self.b = float(b)
+        n_docs = len(doc_lengths)
+        document_frequencies = np.diff(indptr)
+        self.idf = np.log1p((n_docs - document_frequencies + 0.5) / (document_frequencies + 0.5)).astype(np.float32)
+        average_length = float(doc_lengths.mean()) if n_docs else 1.0
+        # Partie du dénominateur BM25 propre à chaque chunk, calculée une fois pour toutes
+        self._length_norms = (self.k1 * (1 - self.b + self.b * doc_lengths / max(average_length, 1e-9))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Construit l'index à partir des textes des chunks, dans l'ordre de leurs positions."""
+        term_ids = {}
+        rows, cols, freqs, doc_lengths = [], [], [], []
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                rows.append(term_ids.setdefault(term, len(term_ids)))
+                cols.append(position)
+                freqs.append(count)
+
+        # Identifiants de termes dans l'ordre alphabétique, pour la recherche par searchsorted
+        vocabulary = np.array(sorted(term_ids), dtype=str)
+        remap = np.empty(len(term_ids), dtype=np.int32)
+        remap[[term_ids[term] for term in vocabulary.tolist()]] = np.arange(len(term_ids), dtype=np.int32)
+        rows = remap[np.asarray(rows, dtype=np.int32)] if rows else np.empty(0, dtype=np.int32)
+
+        # Tri stable par terme : dans chaque liste, les positions restent croissantes
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(vocabulary)), out=indptr[1:])
+        return cls(
+            vocabulary,
+            indptr,
+            np.asarray(cols, dtype=np.int32)[order],
+            np.minimum(np.asarray(freqs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)[order],
+            np.asarray(doc_lengths, dtype=np.int32),
+            k1=k1,
+            b=b,
+        )
+
+    # --- Persistance ---
+
+    def save(self, index_path: str) -> None:
+        """Écrit l'index à côté de l'index FAISS (écriture atomique)."""
+        path = os.path.join(index_path, BM25_INDEX_FILE)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(
+                f, vocabulary=self.vocabulary, indptr=self.indptr, doc_ids=self.doc_ids,
+                term_freqs=self.term_freqs, doc_lengths=self.doc_lengths, params=np.array([self.k1, self.b])
+            )
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, index_path: str) -> "BM25Index | None":
+        """Charge l'index d'un dossier, ou None s'il n'existe pas (index plus ancien)."""
+        path = os.path.join(index_path, BM25_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            k1, b = data["params"].tolist()
+            return cls(data["vocabulary"], data["indptr"], data["doc_ids"], data["term_freqs"], data["doc_lengths"], k1=k1, b=b)
+
+    # --- Recherche ---
+
+    def term_ids(self, terms: list[str]) -> np.ndarray:
+        """Identifiants des termes présents dans le vocabulaire (sans doublons)."""
+        if not len(self.vocabulary) or not terms:
+            return np.empty(0, dtype=np.int64)
+        terms = np.unique(np.array(terms, dtype=str))
+        ids = np.minimum(np.searchsorted(self.vocabulary, terms), len(self.vocabulary) - 1)
+        return ids[self.vocabulary[ids] == terms]
+
+    def scores(self, question: str) -> np.ndarray:
+        """Score BM25 de chaque chunk pour la question (0 pour les chunks sans terme commun)."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term_id in self.term_ids(tokenize(question)):
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end].astype(np.float32)
+            # Chaque chunk apparaît une seule fois par liste : l'addition indexée est sûre
+            scores[docs] += self.idf[term_id] * freqs * (self.k1 + 1) / (freqs + self._length_norms[docs])
+        return scores
+
+    def search(self, question: str, k: int, mask: np.ndarray | None = None):
+        """
+        Les `k` meilleurs chunks pour la question, parmi ceux de `mask` s'il est fourni.
+
+        Returns:
+            tuple: (positions, scores), par score décroissant ; seuls les chunks
+            qui partagent au moins un terme avec la question sont retournés.
+        """
+        scores = self.scores(question)
+        if mask is not None:
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = np.argsort(-scores[candidates], kind="stable")
+        return candidates[order], scores[candidates[order]]
+
+
+def reciprocal_rank_fusion(rankings: list, k: int, constant: int = 60) -> list:
+    """
+    Fusionne plusieurs classements de positions (Reciprocal Rank Fusion) : un
+    chunk reçoit 1 / (constant + rang) dans chaque classement où il apparaît.
+    Retourne les `k` positions de meilleur score cumulé.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            position = int(position)
+            fused[position] = fused.get(position, 0.0) + 1.0 / (constant + rank + 1)
+    return sorted(fused, key=lambda position: -fused[position])[:k]
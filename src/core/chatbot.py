@@ -1,20 +1,34 @@
 from .embedding import get_embedding_model
 from .faiss_manager import load_faiss_index
+from .index_registry import resolve_index_path
+from .context_builder import ContextBuilder
+from .retrieval import EventRetriever, load_metadata_index, load_bm25_index
+from .observability import LLMMetricsCallback
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_mistralai.chat_models import ChatMistralAI
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
-def get_retriever(embedding_model, index_path="data/faiss_index"):
+def get_retriever(embedding_model, index_path="data/faiss_index", reranker=None):
     """
     Crée et retourne un retriever à partir d'un index FAISS existant.
+    `reranker` rescore les candidats avant de garder les meilleurs (voir `create_reranker`).
     """
     # Charger la base de données vectorielle
-    vectorstore = load_faiss_index(embedding_model, index_path)
+    vectorstore = load_faiss_index(embedding_model, index_path, mmap=True)
     
     # Transformer la base de données en un "retriever"
-    # search_kwargs={'k': 3} signifie qu'on récupérera les 3 chunks les plus pertinents.
-    return vectorstore.as_retriever(search_kwargs={'k': 5})
+    # k=5 signifie qu'on récupérera les 5 chunks les plus pertinents,
+    # parmi ceux qui respectent la ville / la période citées dans la question.
+    # La recherche lexicale (BM25) complète la recherche vectorielle sur les noms propres.
+    index_path = resolve_index_path(index_path)
+    return EventRetriever(
+        vectorstore=vectorstore,
+        metadata_index=load_metadata_index(vectorstore, index_path),
+        bm25=load_bm25_index(vectorstore, index_path),
+        reranker=reranker,
+        k=5
+    )
 
 
 def create_prompt_template():
@@ -38,27 +52,46 @@ def create_prompt_template():
     return ChatPromptTemplate.from_template(template)
 
 
-def create_rag_chain(retriever, prompt, embedding_model):
-    """
-    Crée et retourne une chaîne RAG complète.
-    """
-    # Initialiser le modèle de chat Mistral
-    llm = ChatMistralAI(
+def format_docs(docs):
+    """Fonction pour formater les documents récupérés (sans limite de taille, voir `ContextBuilder`)."""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+def create_llm(api_key):
+    """Initialise le modèle de chat Mistral (durée des appels et tokens suivis par `LLMMetricsCallback`)."""
+    return ChatMistralAI(
         model="open-mistral-7b",
         temperature=0.1, # Peu de créativité pour s'en tenir aux faits
-        api_key=embedding_model.mistral_api_key # On réutilise la clé
+        api_key=api_key,
+        callbacks=[LLMMetricsCallback()]
     )
-    
-    # Fonction pour formater les documents récupérés
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+
+
+def create_generation_chain(prompt, llm):
+    """
+    Partie "génération" de la chaîne RAG : attend un dictionnaire
+    {"context": ..., "question": ...} et produit la réponse texte.
+    Utilisée seule pour le streaming, une fois les sources récupérées.
+    """
+    return prompt | llm | StrOutputParser()
+
+
+def create_rag_chain(retriever, prompt, embedding_model, llm=None, context_builder=None):
+    """
+    Crée et retourne une chaîne RAG complète.
+    `llm` permet de remplacer le modèle de chat Mistral (tests, benchmarks).
+    `context_builder` met en forme les chunks récupérés dans un budget de
+    tokens (par défaut : `ContextBuilder()`).
+    """
+    if llm is None:
+        llm = create_llm(embedding_model.mistral_api_key) # On réutilise la clé
+    if context_builder is None:
+        context_builder = ContextBuilder()
 
     # Création de la chaîne RAG avec la syntaxe LCEL
     rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
+        {"context": retriever | context_builder, "question": RunnablePassthrough()}
+        | create_generation_chain(prompt, llm)
     )
     
     return rag_chain
@@ -0,0 +1,114 @@
+import json
+import mmap
+import os
+from collections.abc import Mapping
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "chunks_offsets.npy"
+
+
+def _json_default(value):
+    """Convertit les scalaires numpy (et à défaut tout objet) en types JSON."""
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def write_chunks(records, index_path: str) -> int:
+    """
+    Écrit les chunks dans `chunks.jsonl` (une ligne JSON par position de
+    l'index : identifiant, texte et métadonnées) et leurs positions en octets
+    dans `chunks_offsets.npy`, pour pouvoir relire un chunk sans lire les autres.
+
+    Args:
+        records: Itérable de tuples (identifiant, texte, métadonnées), dans l'ordre de l'index.
+
+    Returns:
+        int: Le nombre de chunks écrits.
+    """
+    os.makedirs(index_path, exist_ok=True)
+    chunks_path = os.path.join(index_path, CHUNKS_FILE)
+    offsets_path = os.path.join(index_path, OFFSETS_FILE)
+
+    offsets = [0]
+    with open(f"{chunks_path}.tmp", "wb") as f:
+        for chunk_id, text, metadata in records:
+            line = json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False, default=_json_default)
+            f.write(line.encode("utf-8") + b"\n")
+            offsets.append(f.tell())
+    with open(f"{offsets_path}.tmp", "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+
+    os.replace(f"{chunks_path}.tmp", chunks_path)
+    os.replace(f"{offsets_path}.tmp", offsets_path)
+    return len(offsets) - 1
+
+
+def has_chunk_store(index_path: str) -> bool:
+    return os.path.exists(os.path.join(index_path, CHUNKS_FILE)) and os.path.exists(os.path.join(index_path, OFFSETS_FILE))
+
+
+class ChunkStore(Docstore):
+    """
+    Docstore en lecture seule adossé à `chunks.jsonl`, projeté en mémoire (mmap).
+
+    Rien n'est désérialisé au chargement : seuls les chunks effectivement
+    renvoyés par une recherche sont lus et décodés. Les pages du fichier sont
+    partagées entre tous les processus qui l'ouvrent (workers Uvicorn).
+    Les clés sont les positions dans l'index FAISS (voir `PositionIds`).
+    """
+
+    def __init__(self, index_path: str):
+        self._offsets = np.load(os.path.join(index_path, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(index_path, CHUNKS_FILE), "rb") as f:
+            # mmap refuse les fichiers vides
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if len(self) else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def record(self, position: int) -> dict:
+        """Retourne le chunk à cette position : {'id', 'text', 'metadata'}."""
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        return json.loads(self._data[start:end])
+
+    def iter_records(self):
+        for position in range(len(self)):
+            yield self.record(position)
+
+    def search(self, search) -> Document | str:
+        try:
+            position = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        if not 0 <= position < len(self):
+            return f"ID {search} not found."
+        record = self.record(position)
+        return Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+
+    def delete(self, ids: list) -> None:
+        raise ValueError("ChunkStore est en lecture seule : recharger l'index avec mmap=False pour le modifier.")
+
+
+class PositionIds(Mapping):
+    """
+    Remplace le dictionnaire `index_to_docstore_id` de LangChain : la position
+    dans l'index FAISS sert directement de clé dans le `ChunkStore`, il n'y a
+    donc aucune table de correspondance à charger.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, position):
+        position = int(position)
+        if not 0 <= position < self._size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    def __len__(self) -> int:
+        return self._size
@@ -0,0 +1,171 @@
+import re
+from .embedding import CHARS_PER_TOKEN, estimate_tokens
+from .metadata_index import event_key
+from .observability import span
+
+# Assez pour k=5 chunks de 1000 caractères et leurs en-têtes : avec
+# `bench_context_builder --k 5`, 97 % des phrases distinctes sont gardées à
+# 1500 tokens comme sans limite, contre 68 % à 700
+DEFAULT_CONTEXT_TOKENS = 1500
+
+
+def trim_overlap(previous: str, text: str, max_overlap: int = 300, min_overlap: int = 20) -> str:
+    """
+    Retire du début de `text` la partie qui répète la fin de `previous`
+    (le découpage en chunks fait se chevaucher deux chunks consécutifs).
+    Un recouvrement de moins de `min_overlap` caractères est une coïncidence.
+    """
+    for size in range(min(len(previous), len(text), max_overlap), min_overlap - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:].lstrip(" .")
+    return text
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+", text) if sentence]
+
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(re.findall(r"\w+", sentence.lower()))
+
+
+def _chunk_number(doc) -> int:
+    chunk_id = doc.metadata.get("chunk_id")
+    suffix = chunk_id.rsplit("_", 1)[-1] if isinstance(chunk_id, str) else ""
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def _text(value) -> str | None:
+    # Les valeurs manquantes de pandas (NaN) ne sont pas des chaînes
+    return (value.strip() or None) if isinstance(value, str) else None
+
+
+def metadata_line(metadata: dict) -> str:
+    """
+    En-tête compact d'un événement : titre (dates | ville | lien). Le lien est
+    la seule source que `/ask` et `/ask/batch` peuvent citer : ils ne renvoient
+    pas les sources.
+    """
+    fields = []
+    start, end = _text(metadata.get("date_debut")), _text(metadata.get("date_fin"))
+    if start:
+        fields.append(start[:10] + (f" → {end[:10]}" if end and end[:10] != start[:10] else ""))
+    city, url = _text(metadata.get("ville")), _text(metadata.get("url"))
+    if city:
+        fields.append(city)
+    if url:
+        fields.append(re.sub(r"^https?://(www\.)?", "", url))
+    title = _text(metadata.get("titre"))
+    if title is None and not fields:
+        return ""
+    return f"### {title or 'Événement'}" + (f" ({' | '.join(fields)})" if fields else "")
+
+
+def _strip_repeated_fields(text: str, metadata: dict) -> str:
+    """Retire le titre en tête du chunk et la ville en fin de chunk, déjà présents dans l'en-tête."""
+    title, city = _text(metadata.get("titre")), _text(metadata.get("ville"))
+    if title and text.startswith(title):
+        text = text[len(title):].lstrip(" .")
+    if city and text.endswith(city):
+        text = re.sub(r"\s*\.?\s*$", "", text[:-len(city)])
+    return text
+
+
+class ContextBuilder:
+    """
+    Construit le contexte du prompt à partir des chunks récupérés, dans une
+    limite de `max_tokens`.
+
+    Les chunks, classés du plus au moins pertinent, sont retenus de façon
+    gloutonne tant qu'ils tiennent dans le budget ; d'un chunk trop long pour
+    la place restante, seules les premières phrases sont gardées. Ceux d'un même événement
+    sont regroupés sous un en-tête de métadonnées (titre, dates, ville, lien) et remis
+    dans l'ordre du texte, sans le chevauchement entre chunks consécutifs ni
+    le titre et la ville déjà présents dans l'en-tête. Les phrases déjà
+    présentes dans le contexte (description courte reprise dans la
+    description complète, mentions répétées d'un événement à l'autre) ne
+    sont gardées qu'une fois.
+    """
+
+    def __init__(
+            self,
+            max_tokens: int = DEFAULT_CONTEXT_TOKENS,
+            count_tokens=estimate_tokens,
+            min_sentence_chars: int = 20,
+            min_partial_tokens: int = 40
+        ):
+        """
+        Args:
+            max_tokens (int): Budget du contexte, en tokens.
+            count_tokens: Fonction qui compte les tokens d'un texte (par défaut : `estimate_tokens`).
+            min_sentence_chars (int): Taille minimale d'une phrase pour être dédoublonnée.
+            min_partial_tokens (int): Taille minimale du début d'un chunk gardé quand il ne tient pas en entier.
+        """
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self.min_sentence_chars = min_sentence_chars
+        self.min_partial_tokens = min_partial_tokens
+
+    def __call__(self, docs) -> str:
+        with span("build_context"):
+            return self.build(docs)
+
+    def build(self, docs) -> str:
+        events = {}  # événement -> (en-tête, {numéro de chunk: texte}), dans l'ordre de pertinence
+        seen = set()  # phrases déjà retenues
+        used = 0
+        for position, doc in enumerate(docs):
+            key = event_key(doc.metadata, ("doc", position))
+            header, chunks = events.get(key, (metadata_line(doc.metadata), {}))
+            header_cost = 0 if key in events or not header else self.count_tokens(header) + 1
+            number = _chunk_number(doc)
+            text = _strip_repeated_fields(doc.page_content, doc.metadata)
+            if number - 1 in chunks:
+                text = trim_overlap(chunks[number - 1], text)
+            sentences = self._new_sentences(text, seen)
+            if not sentences:
+                continue
+            available = self.max_tokens - used - header_cost - 1
+            text = " ".join(sentence for sentence, _ in sentences)
+            if self.count_tokens(text) > available:
+                # Le chunk ne tient pas en entier : on garde ses premières phrases
+                while sentences and self.count_tokens(" ".join(sentence for sentence, _ in sentences)) > available:
+                    sentences.pop()
+                if sentences and self.count_tokens(" ".join(sentence for sentence, _ in sentences)) >= self.min_partial_tokens:
+                    text = " ".join(sentence for sentence, _ in sentences)
+                elif not used:
+                    # Le chunk le plus pertinent est toujours gardé, coupé au budget
+                    text = text[:max(0, available) * CHARS_PER_TOKEN]
+                else:
+                    continue
+            used += header_cost + self.count_tokens(text) + 1
+            seen.update(sentence_key for _, sentence_key in sentences if sentence_key)
+            chunks[number] = text
+            events[key] = (header, chunks)
+
+        blocks = []
+        for header, chunks in events.values():
+            lines = [header] if header else []
+            for number in sorted(chunks):
+                text = chunks[number]
+                # Un chunk retenu avant son prédécesseur n'a pas encore été débarrassé du chevauchement
+                if number - 1 in chunks:
+                    text = trim_overlap(chunks[number - 1], text)
+                if text:
+                    lines.append(text)
+            blocks.append("\n".join(lines))
+        return "\n\n".join(block for block in blocks if block)
+
+    def _new_sentences(self, text: str, seen: set) -> list:
+        """Phrases du texte qui ne sont pas déjà dans le contexte, avec leur forme normalisée."""
+        sentences = []
+        for sentence in split_sentences(text):
+            sentence_key = _sentence_key(sentence)
+            if not sentence_key:
+                continue
+            if len(sentence_key) < self.min_sentence_chars:
+                sentence_key = None  # trop courte pour être comparée
+            elif sentence_key in seen:
+                continue
+            sentences.append((sentence, sentence_key))
+        return sentences
@@ -1,41 +1,141 @@
+import json
+import logging
+import os
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
 
+logger = logging.getLogger(__name__)
 
-def fetch_events(region: str) -> list:
+# URL de l'API pointant directement vers le jeu de données
+OPENAGENDA_API_URL = "https://public.opendatasoft.com/api/explore/v2.1/catalog/datasets/evenements-publics-openagenda/records"
+
+# Nombre d'événements par page (Max 100)
+LIMIT_PER_PAGE = 100
+
+# Codes HTTP considérés comme transitoires (on peut réessayer)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class FetchError(RuntimeError):
+    """Levée quand des pages restent en échec après toutes les tentatives."""
+
+    def __init__(self, message: str, failed_offsets: list):
+        super().__init__(message)
+        self.failed_offsets = failed_offsets
+
+
+def window_start() -> str:
+    """Début de la fenêtre d'indexation : les événements commencés avant sont ignorés."""
+    return (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
+
+
+def window_end() -> str:
+    """Fin de la fenêtre d'indexation : les événements qui commencent après sont ignorés."""
+    return (datetime.now() + timedelta(days=365)).strftime('%Y-%m-%d')
+
+
+def build_where_clause(region: str, updated_since: str | None = None, entered_after: str | None = None) -> str:
+    """
+    Construit le filtre ODSQL : la région et 1 an autour de la date du jour.
+    Si `updated_since` est fourni, seuls les événements modifiés après cette
+    date sont retenus, ainsi que ceux qui commencent après `entered_after`
+    (la fin de la fenêtre précédente) : entrés dans la fenêtre depuis, ils
+    n'ont pas forcément été modifiés.
+    """
+    one_year_ago = window_start()
+    one_year_later = window_end()
+    where = f'firstdate_begin >= date\'{one_year_ago}\' AND firstdate_begin <= date\'{one_year_later}\' AND location_region="{region}"'
+    if updated_since and entered_after:
+        where += f" AND (updatedat > date'{updated_since}' OR firstdate_begin > date'{entered_after}')"
+    elif updated_since:
+        where += f" AND updatedat > date'{updated_since}'"
+    return where
+
+
+def fetch_events(
+        region: str,
+        concurrent: bool = False,
+        updated_since: str | None = None,
+        entered_after: str | None = None,
+        strict: bool = False,
+        **kwargs
+    ) -> list:
     """
     Récupère les événements depuis l'API Open Agenda en les filtrant.
 
     Args:
         region (str): La région pour laquelle filtrer les événements (ex: "Île-de-France").
+        concurrent (bool): Si True, télécharge les pages en parallèle
+            (voir `fetch_events_concurrent`, qui reçoit les **kwargs).
+        updated_since (str | None): Ne récupère que les événements modifiés
+            après cette date (champ `updatedat`), pour les mises à jour incrémentales.
+        entered_after (str | None): Avec `updated_since`, récupère aussi les
+            événements qui commencent après cette date (voir `build_where_clause`).
+        strict (bool): Si True, une erreur HTTP ou réseau lève `FetchError`
+            au lieu d'arrêter la récupération en silence (le mode parallèle
+            lève toujours `FetchError`).
 
     Returns:
-        pd.DataFrame: Un DataFrame contenant les événements filtrés.
+        list: La liste des événements (dictionnaires bruts de l'API).
+    """
+    if concurrent:
+        return fetch_events_concurrent(region, updated_since=updated_since, entered_after=entered_after, **kwargs)
+
+    all_events = []
+    for results_this_page in iter_event_pages(region, updated_since=updated_since, entered_after=entered_after, strict=strict):
+        # Ajout des événements récupérés à la liste globale
+        all_events.extend(results_this_page)
+
+    logger.info("Récupération terminée ! Total de %d événements.", len(all_events))
+    return all_events
+
+
+def iter_event_pages(
+        region: str,
+        concurrent: bool = False,
+        updated_since: str | None = None,
+        entered_after: str | None = None,
+        strict: bool = False,
+        **kwargs
+    ):
     """
-    print("Récupération et filtrage des données depuis l'API v2.1 d'Open Agenda...")
+    Générateur qui produit les événements page par page, au fur et à mesure
+    du téléchargement, sans jamais conserver l'ensemble du jeu de données.
 
-    # URL de l'API pointant directement vers le jeu de données
-    api_url = "https://public.opendatasoft.com/api/explore/v2.1/catalog/datasets/evenements-publics-openagenda/records"
+    Args:
+        region (str): La région pour laquelle filtrer les événements.
+        concurrent (bool): Si True, les pages sont téléchargées en parallèle
+            (voir `fetch_events_concurrent` pour les **kwargs) mais restent
+            produites dans l'ordre des offsets.
+        updated_since, entered_after, strict: Voir `fetch_events`.
+
+    Yields:
+        list: Les événements d'une page.
+    """
+    if concurrent:
+        yield from _iter_pages_concurrent(region, updated_since=updated_since, entered_after=entered_after, **kwargs)
+        return
 
-    # Définis la période : 1 an en arrière jusqu'à 1 an dans le futur
-    one_year_ago = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
-    one_year_later = (datetime.now() + timedelta(days=365)).strftime('%Y-%m-%d')
+    logger.info("Récupération et filtrage des données depuis l'API v2.1 d'Open Agenda...")
 
     # Initilialisation des paramètres de la requête
-    all_events = []
+    nb_events = 0
     offset = 0 # Pour la pagination, 0 = première page
-    limit_per_page = 100   # Nombre d'événements par page (Max 100)
+    limit_per_page = LIMIT_PER_PAGE
     total_count_events = -1  # Initialisation du compteur total
 
     while True:
         params = {
-            "where": f'firstdate_begin >= date\'{one_year_ago}\' AND firstdate_begin <= date\'{one_year_later}\' AND location_region="{region}"',
+            "where": build_where_clause(region, updated_since, entered_after),
             "limit": limit_per_page,
             "offset": offset
         }
 
         try:
-            response = requests.get(api_url, params=params)
+            response = requests.get(OPENAGENDA_API_URL, params=params)
             response.raise_for_status()
             data = response.json()
 
@@ -44,32 +144,268 @@ def fetch_events(region: str) -> list:
                 # Récupération du nombre total d'événements lors de la première requête
                 total_count_events = data.get('total_count', 0)
                 if total_count_events == 0:
-                    print("Aucun événement trouvé.")
+                    logger.info("Aucun événement trouvé.")
                     break
-            
+
             # Récupération des événements de cette page
             results_this_page = data.get('results', [])
             if not results_this_page:
+                if strict and nb_events < total_count_events:
+                    raise FetchError(f"Page vide à l'offset {offset} : {nb_events} événements sur {total_count_events}.", [offset])
                 break
 
-            # Ajout des événements récupérés à la liste globale
-            all_events.extend(results_this_page)
-            #print(f"Récupéré {len(all_events)} / {total_count_events} événements...")
+            nb_events += len(results_this_page)
+            #print(f"Récupéré {nb_events} / {total_count_events} événements...")
 
-            # Condition d'arrêt : si on a récupéré tous les événements
-            if len(all_events) >= total_count_events:
-                break
-
-            # Incrémentation de l'offset pour passer à la prochaine page
-            offset += limit_per_page
-        
         except requests.exceptions.HTTPError as err:
-            print(f"URL de la requête qui a échoué : {err.response.url}")
-            print(f"Contenu de la réponse : {err.response.text}")
+            logger.error("URL de la requête qui a échoué : %s", err.response.url)
+            logger.error("Contenu de la réponse : %s", err.response.text)
+            if strict:
+                raise FetchError(f"Échec de la page offset={offset} : {err}", [offset]) from err
             break
         except requests.exceptions.RequestException as e:
-            print(f"Erreur réseau: {e}")
+            logger.error("Erreur réseau: %s", e)
+            if strict:
+                raise FetchError(f"Échec de la page offset={offset} : {e}", [offset]) from e
             break
 
-    print(f"\nRécupération terminée ! Total de {len(all_events)} événements.")
-    return all_events
\ No newline at end of file
+        yield results_this_page
+
+        # Condition d'arrêt : si on a récupéré tous les événements
+        if nb_events >= total_count_events:
+            break
+
+        # Incrémentation de l'offset pour passer à la prochaine page
+        offset += limit_per_page
+
+
+def _create_session(pool_size: int) -> requests.Session:
+    """Crée une session HTTP dont le pool de connexions couvre toutes les requêtes en vol."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _fetch_page(session: requests.Session, api_url: str, params: dict,
+                max_retries: int, backoff_factor: float, timeout: float) -> dict:
+    """
+    Télécharge une page en réessayant sur les erreurs transitoires
+    (réseau, 429, 5xx) avec un délai exponentiel. Les autres erreurs HTTP
+    sont relancées immédiatement.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.get(api_url, params=params, timeout=timeout)
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                # On respecte le délai demandé par le serveur s'il est fourni
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else backoff_factor * (2 ** attempt)
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= max_retries:
+                raise
+            time.sleep(backoff_factor * (2 ** attempt))
+
+
+def _load_checkpoint(checkpoint_dir: str, where: str) -> tuple:
+    """
+    Liste les pages déjà téléchargées. Le point de reprise n'est valable que
+    pour la même requête : sinon il est ignoré (et sera écrasé).
+
+    Returns:
+        tuple: (total_count ou None, ensemble des offsets déjà sauvegardés)
+    """
+    meta_path = os.path.join(checkpoint_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None, set()
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("where") != where:
+        return None, set()
+
+    offsets = {
+        int(name[len("page_"):-len(".json")])
+        for name in os.listdir(checkpoint_dir)
+        if name.startswith("page_") and name.endswith(".json")
+    }
+    return meta["total_count"], offsets
+
+
+def _read_page(checkpoint_dir: str, offset: int) -> list:
+    with open(os.path.join(checkpoint_dir, f"page_{offset}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json_atomic(path: str, payload) -> None:
+    """Écrit un fichier JSON via un fichier temporaire pour ne jamais laisser de page tronquée."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _clear_checkpoint(checkpoint_dir: str) -> None:
+    for name in os.listdir(checkpoint_dir):
+        if name == "meta.json" or (name.startswith("page_") and name.endswith(".json")):
+            os.remove(os.path.join(checkpoint_dir, name))
+
+
+def fetch_events_concurrent(region: str, **kwargs) -> list:
+    """
+    Récupère les événements en téléchargeant les pages en parallèle.
+
+    La première requête donne `total_count` : tous les offsets restants sont
+    alors connus et téléchargés par un pool de `max_workers` threads qui
+    partagent une même session HTTP (au plus `max_workers` requêtes en vol,
+    et au plus 2 x `max_workers` pages téléchargées d'avance).
+    Si `checkpoint_dir` est fourni, chaque page terminée y est sauvegardée :
+    une récupération interrompue reprend là où elle s'était arrêtée.
+
+    Args:
+        region (str): La région pour laquelle filtrer les événements.
+        api_url (str): URL de l'API (modifiable pour les tests).
+        max_workers (int): Nombre maximum de requêtes en vol.
+        max_retries (int): Nouvelles tentatives par page sur erreur transitoire.
+        backoff_factor (float): Délai de base (s) de l'attente exponentielle.
+        timeout (float): Délai maximum (s) d'une requête.
+        checkpoint_dir (str | None): Dossier du point de reprise.
+        updated_since, entered_after: Voir `fetch_events`.
+
+    Raises:
+        FetchError: si des pages sont toujours en échec après `max_retries`
+            tentatives. Les pages réussies restent dans le point de reprise.
+
+    Returns:
+        list: Les événements, dans l'ordre des pages.
+    """
+    all_events = []
+    for results_this_page in _iter_pages_concurrent(region, **kwargs):
+        all_events.extend(results_this_page)
+
+    logger.info("Récupération terminée ! Total de %d événements.", len(all_events))
+    return all_events
+
+
+def _iter_pages_concurrent(
+        region: str,
+        api_url: str = OPENAGENDA_API_URL,
+        max_workers: int = 8,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 30,
+        checkpoint_dir: str | None = None,
+        updated_since: str | None = None,
+        entered_after: str | None = None
+    ):
+    """
+    Moteur de `fetch_events_concurrent` : produit les pages dans l'ordre des
+    offsets dès qu'elles sont disponibles, pendant que le pool continue de
+    télécharger les suivantes.
+    """
+    logger.info("Récupération parallèle des données depuis l'API Open Agenda (%d requêtes max en vol)...", max_workers)
+
+    where = build_where_clause(region, updated_since, entered_after)
+    session = _create_session(max_workers)
+
+    total_count, checkpointed = None, set()
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        total_count, checkpointed = _load_checkpoint(checkpoint_dir, where)
+        if total_count is None:
+            _clear_checkpoint(checkpoint_dir)
+        elif checkpointed:
+            logger.info("-> Reprise : %d pages déjà récupérées.", len(checkpointed))
+
+    # Pages terminées mais pas encore produites (en attente d'une page précédente)
+    pending = {}
+
+    def save_page(offset: int, results: list) -> None:
+        if checkpoint_dir:
+            _write_json_atomic(os.path.join(checkpoint_dir, f"page_{offset}.json"), results)
+        pending[offset] = results
+
+    try:
+        # 1. La première page donne le nombre total d'événements
+        if total_count is None:
+            params = {"where": where, "limit": LIMIT_PER_PAGE, "offset": 0}
+            try:
+                data = _fetch_page(session, api_url, params, max_retries, backoff_factor, timeout)
+            except requests.exceptions.RequestException as e:
+                raise FetchError(f"Échec de la première page : {e}", [0]) from e
+            total_count = data.get('total_count', 0)
+            if checkpoint_dir:
+                _write_json_atomic(os.path.join(checkpoint_dir, "meta.json"), {"where": where, "total_count": total_count})
+            save_page(0, data.get('results', []))
+
+        if total_count == 0:
+            logger.info("Aucun événement trouvé.")
+            return
+
+        # 2. Les offsets restants sont téléchargés en parallèle, dans une fenêtre
+        #    bornée : au plus `window` pages en vol ou en attente d'être produites,
+        #    quelle que soit la vitesse du consommateur (mémoire stable en streaming)
+        all_offsets = list(range(0, total_count, LIMIT_PER_PAGE))
+        offsets_to_fetch = iter([o for o in all_offsets if o not in checkpointed and o not in pending])
+        window = 2 * max_workers
+        failed_offsets = []
+        next_index = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+
+            def refill() -> None:
+                # Sans point de reprise, les pages suivantes seraient perdues après un échec
+                while len(futures) + len(pending) < window and (checkpoint_dir or not failed_offsets):
+                    offset = next(offsets_to_fetch, None)
+                    if offset is None:
+                        return
+                    params = {"where": where, "limit": LIMIT_PER_PAGE, "offset": offset}
+                    futures[executor.submit(_fetch_page, session, api_url, params, max_retries, backoff_factor, timeout)] = offset
+
+            refill()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    offset = futures.pop(future)
+                    try:
+                        save_page(offset, future.result().get('results', []))
+                    except requests.exceptions.RequestException as e:
+                        logger.error("Échec définitif de la page offset=%d : %s", offset, e)
+                        failed_offsets.append(offset)
+
+                if failed_offsets and checkpoint_dir:
+                    # Plus rien ne sera produit : les pages restent dans le point de reprise
+                    checkpointed.update(pending)
+                    pending.clear()
+
+                # 3. On produit toutes les pages contiguës déjà disponibles
+                while next_index < len(all_offsets) and not failed_offsets:
+                    next_offset = all_offsets[next_index]
+                    if next_offset in pending:
+                        yield pending.pop(next_offset)
+                    elif next_offset in checkpointed:
+                        yield _read_page(checkpoint_dir, next_offset)
+                    else:
+                        break
+                    next_index += 1
+                refill()
+
+        if failed_offsets:
+            raise FetchError(
+                f"{len(failed_offsets)} page(s) en échec après {max_retries} nouvelles tentatives.",
+                sorted(failed_offsets)
+            )
+
+        # Cas où il ne restait rien à télécharger (tout était dans le point de reprise)
+        for next_offset in all_offsets[next_index:]:
+            yield pending.pop(next_offset) if next_offset in pending else _read_page(checkpoint_dir, next_offset)
+    finally:
+        session.close()
+
+    if checkpoint_dir:
+        _clear_checkpoint(checkpoint_dir)
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+def collapse_by_event(positions, events: np.ndarray) -> np.ndarray:
+    """
+    Ne garde, pour chaque événement, que son chunk le mieux classé.
+
+    Args:
+        positions: Positions des chunks, de la plus pertinente à la moins pertinente.
+        events: Code de l'événement de chaque position de l'index (voir `MetadataIndex.events`).
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    # `return_index` donne la première occurrence de chaque événement, donc la mieux classée
+    _, first = np.unique(events[positions], return_index=True)
+    return positions[np.sort(first)]
+
+
+def reconstruct_vectors(index, positions) -> np.ndarray | None:
+    """
+    Vecteurs stockés dans l'index FAISS aux positions données, ou None si
+    l'index ne permet pas de les reconstruire. Un index IVF doit avoir sa
+    table position -> liste (voir `load_faiss_index` avec `mmap=True`) :
+    elle n'est jamais construite ici, l'index étant partagé par les requêtes.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    try:
+        return index.reconstruct_batch(positions)
+    except RuntimeError:
+        return None
+
+
+def maximal_marginal_relevance(relevance, vectors: np.ndarray, k: int, lambda_mult: float = 0.7) -> np.ndarray:
+    """
+    Sélection gloutonne Maximal Marginal Relevance parmi des candidats.
+
+    À chaque étape, le candidat retenu maximise
+    `lambda_mult * pertinence - (1 - lambda_mult) * similarité maximale aux candidats déjà retenus`.
+    Les similarités cosinus entre candidats sont calculées en une seule
+    multiplication de matrices ; chaque étape ne fait qu'un `argmax` et un
+    `maximum` sur des vecteurs.
+
+    Args:
+        relevance: Pertinence de chaque candidat pour la question.
+        vectors: Vecteurs des candidats (une ligne par candidat).
+
+    Returns:
+        np.ndarray: Indices (dans les candidats) des `k` candidats retenus, dans l'ordre de sélection.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    n = len(relevance)
+    if n <= 1 or k <= 0:
+        return np.arange(min(n, max(k, 0)))
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarities = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarities[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    for _ in range(min(k, n) - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarities[best], out=max_similarity)
+    return np.array(selected, dtype=np.int64)
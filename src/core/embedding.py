@@ -1,9 +1,16 @@
+import logging
 import os
+import math
 import time
 from dotenv import load_dotenv
 from langchain_mistralai import MistralAIEmbeddings
 from tqdm import tqdm
 
+logger = logging.getLogger(__name__)
+
+# Estimation prudente pour le tokenizer de Mistral sur du texte français
+CHARS_PER_TOKEN = 3
+
 def get_embedding_model():
     """Initialise et retourne l'objet du modèle d'embedding."""
     load_dotenv()
@@ -13,16 +20,55 @@ def get_embedding_model():
     return MistralAIEmbeddings(mistral_api_key=api_key, model="mistral-embed")
 
 
-def get_embed_texts(texts: list, embedding_model: MistralAIEmbeddings) -> list:
+def estimate_tokens(text: str) -> int:
+    """Estimation prudente du nombre de tokens d'un texte, sans tokenizer (voir `CHARS_PER_TOKEN`)."""
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def failed_positions(vectors: list) -> list:
+    """Positions des textes dont l'embedding a échoué (vecteur None)."""
+    return [i for i, vector in enumerate(vectors) if vector is None]
+
+
+def get_embed_texts(
+        texts: list,
+        embedding_model: MistralAIEmbeddings,
+        scheduler=None,
+        max_retries: int = 3,
+        backoff_base: float = 2.0,
+        max_backoff: float = 60.0,
+        progress=None
+    ) -> list:
     """
     Génère des embeddings pour les textes donnés en utilisant MistralAI, en gérant les limites de l'API.
+
+    Si un `EmbeddingScheduler` est fourni, il remplace la boucle séquentielle
+    (lots de 50 + pause fixe d'1 seconde) : plusieurs lots sont envoyés en
+    parallèle, dans la limite du débit configuré.
+
+    Les lots en échec sont retentés jusqu'à `max_retries` fois, avec une
+    attente exponentielle plafonnée à `max_backoff` secondes.
+
+    `progress`, s'il est fourni, est appelé après chaque lot de la boucle
+    séquentielle avec le nombre de textes traités par ce lot.
+
+    Returns:
+        list: Un vecteur par texte, à la même position. Les textes dont le lot
+        a échoué malgré les nouvelles tentatives valent None (voir `failed_positions`).
     """
-    print("-> Début de la génération des embeddings (avec gestion des pauses)...")
+    if scheduler is not None:
+        vectors = scheduler.embed(texts, embedding_model)
+        if progress is not None:
+            progress(len(texts))
+        return vectors
+
+    logger.info("-> Début de la génération des embeddings (avec gestion des pauses)...")
     
     # Initialisation du modèle d'embedding
     emb = embedding_model
 
-    all_vectors = []
+    all_vectors = [None] * len(texts)
+    failed_batches = []  # Début des lots en échec
     batch_size = 50  # Nombre d'éléments à traiter par lot
     
     # On utilise tqdm pour visualiser la progression
@@ -32,16 +78,39 @@ def get_embed_texts(texts: list, embedding_model: MistralAIEmbeddings) -> list:
         
         # On génère les vecteurs pour ce lot
         try:
-            vectors = emb.embed_documents(batch)
-            all_vectors.extend(vectors)
+            all_vectors[i:i + len(batch)] = emb.embed_documents(batch)
             
             # PAUSE OBLIGATOIRE ☕: On attend 1 seconde avant d'envoyer le lot suivant
             time.sleep(1)
             
         except Exception as e:
-            print(f"Une erreur est survenue sur le lot {i}-{i+batch_size}: {e}")
-            # On peut décider de continuer ou d'arrêter en cas d'erreur
-            continue
+            logger.warning("Une erreur est survenue sur le lot %d-%d: %s", i, i + batch_size, e)
+            # On note le lot pour le retenter à la fin
+            failed_batches.append(i)
+
+        if progress is not None:
+            progress(len(batch))
+
+    # Nouvelles tentatives des lots en échec, avec une attente exponentielle bornée
+    for attempt in range(max_retries):
+        if not failed_batches:
+            break
+        delay = min(backoff_base * (2 ** attempt), max_backoff)
+        logger.info("-> Nouvelle tentative pour %d lot(s) dans %g s...", len(failed_batches), delay)
+        time.sleep(delay)
+
+        still_failed = []
+        for i in failed_batches:
+            batch = texts[i:i + batch_size]
+            try:
+                all_vectors[i:i + len(batch)] = emb.embed_documents(batch)
+            except Exception as e:
+                logger.warning("Nouvel échec sur le lot %d-%d: %s", i, i + batch_size, e)
+                still_failed.append(i)
+        failed_batches = still_failed
 
-    print(f"\n-> Génération des {len(all_vectors)} embeddings terminée.")
-    return all_vectors
\ No newline at end of file
+    n_failed = len(failed_positions(all_vectors))
+    logger.info("-> Génération des %d embeddings terminée.", len(texts) - n_failed)
+    if n_failed:
+        logger.error("-> %d textes sans embedding après %d nouvelles tentatives.", n_failed, max_retries)
+    return all_vectors
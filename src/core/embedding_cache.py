@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import os
+import numpy as np
+from .embedding import get_embed_texts
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Cache disque des embeddings, adressé par le contenu.
+
+    La clé d'un texte est un hash de (nom du modèle, texte) : un chunk inchangé
+    entre deux reconstructions n'est donc jamais ré-envoyé à l'API.
+    Le cache tient dans un seul fichier `embeddings.npz` : la matrice des
+    vecteurs en float32, les clés et un compteur d'utilisation par ligne.
+    Au-delà de `max_size_mb`, les vecteurs les moins récemment utilisés sont évincés.
+    """
+
+    FILE_NAME = "embeddings.npz"
+
+    def __init__(self, cache_dir: str = "data/embedding_cache", model_name: str = "mistral-embed", max_size_mb: float = 512):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._last_used = np.empty(0, dtype=np.int64)
+        self._rows = {}  # clé -> ligne de la matrice
+        self._clock = 0
+        self._pending = {}  # clé -> (vecteur, compteur d'utilisation), pas encore sur disque
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._pending)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+    def _load(self) -> None:
+        path = os.path.join(self.cache_dir, self.FILE_NAME)
+        if not os.path.exists(path):
+            return
+        with np.load(path) as data:
+            self._vectors = data["vectors"]
+            self._last_used = data["last_used"]
+            self._rows = {key: row for row, key in enumerate(data["keys"].tolist())}
+        self._clock = int(self._last_used.max()) if len(self._last_used) else 0
+
+    def get_many(self, texts: list) -> list:
+        """
+        Retourne, pour chaque texte, son vecteur en cache (liste de float) ou None.
+        Les vecteurs ajoutés depuis le dernier `save` sont aussi trouvés.
+        """
+        self._clock += 1
+        results = []
+        for text in texts:
+            key = self.key(text)
+            row = self._rows.get(key)
+            if row is not None:
+                self.hits += 1
+                self._last_used[row] = self._clock
+                results.append(self._vectors[row].tolist())
+            elif key in self._pending:
+                self.hits += 1
+                vector, _ = self._pending[key]
+                self._pending[key] = (vector, self._clock)
+                results.append(np.asarray(vector, dtype=np.float32).tolist())
+            else:
+                self.misses += 1
+                results.append(None)
+        return results
+
+    def put_many(self, texts: list, vectors: list) -> None:
+        """Ajoute des vecteurs au cache (ils seront écrits sur disque par `save`)."""
+        for text, vector in zip(texts, vectors):
+            key = self.key(text)
+            if vector is not None and key not in self._rows:
+                self._pending[key] = (vector, self._clock)
+
+    def save(self) -> None:
+        """Fusionne les nouveaux vecteurs, applique l'éviction LRU et écrit le cache de façon atomique."""
+        keys = [None] * len(self._rows)
+        for key, row in self._rows.items():
+            keys[row] = key
+        vectors = self._vectors
+        last_used = self._last_used
+
+        if self._pending:
+            new_vectors = np.asarray([vector for vector, _ in self._pending.values()], dtype=np.float32)
+            vectors = new_vectors if vectors.size == 0 else np.vstack([vectors, new_vectors])
+            last_used = np.concatenate([last_used, np.asarray([clock for _, clock in self._pending.values()], dtype=np.int64)])
+            keys.extend(self._pending)
+            self._pending = {}
+
+        # Éviction : on garde les lignes les plus récemment utilisées qui tiennent dans le budget
+        if vectors.nbytes > self.max_bytes and len(keys):
+            max_rows = self.max_bytes // vectors[0].nbytes
+            keep = np.sort(np.argsort(-last_used, kind="stable")[:max_rows])
+            logger.info("-> Cache d'embeddings : éviction de %d vecteurs.", len(keys) - len(keep))
+            vectors, last_used = vectors[keep], last_used[keep]
+            keys = [keys[row] for row in keep]
+
+        self._vectors, self._last_used = vectors, last_used
+        self._rows = {key: row for row, key in enumerate(keys)}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, self.FILE_NAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=vectors, keys=np.array(keys, dtype="U32"), last_used=last_used)
+        os.replace(tmp_path, path)
+
+
+def get_embed_texts_cached(texts: list, embedding_model, cache: EmbeddingCache, scheduler=None, progress=None) -> list:
+    """
+    Comme `get_embed_texts`, mais seuls les textes absents du cache sont envoyés au modèle.
+    Les nouveaux vecteurs sont ajoutés au cache (penser à appeler `cache.save()`) ;
+    les textes en échec valent None, à leur position.
+    """
+    vectors = cache.get_many(texts)
+    missing_positions = [i for i, vector in enumerate(vectors) if vector is None]
+    logger.info("-> Cache d'embeddings : %d / %d chunks déjà connus.", len(texts) - len(missing_positions), len(texts))
+    if progress is not None and len(missing_positions) < len(texts):
+        progress(len(texts) - len(missing_positions))
+
+    if missing_positions:
+        missing_texts = [texts[i] for i in missing_positions]
+        new_vectors = get_embed_texts(missing_texts, embedding_model, scheduler=scheduler, progress=progress)
+        # Les vecteurs en échec (None) ne sont pas mis en cache
+        cache.put_many(missing_texts, new_vectors)
+        for i, vector in zip(missing_positions, new_vectors):
+            vectors[i] = vector
+
+    return vectors
@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .embedding import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Détecte une réponse 429 (trop de requêtes), quelle que soit la bibliothèque HTTP."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code == 429
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message
+
+
+class _TokenBucket:
+    """Seau à jetons thread-safe : `acquire` bloque jusqu'à ce que la quantité soit disponible."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float) -> None:
+        # Une demande plus grosse que le seau est servie quand il est plein,
+        # le solde devient négatif et retarde d'autant les demandes suivantes
+        threshold = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= threshold:
+                    self._tokens -= amount
+                    return
+                wait = (threshold - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingScheduler:
+    """
+    Planificateur d'embeddings qui respecte les limites du fournisseur.
+
+    - Les lots sont construits selon un budget de tokens (et non un nombre fixe de textes).
+    - Plusieurs lots sont envoyés en parallèle (`max_in_flight`), dans la limite
+      de `requests_per_second` et `tokens_per_minute` (seaux à jetons).
+    - Sur une erreur 429, le débit autorisé est divisé par deux et tous les
+      lots marquent une pause exponentielle ; il remonte ensuite progressivement.
+    - `stats` rend compte du débit réellement obtenu.
+
+    Usage :
+        scheduler = EmbeddingScheduler(requests_per_second=2, tokens_per_minute=500_000)
+        vectors = get_embed_texts(chunks, embedding_model, scheduler=scheduler)
+    """
+
+    def __init__(
+            self,
+            requests_per_second: float = 1.0,
+            tokens_per_minute: float = 500_000,
+            max_in_flight: int = 4,
+            max_batch_tokens: int = 12_000,
+            max_batch_items: int = 128,
+            max_retries: int = 5,
+            backoff_base: float = 1.0
+        ):
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.max_in_flight = max_in_flight
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+        self._request_bucket = _TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self._token_bucket = _TokenBucket(tokens_per_minute / 60, max(max_batch_tokens, tokens_per_minute / 60))
+        # Fraction du débit configuré actuellement autorisée (réduite après un 429)
+        self._rate_factor = 1.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def make_batches(self, token_counts: list) -> list:
+        """Regroupe les positions en lots (début, fin) sous le budget de tokens et d'éléments."""
+        batches = []
+        start, batch_tokens = 0, 0
+        for i, n_tokens in enumerate(token_counts):
+            if i > start and (batch_tokens + n_tokens > self.max_batch_tokens or i - start >= self.max_batch_items):
+                batches.append((start, i))
+                start, batch_tokens = i, 0
+            batch_tokens += n_tokens
+        if start < len(token_counts):
+            batches.append((start, len(token_counts)))
+        return batches
+
+    def embed(self, texts: list, embedding_model) -> list:
+        """
+        Génère les embeddings de `texts`.
+
+        Returns:
+            list: Un vecteur par texte, à la même position. Les textes dont le
+            lot a échoué après `max_retries` tentatives valent None.
+        """
+        token_counts = [estimate_tokens(text) for text in texts]
+        batches = self.make_batches(token_counts)
+        vectors = [None] * len(texts)
+        self.stats = {"texts": len(texts), "tokens": sum(token_counts), "requests": 0,
+                      "retries": 0, "throttled": 0, "failed_batches": 0}
+
+        def run_batch(bounds):
+            start, end = bounds
+            result = self._embed_batch(texts[start:end], sum(token_counts[start:end]), embedding_model)
+            if result is not None:
+                vectors[start:end] = result
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            list(executor.map(run_batch, batches))
+        elapsed = time.perf_counter() - started
+
+        self.stats.update({
+            "batches": len(batches),
+            "elapsed_seconds": round(elapsed, 3),
+            "texts_per_second": round(len(texts) / elapsed, 2) if elapsed else 0.0,
+            "tokens_per_second": round(self.stats["tokens"] / elapsed, 2) if elapsed else 0.0,
+        })
+        logger.info(
+            "-> Débit d'embedding : %s textes/s, %s tokens/s (%d réponses 429).",
+            self.stats['texts_per_second'], self.stats['tokens_per_second'], self.stats['throttled']
+        )
+        return vectors
+
+    def _wait_for_budget(self, n_tokens: int) -> None:
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        # Après un 429, chaque requête consomme plus de jetons : le débit effectif baisse
+        factor = 1 / self._rate_factor
+        self._request_bucket.acquire(factor)
+        self._token_bucket.acquire(n_tokens * factor)
+
+    def _embed_batch(self, batch: list, n_tokens: int, embedding_model):
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_budget(n_tokens)
+            try:
+                with self._lock:
+                    self.stats["requests"] += 1
+                result = embedding_model.embed_documents(batch)
+                with self._lock:
+                    # Succès : on remonte doucement vers le débit configuré
+                    self._rate_factor = min(1.0, self._rate_factor + 0.1)
+                return result
+            except Exception as e:
+                delay = self.backoff_base * (2 ** attempt)
+                with self._lock:
+                    if is_rate_limit_error(e):
+                        self.stats["throttled"] += 1
+                        self._rate_factor = max(0.05, self._rate_factor / 2)
+                        # Pause commune à tous les lots en vol
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    if attempt < self.max_retries:
+                        self.stats["retries"] += 1
+                if attempt >= self.max_retries:
+                    logger.error("Échec définitif d'un lot de %d textes : %s", len(batch), e)
+                    with self._lock:
+                        self.stats["failed_batches"] += 1
+                    return None
+                if not is_rate_limit_error(e):
+                    time.sleep(delay)
@@ -1,4 +1,29 @@
+import json
+import logging
+import os
+import re
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from .chunk_store import ChunkStore, PositionIds, write_chunks, has_chunk_store
+from .index_registry import resolve_index_path
+from .metadata_index import MetadataIndex
+from .bm25 import BM25Index
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# Chaîne `faiss.index_factory` de l'index par défaut : recherche exacte
+DEFAULT_INDEX_FACTORY = "Flat"
+
+# k-means : au moins un vecteur d'entraînement par centroïde, 39 pour ne pas déclencher l'avertissement de FAISS
+MIN_POINTS_PER_CENTROID = 39
+IVF_PATTERN = re.compile(r"IVF\d+")
 
 
 def create_faiss_index_from_vectors(
@@ -6,39 +31,356 @@ def create_faiss_index_from_vectors(
         vectors: list[list[float]], 
         metadatas: list[dict],
         embedding_model, 
-        index_path: str = "data/faiss_index"
+        index_path: str = "data/faiss_index",
+        index_factory: str = DEFAULT_INDEX_FACTORY
     ):
-    """Crée un index FAISS à partir de textes et de vecteurs DÉJÀ CALCULÉS."""
+    """
+    Crée un index FAISS à partir de textes et de vecteurs DÉJÀ CALCULÉS.
+    `index_factory` choisit le type d'index (voir `build_faiss_index`).
+    """
     
-    print(f"\nPréparation des données pour l'indexation FAISS...")
-    
-    # La méthode from_embeddings attend une liste de tuples (texte, vecteur)
+    logger.info("Création de l'index FAISS (%s) à partir de %d chunks...", index_factory, len(texts))
+
+    vectorstore = add_vectors_to_index(None, texts, vectors, metadatas, embedding_model, index_factory=index_factory)
+
+    logger.info("Index créé avec succès.")
+
+    save_faiss_index(vectorstore, index_path)
+    return vectorstore
+
+
+def add_vectors_to_index(
+        vectorstore,
+        texts: list[str],
+        vectors: list[list[float]],
+        metadatas: list[dict],
+        embedding_model,
+        index_factory: str = DEFAULT_INDEX_FACTORY,
+        known_ids: set | None = None
+    ):
+    """
+    Ajoute des chunks (et leurs vecteurs DÉJÀ CALCULÉS) à un index FAISS.
+    Si `vectorstore` vaut None, l'index est créé à partir de ce premier lot
+    (qui sert aussi d'échantillon d'entraînement pour les index IVF / PQ :
+    voir `training_size` pour la taille à réunir avant de le créer).
+    Permet de construire l'index lot par lot, au fil d'un pipeline en streaming.
+
+    Quand les métadonnées portent l'identifiant de l'événement, le `chunk_id`
+    sert d'identifiant dans l'index : les chunks d'un événement peuvent ainsi
+    être retrouvés et supprimés lors d'une mise à jour incrémentale. Les
+    chunks déjà présents (même événement reçu deux fois) sont ignorés.
+    `known_ids` : identifiants déjà dans l'index, qu'un appelant qui ajoute
+    plusieurs lots tient à jour d'un appel à l'autre (sinon, ils sont relus
+    dans l'index à chaque appel).
+    """
+    if vectorstore is not None and isinstance(vectorstore.docstore, ChunkStore):
+        raise ValueError("Cet index a été chargé en lecture seule (mmap=True) : le recharger avec mmap=False pour le modifier.")
+
+    ids = None
+    if metadatas and all('id' in m and 'chunk_id' in m for m in metadatas):
+        if known_ids is None:
+            known_ids = set(vectorstore.index_to_docstore_id.values()) if vectorstore is not None else set()
+        keep, seen = [], set()
+        for i, metadata in enumerate(metadatas):
+            if metadata['chunk_id'] not in known_ids and metadata['chunk_id'] not in seen:
+                seen.add(metadata['chunk_id'])
+                keep.append(i)
+        if len(keep) < len(texts):
+            logger.info("-> %d chunks déjà présents dans l'index ignorés.", len(texts) - len(keep))
+            texts = [texts[i] for i in keep]
+            vectors = [vectors[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+        ids = [m['chunk_id'] for m in metadatas]
+        if not texts:
+            return vectorstore
+        known_ids.update(ids)
+
+    # Les méthodes de FAISS attendent une liste de tuples (texte, vecteur)
     text_embeddings = list(zip(texts, vectors))
 
-    print(f"Création de l'index FAISS à partir de {len(texts)} chunks...")
-    
-    # On utilise from_embeddings, qui a besoin de l'objet embedding_model pour la configuration
-    vectorstore = FAISS.from_embeddings(
-        text_embeddings=text_embeddings,
-        embedding=embedding_model,
-        metadatas=metadatas
-    )
-    
-    print("Index créé avec succès.")
-    
-    vectorstore.save_local(index_path)
-    print(f"Index sauvegardé dans le dossier : {index_path}")
+    if vectorstore is None and index_factory == DEFAULT_INDEX_FACTORY:
+        # On utilise from_embeddings, qui a besoin de l'objet embedding_model pour la configuration
+        return FAISS.from_embeddings(
+            text_embeddings=text_embeddings,
+            embedding=embedding_model,
+            metadatas=metadatas,
+            ids=ids
+        )
+
+    if vectorstore is None:
+        # Index approximatif : on l'entraîne puis on l'enveloppe dans un vectorstore vide
+        index = build_faiss_index(np.asarray(vectors, dtype=np.float32), index_factory)
+        vectorstore = FAISS(
+            embedding_function=embedding_model,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+
+    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
     return vectorstore
 
 
-def load_faiss_index(embedding_model, index_path: str = "data/faiss_index", allow_dangerous: bool = True):
-    """Charge un index FAISS depuis le disque."""
-    print(f"\nChargement de l'index FAISS depuis : {index_path}")
-    # Le paramètre 'allow_dangerous_deserialization' est requis par les versions récentes de LangChain
-    vectorstore = FAISS.load_local(
-        index_path, 
-        embeddings=embedding_model, 
-        allow_dangerous_deserialization=allow_dangerous
-    )
-    print("Index chargé avec succès.")
-    return vectorstore
\ No newline at end of file
+def build_faiss_index(
+        vectors: np.ndarray,
+        index_factory: str = DEFAULT_INDEX_FACTORY,
+        train_sample_size: int = 50_000,
+        seed: int = 0
+    ):
+    """
+    Crée un index FAISS vide à partir d'une chaîne `faiss.index_factory`, par exemple :
+      - "Flat" : recherche exacte (par défaut) ;
+      - "IVF1024,Flat" : partitionnement en 1024 listes, réglé par `nprobe` ;
+      - "HNSW32" : graphe HNSW, réglé par `efSearch` ;
+      - "IVF1024,PQ64" : listes IVF + vecteurs compressés (64 octets au lieu de 4 Ko).
+
+    Si l'index a besoin d'être entraîné (IVF, PQ), il l'est sur un échantillon
+    aléatoire d'au plus `train_sample_size` vecteurs. FAISS demande au moins
+    autant de vecteurs que de listes IVF (idéalement ~40 fois plus) et, pour
+    PQ, que de centroïdes par sous-quantifieur (256 sur 8 bits). Sur un
+    échantillon trop petit, le nombre de listes IVF est réduit et, si cela ne
+    suffit pas, l'index se replie sur une recherche exacte ("Flat").
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], index_factory)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > train_sample_size:
+            rng = np.random.default_rng(seed)
+            sample = vectors[rng.choice(len(vectors), train_sample_size, replace=False)]
+        fitted = _fit_index_factory(index, index_factory, len(sample))
+        if fitted != index_factory:
+            index_factory, index = fitted, faiss.index_factory(vectors.shape[1], fitted)
+            if index.is_trained:
+                return index
+        logger.info("-> Entraînement de l'index %s sur %d vecteurs...", index_factory, len(sample))
+        index.train(sample)
+    return index
+
+
+def training_size(index_factory: str, dim: int, train_sample_size: int = 50_000) -> int:
+    """
+    Nombre de vecteurs à réunir avant d'entraîner un index `index_factory` de
+    dimension `dim` : de quoi entraîner toutes ses listes IVF sans avertissement
+    (et son PQ), dans la limite de `train_sample_size`. 0 s'il n'a pas besoin
+    d'entraînement.
+    """
+    index = faiss.index_factory(dim, index_factory)
+    if index.is_trained:
+        return 0
+    nlist, ksub = _training_requirements(index)
+    return min(max(MIN_POINTS_PER_CENTROID * nlist, ksub, 1), train_sample_size)
+
+
+def _training_requirements(index) -> tuple[int, int]:
+    """Nombre de listes IVF et de centroïdes par sous-quantifieur PQ de l'index (0 s'il n'en a pas)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    nlist = ivf.nlist if ivf is not None else 0
+    pq = getattr(faiss.downcast_index(ivf if ivf is not None else index), 'pq', None)
+    return nlist, pq.ksub if pq is not None else 0
+
+
+def _fit_index_factory(index, index_factory: str, n_samples: int) -> str:
+    """
+    Adapte `index_factory` à un échantillon d'entraînement de `n_samples`
+    vecteurs, trop petit pour l'index demandé : moins de listes IVF, ou
+    recherche exacte si l'entraînement reste impossible (PQ).
+    """
+    nlist, ksub = _training_requirements(index)
+    if n_samples < ksub:
+        logger.warning(
+            "Seulement %d vecteurs pour entraîner l'index %s (%d nécessaires) : index exact (%s) à la place.",
+            n_samples, index_factory, ksub, DEFAULT_INDEX_FACTORY
+        )
+        return DEFAULT_INDEX_FACTORY
+    if n_samples < nlist:
+        fitted = IVF_PATTERN.sub(f"IVF{max(1, n_samples // MIN_POINTS_PER_CENTROID)}", index_factory, count=1)
+        logger.warning(
+            "Seulement %d vecteurs pour entraîner les %d listes de l'index %s : index %s à la place.",
+            n_samples, nlist, index_factory, fitted
+        )
+        return fitted
+    return index_factory
+
+
+def set_search_params(index, nprobe: int | None = None, ef_search: int | None = None):
+    """
+    Règle le compromis rappel / latence d'un index approximatif au moment de la requête :
+    `nprobe` (nombre de listes IVF visitées) et `ef_search` (largeur de la recherche HNSW).
+    Un paramètre sans objet pour le type d'index est ignoré.
+    """
+    parameters = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            parameters.set_index_parameter(index, name, value)
+        except RuntimeError:
+            logger.warning("Paramètre '%s' ignoré : non applicable à cet index.", name)
+
+
+def delete_chunks(vectorstore, chunk_ids: list[str]):
+    """
+    Supprime des chunks de l'index et du docstore.
+
+    `FAISS.delete` renumérote les positions restantes de 0 à n-1, ce qui
+    correspond au comportement d'un index plat. Un index IVF conserve au
+    contraire les identifiants d'origine : on les renumérote de la même façon
+    pour que les résultats de recherche pointent toujours vers le bon chunk.
+    Lève une RuntimeError si le type d'index ne permet pas la suppression (HNSW).
+    """
+    reversed_index = {docstore_id: i for i, docstore_id in vectorstore.index_to_docstore_id.items()}
+    removed = np.sort(np.fromiter((reversed_index[chunk_id] for chunk_id in chunk_ids if chunk_id in reversed_index), dtype=np.int64))
+    vectorstore.delete(chunk_ids)
+
+    ivf = faiss.try_extract_index_ivf(vectorstore.index)
+    if ivf is None or not len(removed):
+        return
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        list_size = invlists.list_size(list_no)
+        if list_size == 0:
+            continue
+        ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), list_size).copy()
+        # Nouvel identifiant = ancien - nombre de positions supprimées avant lui
+        new_ids = ids - np.searchsorted(removed, ids)
+        invlists.update_entries(list_no, 0, list_size, faiss.swig_ptr(new_ids), invlists.get_codes(list_no))
+
+
+def save_faiss_index(vectorstore, index_path: str = "data/faiss_index"):
+    """
+    Sauvegarde un index FAISS sur le disque, sans pickle :
+      - `index.faiss` : l'index FAISS (format natif, projetable en mémoire) ;
+      - `chunks.jsonl` + `chunks_offsets.npy` : textes et métadonnées des chunks,
+        lisibles un par un (voir `ChunkStore`) ;
+      - `metadata_index.npz` : index des villes, départements et dates, pour
+        le pré-filtrage des recherches (voir `MetadataIndex`) ;
+      - `bm25_index.npz` : index lexical des mêmes chunks, pour la recherche
+        hybride (voir `BM25Index`).
+    """
+    os.makedirs(index_path, exist_ok=True)
+    read_only = isinstance(vectorstore.docstore, ChunkStore)
+    texts, metadatas = [], []
+
+    def records():
+        for position, docstore_id in sorted(vectorstore.index_to_docstore_id.items()):
+            doc = vectorstore.docstore.search(docstore_id)
+            texts.append(doc.page_content)
+            metadatas.append(doc.metadata)
+            yield (doc.id if read_only else docstore_id), doc.page_content, doc.metadata
+
+    index_file = os.path.join(index_path, INDEX_FILE)
+    faiss.write_index(vectorstore.index, f"{index_file}.tmp")
+    os.replace(f"{index_file}.tmp", index_file)
+    write_chunks(records(), index_path)
+    MetadataIndex.from_metadatas(metadatas).save(index_path)
+    BM25Index.build(texts).save(index_path)
+
+    # Un ancien docstore picklé ne correspondrait plus à l'index
+    legacy_file = os.path.join(index_path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy_file):
+        os.remove(legacy_file)
+    logger.info("Index sauvegardé dans le dossier : %s", index_path)
+
+
+def load_faiss_index(
+        embedding_model,
+        index_path: str = "data/faiss_index",
+        allow_dangerous: bool = True,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mmap: bool = False
+    ):
+    """
+    Charge un index FAISS depuis le disque.
+    `nprobe` / `ef_search` règlent la recherche des index approximatifs (voir `set_search_params`).
+
+    Avec `mmap=True`, l'index est projeté en mémoire en lecture seule et les
+    chunks ne sont lus qu'à la demande : le chargement est quasi instantané et
+    plusieurs processus partagent les mêmes pages. L'index ne peut alors plus
+    être modifié (mode réservé à l'API) ; ses vecteurs peuvent être reconstruits
+    (voir `reconstruct_vectors`), même pour un index IVF. Avec `mmap=False`, tout est chargé
+    en mémoire, comme le requiert une mise à jour incrémentale.
+
+    Les index au format pickle (`index.pkl`) restent lisibles via
+    `FAISS.load_local`, d'où le paramètre `allow_dangerous`.
+    Si `index_path` contient plusieurs versions (voir `IndexRegistry`),
+    c'est la version courante qui est chargée.
+    """
+    index_path = resolve_index_path(index_path)
+    logger.info("Chargement de l'index FAISS depuis : %s", index_path)
+    if not has_chunk_store(index_path):
+        # Ancien format : le paramètre 'allow_dangerous_deserialization' est requis par les versions récentes de LangChain
+        vectorstore = FAISS.load_local(
+            index_path, 
+            embeddings=embedding_model, 
+            allow_dangerous_deserialization=allow_dangerous
+        )
+    elif mmap:
+        index = faiss.read_index(os.path.join(index_path, INDEX_FILE), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        docstore = ChunkStore(index_path)
+        vectorstore = FAISS(embedding_model, index, docstore, PositionIds(len(docstore)))
+    else:
+        index = faiss.read_index(os.path.join(index_path, INDEX_FILE))
+        documents, index_to_docstore_id = {}, {}
+        for position, record in enumerate(ChunkStore(index_path).iter_records()):
+            documents[record["id"]] = Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+            index_to_docstore_id[position] = record["id"]
+        vectorstore = FAISS(embedding_model, index, InMemoryDocstore(documents), index_to_docstore_id)
+
+    if vectorstore.index.ntotal != len(vectorstore.index_to_docstore_id):
+        raise ValueError(f"Index incohérent : {vectorstore.index.ntotal} vecteurs pour {len(vectorstore.index_to_docstore_id)} chunks.")
+    set_search_params(vectorstore.index, nprobe=nprobe, ef_search=ef_search)
+    ivf = faiss.try_extract_index_ivf(vectorstore.index)
+    if mmap and ivf is not None:
+        # Table position -> liste IVF, pour que la sélection MMR puisse reconstruire les vecteurs
+        # candidats : construite ici une fois pour toutes, avant que les requêtes ne se partagent
+        # l'index. Réservée à l'index en lecture seule, elle empêcherait les suppressions.
+        ivf.make_direct_map()
+    logger.info("Index chargé avec succès.")
+    return vectorstore
+
+
+def build_manifest(vectorstore, region: str, window_end: str | None = None, fingerprints: dict | None = None) -> dict:
+    """
+    Construit le manifeste d'un index à partir des chunks qu'il contient :
+    pour chaque événement, les identifiants de ses chunks (pas forcément
+    contigus après un embedding partiel) et sa date de début, ainsi
+    que la date de mise à jour la plus récente (le "high-water mark" à partir
+    duquel la prochaine mise à jour incrémentale interrogera l'API).
+    `window_end` est la fin de la fenêtre d'indexation lors de la
+    récupération : les événements qui commencent après n'ont pas été vus.
+    `fingerprints` donne l'empreinte du texte de chaque événement (voir
+    `event_fingerprints`), qui permet à la mise à jour incrémentale d'écarter
+    les doublons des événements déjà indexés.
+    """
+    events = {}
+    high_water_mark = None
+    for docstore_id in vectorstore.index_to_docstore_id.values():
+        metadata = vectorstore.docstore.search(docstore_id).metadata
+        event = events.setdefault(str(metadata.get('id')), {'chunk_ids': [], 'date_debut': metadata.get('date_debut')})
+        event['chunk_ids'].append(metadata.get('chunk_id'))
+        updated_at = metadata.get('date_mise_a_jour')
+        if isinstance(updated_at, str) and (high_water_mark is None or updated_at > high_water_mark):
+            high_water_mark = updated_at
+    for event_id, event in events.items():
+        if fingerprints and event_id in fingerprints:
+            event['fingerprint'] = fingerprints[event_id]
+    return {'region': region, 'high_water_mark': high_water_mark, 'window_end': window_end, 'events': events}
+
+
+def save_manifest(manifest: dict, index_path: str = "data/faiss_index"):
+    """Sauvegarde le manifeste à côté de l'index (écriture atomique)."""
+    path = os.path.join(index_path, MANIFEST_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_manifest(index_path: str = "data/faiss_index") -> dict | None:
+    """Charge le manifeste d'un index, ou None s'il n'existe pas (index construit avant son introduction)."""
+    path = os.path.join(resolve_index_path(index_path), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
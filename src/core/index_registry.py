@@ -0,0 +1,108 @@
+import os
+import shutil
+from datetime import datetime
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+STAGING_DIR = "staging"
+
+
+class IndexRegistry:
+    """
+    Versions successives de l'index dans un même dossier racine :
+
+        data/faiss_index/
+        ├── CURRENT            # nom de la version servie
+        ├── versions/<version>/  # index complets, jamais modifiés une fois publiés
+        └── staging/<version>/   # index en cours de construction
+
+    Une reconstruction écrit dans `staging/`, puis `publish` déplace le
+    dossier dans `versions/` et remplace `CURRENT` de façon atomique : un
+    lecteur voit toujours soit l'ancienne version complète, soit la nouvelle.
+    Les `keep_versions` versions les plus récentes sont conservées pour
+    permettre un retour arrière immédiat (`rollback`).
+
+    Un dossier à l'ancien format (fichiers de l'index directement à la
+    racine, sans `CURRENT`) reste utilisable comme version courante.
+    """
+
+    def __init__(self, root: str = "data/faiss_index", keep_versions: int = 3):
+        self.root = root
+        self.keep_versions = keep_versions
+
+    def versions(self) -> list[str]:
+        """Versions publiées, de la plus ancienne à la plus récente."""
+        versions_path = os.path.join(self.root, VERSIONS_DIR)
+        if not os.path.isdir(versions_path):
+            return []
+        return sorted(os.listdir(versions_path))
+
+    def current_version(self) -> str | None:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current_path(self) -> str:
+        """Dossier de la version servie (la racine elle-même pour l'ancien format)."""
+        version = self.current_version()
+        return self.root if version is None else self.version_path(version)
+
+    def version_path(self, version: str) -> str:
+        return os.path.join(self.root, VERSIONS_DIR, version)
+
+    def create_staging(self) -> str:
+        """Crée un dossier vide où construire la prochaine version."""
+        # Horodatage à la microseconde : l'ordre alphabétique des versions est leur ordre de création
+        version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        path = os.path.join(self.root, STAGING_DIR, version)
+        os.makedirs(path)
+        return path
+
+    def publish(self, staging_path: str) -> str:
+        """Publie une version construite dans `staging/` et en fait la version courante."""
+        version = os.path.basename(os.path.normpath(staging_path))
+        os.makedirs(os.path.join(self.root, VERSIONS_DIR), exist_ok=True)
+        os.replace(staging_path, self.version_path(version))
+        self.set_current(version)
+        self._prune()
+        return version
+
+    def discard(self, staging_path: str) -> None:
+        """Abandonne une version en cours de construction."""
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+    def clear_staging(self) -> None:
+        """Supprime toutes les versions en cours de construction (après un arrêt forcé)."""
+        shutil.rmtree(os.path.join(self.root, STAGING_DIR), ignore_errors=True)
+
+    def rollback(self) -> str:
+        """Revient à la version publiée juste avant la version courante."""
+        versions = self.versions()
+        current = self.current_version()
+        position = versions.index(current) if current in versions else len(versions)
+        if position == 0:
+            raise ValueError("Aucune version antérieure disponible pour un retour arrière.")
+        previous = versions[position - 1]
+        self.set_current(previous)
+        return previous
+
+    def set_current(self, version: str) -> None:
+        """Fait de `version` la version servie (remplacement atomique de `CURRENT`)."""
+        current_file = os.path.join(self.root, CURRENT_FILE)
+        with open(f"{current_file}.tmp", "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(f"{current_file}.tmp", current_file)
+
+    def _prune(self) -> None:
+        # On ne supprime jamais la version courante, même après un retour arrière
+        current = self.current_version()
+        for version in self.versions()[:-self.keep_versions]:
+            if version != current:
+                shutil.rmtree(self.version_path(version), ignore_errors=True)
+
+
+def resolve_index_path(index_path: str) -> str:
+    """Dossier réellement servi pour `index_path` (version courante si le dossier est versionné)."""
+    return IndexRegistry(index_path).current_path()
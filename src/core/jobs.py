@@ -0,0 +1,254 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+from .pipeline import run_indexing_pipeline
+from .index_registry import IndexRegistry
+from .observability import REGISTRY, REBUILDS, configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Statuts d'une reconstruction encore en cours
+ACTIVE_STATUSES = ("running", "cancelling")
+
+
+class JobConflictError(RuntimeError):
+    """Une reconstruction est déjà en cours."""
+
+
+class RebuildCancelled(Exception):
+    """Levée dans le processus de reconstruction quand l'annulation a été demandée."""
+
+
+def _rebuild_worker(events, cancel_event, target, pipeline_kwargs):
+    """Point d'entrée du processus de reconstruction : exécute le pipeline et remonte sa progression et ses métriques."""
+    configure_logging()
+    REGISTRY.forward(lambda name, method, value, labels: events.put(("metric", name, method, value, labels)))
+
+    def progress(stage, done, total=None):
+        # Annulation coopérative : le pipeline s'interrompt au prochain point d'avancement,
+        # ce qui abandonne la version en construction et sauvegarde le cache d'embeddings
+        if cancel_event.is_set():
+            raise RebuildCancelled()
+        events.put(("progress", stage, done, total))
+
+    try:
+        success = target(progress=progress, **pipeline_kwargs)
+        events.put(("finished", "succeeded" if success else "failed", None))
+    except RebuildCancelled:
+        events.put(("finished", "cancelled", None))
+    except Exception as e:
+        events.put(("finished", "failed", f"{type(e).__name__}: {e}"))
+
+
+class RebuildJob:
+    """État d'une reconstruction, tel que vu par le processus qui sert l'API."""
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = "running"
+        self.stage = None
+        self.stages = {}  # étape -> {"done", "total", "seconds", "items_per_second"}
+        self.error = None
+        self.reloaded = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._stage_started = None
+        self._process = None
+        self._events = None
+        self._cancel_event = None
+
+    def update_progress(self, stage: str, done: int, total: int | None) -> None:
+        now = time.monotonic()
+        if stage != self.stage:
+            self.stage = stage
+            self._stage_started = now
+        elapsed = now - self._stage_started
+        self.stages[stage] = {
+            "done": done,
+            "total": total,
+            "seconds": round(elapsed, 2),
+            "items_per_second": round(done / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": {stage: dict(progress) for stage, progress in self.stages.items()},
+            "error": self.error,
+            "reloaded": self.reloaded,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class RebuildJobManager:
+    """
+    Lance les reconstructions de l'index dans un processus séparé.
+
+    Le nettoyage, le découpage et la boucle d'embedding ne prennent ainsi pas
+    le GIL du processus qui sert les questions. Une seule reconstruction
+    peut être en cours à la fois ; chacune est identifiée par un job id,
+    dont on peut suivre la progression étape par étape (`get`) ou demander
+    l'annulation (`cancel`).
+
+    Quand une reconstruction réussit, `on_ready` est appelé dans le processus
+    de l'API (typiquement `RAGService.load_components`, qui met en service la
+    nouvelle version sans interruption).
+    """
+
+    def __init__(
+            self,
+            index_path: str = "data/faiss_index",
+            on_ready=None,
+            target=run_indexing_pipeline,
+            mp_context: str = "spawn",
+            cancel_timeout: float = 30.0,
+            max_history: int = 20
+        ):
+        """
+        Args:
+            index_path (str): Dossier racine de l'index, transmis au pipeline.
+            on_ready (callable | None): Appelé sans argument après une
+                reconstruction réussie ; peut retourner un booléen de succès.
+            target (callable): Fonction de construction, exécutée dans le
+                processus enfant (doit accepter `progress` et être importable).
+            mp_context (str): Méthode de démarrage du processus. "spawn" évite
+                de dupliquer l'état (threads, index projetés) du serveur.
+            cancel_timeout (float): Délai laissé au pipeline pour s'arrêter
+                proprement après une annulation, avant l'arrêt forcé du processus.
+            max_history (int): Nombre de reconstructions terminées conservées.
+        """
+        self.index_path = index_path
+        self.on_ready = on_ready
+        self.target = target
+        self.cancel_timeout = cancel_timeout
+        self.max_history = max_history
+        self._context = multiprocessing.get_context(mp_context)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, **pipeline_kwargs) -> dict:
+        """
+        Lance une reconstruction (arguments transmis à `run_indexing_pipeline`).
+
+        Raises:
+            JobConflictError: Si une reconstruction est déjà en cours.
+        """
+        pipeline_kwargs.setdefault("index_path", self.index_path)
+        with self._lock:
+            active = self._active_job()
+            if active is not None:
+                raise JobConflictError(f"Une reconstruction est déjà en cours (job {active.id}).")
+
+            job = RebuildJob(uuid.uuid4().hex)
+            job._events = self._context.Queue()
+            job._cancel_event = self._context.Event()
+            # Pas de processus "daemon" : le pipeline peut lui-même lancer des processus (n_workers)
+            job._process = self._context.Process(
+                target=_rebuild_worker,
+                args=(job._events, job._cancel_event, self.target, pipeline_kwargs),
+                name=f"rebuild-{job.id}"
+            )
+            job._process.start()
+            self._jobs[job.id] = job
+            self._prune_history()
+
+        threading.Thread(target=self._monitor, args=(job,), name=f"rebuild-monitor-{job.id}", daemon=True).start()
+        logger.info("Reconstruction de l'index lancée dans un processus séparé (job %s).", job.id)
+        return self.get(job.id)
+
+    def get(self, job_id: str) -> dict | None:
+        """État d'une reconstruction, ou None si le job est inconnu."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else job.to_dict()
+
+    def active(self) -> dict | None:
+        """État de la reconstruction en cours, s'il y en a une."""
+        with self._lock:
+            job = self._active_job()
+            return None if job is None else job.to_dict()
+
+    def cancel(self, job_id: str) -> dict | None:
+        """
+        Demande l'annulation d'une reconstruction. Le pipeline s'arrête au
+        prochain point d'avancement ; au-delà de `cancel_timeout` secondes, le
+        processus est arrêté de force. Sans effet sur un job déjà terminé.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "running":
+                job.status = "cancelling"
+                job._cancel_event.set()
+                threading.Thread(target=self._terminate_after_timeout, args=(job,), daemon=True).start()
+            return job.to_dict()
+
+    def _active_job(self) -> RebuildJob | None:
+        return next((job for job in self._jobs.values() if job.status in ACTIVE_STATUSES), None)
+
+    def _prune_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def _terminate_after_timeout(self, job: RebuildJob) -> None:
+        job._process.join(self.cancel_timeout)
+        if job._process.is_alive():
+            logger.warning("Le job %s ne s'est pas arrêté à temps : arrêt forcé du processus.", job.id)
+            job._process.terminate()
+            job._process.join()
+            # Le pipeline n'a pas pu abandonner lui-même la version en construction
+            IndexRegistry(self.index_path).clear_staging()
+
+    def _monitor(self, job: RebuildJob) -> None:
+        """Suit les messages du processus de reconstruction jusqu'à sa fin."""
+        final_status, error = None, None
+        exited = False
+        while final_status is None:
+            try:
+                # Une fois le processus arrêté, on vide la file : son dernier message a pu
+                # arriver juste après l'attente précédente
+                message = job._events.get_nowait() if exited else job._events.get(timeout=0.2)
+            except queue.Empty:
+                if exited:
+                    break
+                exited = not job._process.is_alive()
+                continue
+            if message[0] == "progress":
+                with self._lock:
+                    job.update_progress(*message[1:])
+            elif message[0] == "metric":
+                # Durées des étapes et erreurs du pipeline, mesurées dans le processus de reconstruction
+                REGISTRY.apply(*message[1:])
+            else:
+                final_status, error = message[1], message[2]
+
+        job._process.join()
+        if final_status is None:
+            # Processus arrêté sans rendre compte (arrêt forcé, plantage)
+            final_status = "cancelled" if job._cancel_event.is_set() else "failed"
+            if final_status == "failed":
+                error = f"Le processus de reconstruction s'est arrêté (code {job._process.exitcode})."
+
+        reloaded = None
+        if final_status == "succeeded" and self.on_ready is not None:
+            try:
+                reloaded = self.on_ready() is not False
+            except Exception as e:
+                logger.error("Erreur lors de la mise en service du nouvel index : %s", e)
+                reloaded = False
+
+        REBUILDS.inc(status=final_status)
+        with self._lock:
+            job.status = final_status
+            job.error = error
+            job.reloaded = reloaded
+            job.finished_at = time.time()
+        logger.info("Reconstruction %s terminée : %s.", job.id, final_status)
@@ -0,0 +1,327 @@
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+import faiss
+import numpy as np
+
+METADATA_INDEX_FILE = "metadata_index.npz"
+
+# Départements d'Occitanie, reconnus par leur nom dans les questions
+DEPARTMENTS = {
+    "Ariège": "09", "Aude": "11", "Aveyron": "12", "Gard": "30", "Haute-Garonne": "31",
+    "Gers": "32", "Hérault": "34", "Lot": "46", "Lozère": "48", "Hautes-Pyrénées": "65",
+    "Pyrénées-Orientales": "66", "Tarn": "81", "Tarn-et-Garonne": "82",
+}
+
+MONTHS = {
+    "janvier": 1, "fevrier": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6, "juillet": 7,
+    "aout": 8, "septembre": 9, "octobre": 10, "novembre": 11, "decembre": 12,
+}
+
+
+def normalize_name(name: str) -> str:
+    """Forme canonique d'un nom de lieu : minuscules, sans accents, tirets et apostrophes remplacés par des espaces."""
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[-'’]", " ", text).lower().split())
+
+
+def department_of(postal_code) -> str | None:
+    """Code du département d'un code postal (deux premiers chiffres)."""
+    if postal_code is None or (isinstance(postal_code, float) and np.isnan(postal_code)):
+        return None
+    digits = re.sub(r"\D", "", str(postal_code))
+    return digits[:2] if len(digits) >= 4 else None
+
+
+def event_key(metadata: dict, position: int):
+    """Identifiant de l'événement d'un chunk : 'id', sinon le préfixe du `chunk_id` ("<id>_<i>")."""
+    event_id = metadata.get("id")
+    if event_id is not None and not (isinstance(event_id, float) and np.isnan(event_id)):
+        return str(event_id)
+    chunk_id = metadata.get("chunk_id")
+    if isinstance(chunk_id, str) and "_" in chunk_id:
+        return chunk_id.rsplit("_", 1)[0]
+    # Sans identifiant, chaque chunk est considéré comme un événement à part
+    return ("position", position)
+
+
+def to_day(value) -> np.datetime64:
+    """Jour d'une date de métadonnée ("2025-01-05T20:00:00+00:00"), ou NaT."""
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return np.datetime64(value[:10], "D")
+        except ValueError:
+            pass
+    return np.datetime64("NaT", "D")
+
+
+@dataclass
+class SearchFilters:
+    """
+    Critères de pré-filtrage d'une recherche ; un critère à None n'est pas appliqué.
+    `guessed` : noms des critères déduits de la question (voir `extract_filters`)
+    plutôt que donnés explicitement, qui peuvent être relâchés (voir `relaxed`).
+    """
+    city: str | None = None
+    department: str | None = None
+    date_from: date | None = None
+    date_to: date | None = None
+    guessed: tuple = field(default=(), compare=False, repr=False)
+
+    def is_empty(self) -> bool:
+        return self.city is None and self.department is None and self.date_from is None and self.date_to is None
+
+    def relaxed(self) -> list:
+        """
+        Filtres de repli, du plus au moins strict, quand ceux-ci ne retiennent
+        aucun chunk : sans la période déduite de la question, puis sans aucun
+        critère déduit. Les critères explicites sont toujours gardés.
+        """
+        period = [name for name in self.guessed if name in ("date_from", "date_to")]
+        fallbacks = []
+        if period and len(period) < len(self.guessed):
+            others = tuple(name for name in self.guessed if name not in period)
+            fallbacks.append(replace(self, **dict.fromkeys(period), guessed=others))
+        if self.guessed:
+            fallbacks.append(replace(self, **dict.fromkeys(self.guessed), guessed=()))
+        return fallbacks
+
+
+class MetadataIndex:
+    """
+    Index secondaires sur les métadonnées des chunks, par position dans l'index FAISS :
+
+      - dates de début et de fin, avec les positions triées par date
+        (`searchsorted` donne en O(log n) les chunks d'une période) ;
+      - une bitmap par ville et par département (un bit par chunk) ;
+      - le code de l'événement de chaque chunk (`events`), pour regrouper
+        les chunks d'un même événement dans les résultats.
+
+    `selector` combine ces index en un `faiss.IDSelector`, appliqué pendant
+    la recherche FAISS : les k résultats respectent tous les filtres, au lieu
+    d'être filtrés après coup.
+    """
+
+    def __init__(self, starts, ends, cities: dict, departments: dict, events=None):
+        """
+        Args:
+            starts, ends: Dates de début et de fin de chaque chunk (datetime64[D], NaT si inconnue).
+            cities, departments: Nom normalisé (ou code) -> bitmap des chunks (`np.packbits`, ordre "little").
+            events: Code de l'événement de chaque chunk ; par défaut, chaque chunk est son propre événement.
+        """
+        self.starts = np.asarray(starts, dtype="datetime64[D]")
+        self.ends = np.asarray(ends, dtype="datetime64[D]")
+        self.cities = cities
+        self.departments = departments
+        self.events = np.arange(len(self.starts), dtype=np.int32) if events is None else np.asarray(events, dtype=np.int32)
+        # Les NaT sont triés en fin de tableau par numpy : on les exclut des tableaux triés
+        self._start_order = np.argsort(self.starts, kind="stable")
+        self._start_order = self._start_order[~np.isnat(self.starts[self._start_order])]
+        self._sorted_starts = self.starts[self._start_order]
+        self._end_order = np.argsort(self.ends, kind="stable")
+        self._end_order = self._end_order[~np.isnat(self.ends[self._end_order])]
+        self._sorted_ends = self.ends[self._end_order]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @classmethod
+    def from_metadatas(cls, metadatas) -> "MetadataIndex":
+        """Construit les index à partir des métadonnées des chunks, dans l'ordre de leurs positions."""
+        starts, ends, city_positions, department_positions = [], [], {}, {}
+        events, event_codes = [], {}
+        for position, metadata in enumerate(metadatas):
+            events.append(event_codes.setdefault(event_key(metadata, position), len(event_codes)))
+            start = to_day(metadata.get("date_debut"))
+            end = to_day(metadata.get("date_fin"))
+            starts.append(start)
+            # Un événement sans date de fin dure une journée
+            ends.append(start if np.isnat(end) else end)
+            city = metadata.get("ville")
+            if isinstance(city, str) and city.strip():
+                city_positions.setdefault(normalize_name(city), []).append(position)
+            department = department_of(metadata.get("code_postal"))
+            if department is not None:
+                department_positions.setdefault(department, []).append(position)
+
+        n = len(starts)
+        return cls(
+            np.array(starts, dtype="datetime64[D]"),
+            np.array(ends, dtype="datetime64[D]"),
+            {name: cls._bitmap(positions, n) for name, positions in city_positions.items()},
+            {code: cls._bitmap(positions, n) for code, positions in department_positions.items()},
+            np.array(events, dtype=np.int32),
+        )
+
+    @staticmethod
+    def _bitmap(positions, n: int) -> np.ndarray:
+        mask = np.zeros(n, dtype=bool)
+        mask[positions] = True
+        return np.packbits(mask, bitorder="little")
+
+    def _unpack(self, bitmap: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bitmap, count=len(self), bitorder="little").astype(bool)
+
+    # --- Persistance ---
+
+    def save(self, index_path: str) -> None:
+        """Écrit les index à côté de l'index FAISS (écriture atomique)."""
+        path = os.path.join(index_path, METADATA_INDEX_FILE)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(
+                f,
+                starts=self.starts,
+                ends=self.ends,
+                city_names=np.array(list(self.cities), dtype=str),
+                city_bitmaps=self._stack(self.cities.values()),
+                department_codes=np.array(list(self.departments), dtype=str),
+                department_bitmaps=self._stack(self.departments.values()),
+                events=self.events,
+            )
+        os.replace(f"{path}.tmp", path)
+
+    def _stack(self, bitmaps) -> np.ndarray:
+        bitmaps = list(bitmaps)
+        return np.vstack(bitmaps) if bitmaps else np.empty((0, (len(self) + 7) // 8), dtype=np.uint8)
+
+    @classmethod
+    def load(cls, index_path: str) -> "MetadataIndex | None":
+        """Charge les index d'un dossier, ou None s'ils n'existent pas ou datent d'une version sans `events`."""
+        path = os.path.join(index_path, METADATA_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if "events" not in data.files:
+                return None
+            return cls(
+                data["starts"],
+                data["ends"],
+                dict(zip(data["city_names"].tolist(), data["city_bitmaps"])),
+                dict(zip(data["department_codes"].tolist(), data["department_bitmaps"])),
+                data["events"],
+            )
+
+    # --- Filtrage ---
+
+    def known_city(self, name: str) -> bool:
+        return normalize_name(name) in self.cities
+
+    def mask(self, filters: SearchFilters) -> np.ndarray | None:
+        """Masque booléen des positions qui respectent `filters`, ou None s'il n'y a aucun filtre."""
+        if filters is None or filters.is_empty():
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        if filters.city is not None:
+            bitmap = self.cities.get(normalize_name(filters.city))
+            mask &= self._unpack(bitmap) if bitmap is not None else False
+        if filters.department is not None:
+            bitmap = self.departments.get(self._department_code(filters.department))
+            mask &= self._unpack(bitmap) if bitmap is not None else False
+        if filters.date_to is not None:
+            # Événements commencés au plus tard à la fin de la période
+            count = np.searchsorted(self._sorted_starts, np.datetime64(filters.date_to, "D"), side="right")
+            in_range = np.zeros(len(self), dtype=bool)
+            in_range[self._start_order[:count]] = True
+            mask &= in_range
+        if filters.date_from is not None:
+            # ... et pas encore terminés au début de la période
+            first = np.searchsorted(self._sorted_ends, np.datetime64(filters.date_from, "D"), side="left")
+            in_range = np.zeros(len(self), dtype=bool)
+            in_range[self._end_order[first:]] = True
+            mask &= in_range
+        return mask
+
+    @staticmethod
+    def _department_code(department: str) -> str:
+        department = str(department).strip()
+        if department.isdigit():
+            return department.zfill(2)
+        by_name = {normalize_name(name): code for name, code in DEPARTMENTS.items()}
+        return by_name.get(normalize_name(department), department)
+
+    def selector(self, filters: SearchFilters):
+        """
+        `faiss.IDSelectorBitmap` des positions qui respectent `filters`, et sa
+        bitmap (à garder en vie pendant la recherche). (None, None) sans filtre.
+        """
+        mask = self.mask(filters)
+        if mask is None:
+            return None, None
+        return selector_from_mask(mask)
+
+    # --- Extraction des filtres depuis la question ---
+
+    def extract_filters(self, question: str, today: date | None = None) -> SearchFilters:
+        """
+        Déduit les filtres exprimés dans une question : une ville présente
+        dans l'index, un département d'Occitanie cité par son nom, une période
+        ("aujourd'hui", "demain", "ce week-end", "cette semaine", "en décembre"...).
+        Ces critères sont marqués comme déduits (`SearchFilters.guessed`).
+        """
+        today = today or date.today()
+        normalized = f" {normalize_name(question)} "
+        city = None
+        # La ville la plus longue l'emporte ("saint jean de vedas" plutôt que "saint jean")
+        for name in sorted(self.cities, key=len, reverse=True):
+            if f" {name} " in normalized:
+                city = name
+                break
+        department = None
+        if city is None:
+            plain_question = unicodedata.normalize("NFKD", question).encode("ascii", "ignore").decode("ascii")
+            for name in sorted(DEPARTMENTS, key=len, reverse=True):
+                plain_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+                # Sensible à la casse : "Lot" est le département, "un lot" ne l'est pas
+                if re.search(rf"(?<![\w-]){re.escape(plain_name)}(?![\w-])", plain_question):
+                    department = DEPARTMENTS[name]
+                    break
+        date_from, date_to = extract_period(normalized, today)
+        criteria = {"city": city, "department": department, "date_from": date_from, "date_to": date_to}
+        return SearchFilters(**criteria, guessed=tuple(name for name, value in criteria.items() if value is not None))
+
+
+def extract_period(normalized_question: str, today: date) -> tuple:
+    """Période exprimée dans une question normalisée (voir `normalize_name`), ou (None, None)."""
+    text = f" {normalized_question.strip()} "
+    if " aujourd hui " in text or " ce soir " in text:
+        return today, today
+    if " demain " in text and " apres demain " not in text:
+        return today + timedelta(days=1), today + timedelta(days=1)
+    if " week end " in text:
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if today.weekday() == 6:  # le dimanche, "ce week-end" est celui en cours
+            saturday = today - timedelta(days=1)
+        return max(saturday, today), saturday + timedelta(days=1)
+    if " cette semaine " in text:
+        return today, today + timedelta(days=6 - today.weekday())
+    if " ce mois ci " in text:
+        return today, _month_end(today.year, today.month)
+    match = re.search(r" (?:en |au mois de |mois de )?(" + "|".join(MONTHS) + r")(?: (\d{4}))? ", text)
+    if match:
+        month = MONTHS[match.group(1)]
+        year = int(match.group(2)) if match.group(2) else today.year + (month < today.month)
+        return date(year, month, 1), _month_end(year, month)
+    return None, None
+
+
+def _month_end(year: int, month: int) -> date:
+    next_month = date(year + (month == 12), month % 12 + 1, 1)
+    return next_month - timedelta(days=1)
+
+
+def selector_from_mask(mask: np.ndarray):
+    """`faiss.IDSelectorBitmap` des positions d'un masque booléen, et sa bitmap (à garder en vie)."""
+    bitmap = np.packbits(mask, bitorder="little")
+    return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap)), bitmap
+
+
+def search_params(index, selector):
+    """Paramètres de recherche FAISS qui appliquent `selector`, en conservant nprobe / efSearch de l'index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
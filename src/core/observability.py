@@ -0,0 +1,295 @@
+"""
+Observabilité : journalisation, durées des étapes et métriques de l'application.
+
+Les métriques (compteurs, jauges, histogrammes) sont tenues en mémoire par
+`REGISTRY` et exposées au format texte de Prometheus (`render_metrics`,
+servi par `GET /metrics`). L'implémentation est volontairement minimale et
+sans dépendance : une mise à jour coûte un verrou et quelques opérations.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s : %(message)s"
+
+# Bornes (en secondes) des histogrammes de durée : de la recherche FAISS à la reconstruction de l'index
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+
+def configure_logging(level: str | None = None) -> None:
+    """
+    Configure la journalisation des points d'entrée (API, scripts) : niveau
+    `level`, ou variable LOG_LEVEL (INFO par défaut). Les messages émis pour
+    chaque question sont au niveau DEBUG.
+    """
+    logging.basicConfig(level=(level or os.getenv("LOG_LEVEL") or "INFO").upper(), format=LOG_FORMAT)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """Base des métriques : une valeur (ou un état) par combinaison de valeurs des `labelnames`."""
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # valeurs des labels (tuple) -> état
+        self._lock = threading.Lock()
+        self._forward = None
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"La métrique {self.name} attend les labels {self.labelnames}, reçu {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _forwarded(self, method: str, value: float, labels: dict) -> None:
+        if self._forward is not None:
+            self._forward(self.name, method, value, labels)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """(suffixe du nom, labels, valeur) de chaque série, pour `render`."""
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield "", dict(zip(self.labelnames, key)), value
+
+
+class Counter(Metric):
+    """Compteur croissant (requêtes, erreurs, tokens...)."""
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._forwarded("inc", amount, labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    """Valeur instantanée (taille de l'index...)."""
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+        self._forwarded("set", value, labels)
+
+
+class Histogram(Metric):
+    """Distribution de durées, par intervalles cumulés (`le`), avec leur somme et leur nombre."""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+        self._forwarded("observe", value, labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return 0 if state is None else state[2]
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulated = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulated += n
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulated
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+
+class MetricsRegistry:
+    """Ensemble des métriques d'un processus, rendues ensemble au format texte de Prometheus."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._forward = None
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"La métrique {metric.name} existe déjà.")
+        metric._forward = self._forward
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def forward(self, callback) -> None:
+        """
+        Transmet chaque mise à jour à `callback(nom, méthode, valeur, labels)`,
+        en plus de l'appliquer localement. Sert au processus de reconstruction
+        (voir `RebuildJobManager`) à remonter ses métriques au processus de
+        l'API, qui les rejoue avec `apply`.
+        """
+        self._forward = callback
+        for metric in self._metrics.values():
+            metric._forward = callback
+
+    def apply(self, name: str, method: str, value: float, labels: dict) -> None:
+        """Rejoue une mise à jour transmise par `forward` (métrique inconnue : ignorée)."""
+        metric = self._metrics.get(name)
+        if metric is not None:
+            getattr(metric, method)(value, **labels)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds", "Durée des étapes de réponse à une question (embed_query, search, rerank, build_context, generate).", ("stage",)
+)
+PIPELINE_STAGE_SECONDS = REGISTRY.histogram(
+    "rag_pipeline_stage_seconds", "Durée des étapes du pipeline d'indexation (fetch, clean, dedup, chunk, embed, index, publish).", ("stage",)
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "rag_http_request_seconds", "Durée des requêtes HTTP, jusqu'à l'envoi des en-têtes de la réponse.", ("method", "route", "status")
+)
+ERRORS = REGISTRY.counter("rag_errors_total", "Erreurs par étape.", ("stage",))
+ANSWER_CACHE_LOOKUPS = REGISTRY.counter(
+    "rag_answer_cache_lookups_total", "Consultations du cache de réponses (exact_hit, semantic_hit, miss).", ("result",)
+)
+QUERY_EMBEDDING_CACHE_LOOKUPS = REGISTRY.counter(
+    "rag_query_embedding_cache_lookups_total", "Consultations du cache d'embeddings des questions (hit, miss).", ("result",)
+)
+LLM_TOKENS = REGISTRY.counter("rag_llm_tokens_total", "Tokens consommés par le LLM (prompt, completion).", ("type",))
+INDEX_CHUNKS = REGISTRY.gauge("rag_index_chunks", "Nombre de chunks de l'index en service.")
+INDEX_VERSION = REGISTRY.gauge("rag_index_version_info", "Version de l'index en service (valeur 1).", ("version",))
+INDEX_LOADS = REGISTRY.counter("rag_index_loads_total", "Chargements de l'index (success, failure).", ("result",))
+REBUILDS = REGISTRY.counter("rag_rebuilds_total", "Reconstructions de l'index terminées, par statut.", ("status",))
+
+
+def render_metrics() -> str:
+    """Toutes les métriques du processus, au format texte de Prometheus."""
+    return REGISTRY.render()
+
+
+@contextmanager
+def span(stage: str, histogram: Histogram = STAGE_SECONDS, level: int = logging.DEBUG):
+    """
+    Mesure la durée d'une étape : observée dans `histogram` (label `stage`)
+    et journalisée au niveau `level`. Une exception levée dans l'étape est
+    comptée dans `rag_errors_total`, puis propagée.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        histogram.observe(seconds, stage=stage)
+        if logger.isEnabledFor(level):
+            logger.log(level, "Étape %s : %.1f ms", stage, seconds * 1e3)
+
+
+def pipeline_span(stage: str):
+    """`span` d'une étape du pipeline d'indexation, journalisée au niveau INFO."""
+    return span(stage, PIPELINE_STAGE_SECONDS, logging.INFO)
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Callback LangChain à attacher au modèle de chat : durée des appels au
+    LLM (étape "generate"), tokens consommés et erreurs.
+    """
+    # Exécuté dans le fil de l'appel, sans passer par un thread pour les chaînes asynchrones
+    run_inline = True
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage="generate")
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, type="prompt")
+        if completion_tokens:
+            LLM_TOKENS.inc(completion_tokens, type="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        ERRORS.inc(stage="generate")
+
+
+def _token_usage(response) -> tuple:
+    """(tokens du prompt, tokens de la réponse) d'un `LLMResult`, d'après l'API Mistral ou les métadonnées d'usage."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += metadata.get("input_tokens", 0)
+            completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
@@ -1,36 +1,390 @@
-from .data_loader import fetch_events
-from .processing import list_to_df, clean_df, filter_and_dedup, create_chunks_with_metadata
-from .embedding import get_embedding_model, get_embed_texts
-from .faiss_manager import create_faiss_index_from_vectors
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from .data_loader import fetch_events, iter_event_pages, window_start, window_end, FetchError
+from .processing import list_to_df, clean_df_parallel, filter_and_dedup, event_fingerprints, create_chunks_parallel, stream_chunks
+from .embedding import get_embedding_model, get_embed_texts, failed_positions
+from .embedding_cache import EmbeddingCache, get_embed_texts_cached
+from .faiss_manager import (
+    create_faiss_index_from_vectors, add_vectors_to_index, save_faiss_index, load_faiss_index,
+    delete_chunks, build_manifest, save_manifest, load_manifest, training_size, DEFAULT_INDEX_FACTORY
+)
+from .index_registry import IndexRegistry
+from .observability import pipeline_span
 
-def run_indexing_pipeline(region: str = "Occitanie"):
-    """Exécute le pipeline complet de création de l'index FAISS."""
+logger = logging.getLogger(__name__)
 
-    print("--- Lancement du pipeline d'indexation ---")
+def _no_progress(stage, done, total=None):
+    pass
+
+
+def run_indexing_pipeline(
+        region: str = "Occitanie",
+        index_path: str = "data/faiss_index",
+        streaming: bool = False,
+        batch_size: int = 1000,
+        concurrent_fetch: bool = False,
+        n_workers: int = 1,
+        embedding_scheduler=None,
+        cache_dir: str | None = "data/embedding_cache",
+        incremental: bool = False,
+        allow_partial: bool = False,
+        index_factory: str = DEFAULT_INDEX_FACTORY,
+        progress=None
+    ):
+    """
+    Exécute le pipeline complet de création de l'index FAISS.
+
+    Args:
+        region (str): La région dont on indexe les événements.
+        index_path (str): Dossier racine de l'index. Chaque exécution construit
+            une nouvelle version à part (voir `IndexRegistry`), publiée
+            seulement en cas de succès : l'index servi n'est jamais à moitié écrit.
+        streaming (bool): Si True, les pages sont traitées par lots de
+            `batch_size` événements dès leur téléchargement, et l'index se
+            construit au fur et à mesure (mémoire stable).
+        concurrent_fetch (bool): Si True, les pages sont téléchargées en parallèle.
+        n_workers (int): Nombre de processus pour le nettoyage et le découpage
+            en chunks (mode non-streaming). 1 = traitement en série.
+        embedding_scheduler (EmbeddingScheduler | None): Planificateur qui
+            envoie les lots d'embeddings en parallèle selon un débit configuré.
+        cache_dir (str | None): Dossier du cache d'embeddings : seuls les chunks
+            absents du cache sont envoyés au modèle. None désactive le cache.
+        incremental (bool): Si True, met à jour l'index existant au lieu de le
+            reconstruire : seuls les événements modifiés depuis la dernière
+            exécution (voir le manifeste) sont récupérés et ré-indexés.
+        allow_partial (bool): Si True, les chunks dont l'embedding a échoué
+            sont écartés et l'index est construit avec les autres ; la liste
+            des chunks manquants est écrite dans `missing_embeddings.json` et
+            le high-water mark du manifeste est ramené avant leurs événements,
+            que la prochaine mise à jour incrémentale réessaiera.
+            Sinon, le moindre échec interrompt le pipeline.
+        index_factory (str): Type d'index FAISS à construire ("Flat",
+            "IVF1024,Flat", "HNSW32", "IVF1024,PQ64"... voir `build_faiss_index`).
+            Une mise à jour incrémentale conserve le type de l'index existant.
+        progress (callable | None): Appelé à chaque avancée avec
+            `(étape, éléments traités, total ou None)`, l'étape étant "fetch",
+            "prepare", "embed", "index" ou "publish" (voir `RebuildJobManager`).
+            Une exception levée par `progress` interrompt le pipeline sans
+            publier de nouvelle version.
+
+    La durée de chaque étape ("fetch", "clean", "dedup", "chunk", "embed",
+    "index", "publish") est mesurée par `pipeline_span` (métrique
+    `rag_pipeline_stage_seconds`) et journalisée.
+    """
+
+    logger.info("--- Lancement du pipeline d'indexation ---")
 
     # 1. Initialiser le modèle
     embedding_model = get_embedding_model()
 
+    # Cache disque : un chunk déjà vu (même modèle, même texte) n'est pas ré-embeddé
+    cache = EmbeddingCache(cache_dir, model_name=getattr(embedding_model, "model", "mistral-embed")) if cache_dir else None
+
+    missing_chunk_ids = []
+    # Dates de mise à jour des événements dont un chunk n'a pas pu être embeddé
+    missing_updates = []
+    report = progress or _no_progress
+    embedded = {"done": 0, "total": 0}
+
+    def embed(chunks, metadatas):
+        """Embedde les chunks et écarte ceux en échec (si `allow_partial`), ou retourne None."""
+        embedded["total"] += len(chunks)
+
+        def on_batch(n_texts):
+            embedded["done"] += n_texts
+            report("embed", embedded["done"], embedded["total"])
+
+        with pipeline_span("embed"):
+            if cache is None:
+                vectors = get_embed_texts(chunks, embedding_model, scheduler=embedding_scheduler, progress=on_batch)
+            else:
+                vectors = get_embed_texts_cached(chunks, embedding_model, cache, scheduler=embedding_scheduler, progress=on_batch)
+
+        failed = set(failed_positions(vectors))
+        if not failed:
+            return chunks, vectors, metadatas
+        if not allow_partial:
+            logger.error("%d chunks sur %d n'ont pas pu être embeddés.", len(failed), len(chunks))
+            return None
+        missing_chunk_ids.extend(metadatas[i].get('chunk_id', i) for i in sorted(failed))
+        missing_updates.extend(
+            metadatas[i]['date_mise_a_jour'] for i in failed if isinstance(metadatas[i].get('date_mise_a_jour'), str)
+        )
+        keep = [i for i in range(len(chunks)) if i not in failed]
+        return [chunks[i] for i in keep], [vectors[i] for i in keep], [metadatas[i] for i in keep]
+
+    registry = IndexRegistry(index_path)
+    staging_path = registry.create_staging()
+    success = False
+    try:
+        if incremental:
+            success = _run_incremental_pipeline(region, index_path, staging_path, concurrent_fetch, n_workers, embedding_model, embed, index_factory, report)
+        elif streaming:
+            success = _run_streaming_pipeline(region, staging_path, batch_size, concurrent_fetch, embedding_model, embed, index_factory, report)
+        else:
+            success = _run_batch_pipeline(region, staging_path, concurrent_fetch, n_workers, embedding_model, embed, index_factory, report)
+        if success:
+            _report_missing_embeddings(missing_chunk_ids, staging_path)
+            _hold_back_high_water_mark(missing_updates, staging_path)
+            report("publish", 0, 1)
+            with pipeline_span("publish"):
+                version = registry.publish(staging_path)
+            report("publish", 1, 1)
+            logger.info("-> Version %s de l'index publiée.", version)
+    finally:
+        if not success:
+            registry.discard(staging_path)
+        # Même en cas d'échec, les vecteurs déjà payés restent acquis pour la prochaine fois
+        if cache is not None:
+            cache.save()
+
+    return success
+
+
+def _report_missing_embeddings(missing_chunk_ids: list, index_path: str):
+    """Signale les chunks absents de l'index faute d'embedding et en garde la liste à côté de l'index."""
+    if not missing_chunk_ids:
+        return
+    report_path = os.path.join(index_path, "missing_embeddings.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"missing_chunk_ids": missing_chunk_ids}, f, ensure_ascii=False, indent=2)
+    logger.warning("Attention : %d chunks n'ont pas été indexés faute d'embedding (voir %s).", len(missing_chunk_ids), report_path)
+
+
+def _hold_back_high_water_mark(missing_updates: list, index_path: str):
+    """
+    Ramène le high-water mark du manifeste juste avant la plus ancienne mise
+    à jour des événements incomplets : la prochaine mise à jour incrémentale
+    les récupère de nouveau, remplace leurs chunks et réessaie leurs embeddings.
+    """
+    manifest = load_manifest(index_path) if missing_updates else None
+    if manifest is None:
+        return
+    retry_from = (datetime.fromisoformat(min(missing_updates)) - timedelta(seconds=1)).isoformat()
+    if manifest['high_water_mark'] is None or retry_from < manifest['high_water_mark']:
+        manifest['high_water_mark'] = retry_from
+        save_manifest(manifest, index_path)
+
+
+def _event_chunk_ids(event_id: str, event: dict) -> list:
+    """Chunks d'un événement du manifeste (les anciens manifestes n'en donnent que le nombre)."""
+    if 'chunk_ids' in event:
+        return event['chunk_ids']
+    return [f"{event_id}_{i}" for i in range(event['chunks'])]
+
+
+def _prepare(df, n_workers, seen_fingerprints=None):
+    """
+    Nettoyage, dédoublonnage et découpage en chunks, chaque étape étant mesurée.
+    Renvoie aussi l'empreinte du texte des événements gardés (pour le manifeste).
+    """
+    with pipeline_span("clean"):
+        df_cleaned = clean_df_parallel(df, n_workers)
+    with pipeline_span("dedup"):
+        df_final = filter_and_dedup(df_cleaned, seen_fingerprints=seen_fingerprints)
+    with pipeline_span("chunk"):
+        chunks, metadatas = create_chunks_parallel(df_final, n_workers)
+    return chunks, metadatas, event_fingerprints(df_final)
+
+
+def _run_batch_pipeline(region, index_path, concurrent_fetch, n_workers, embedding_model, embed, index_factory=DEFAULT_INDEX_FACTORY, report=_no_progress):
+    """Variante par défaut : toutes les étapes s'enchaînent sur le jeu de données complet."""
     # 2. Récupérer et préparer les données
-    list_events = fetch_events(region=region)
+    report("fetch", 0)
+    fetched_until = window_end()
+    try:
+        with pipeline_span("fetch"):
+            list_events = fetch_events(region=region, concurrent=concurrent_fetch, strict=True)
+    except FetchError as e:
+        logger.error("Erreur lors de la récupération des événements : %s", e)
+        return False
     if not list_events:
-        print("Aucun événement récupéré. Arrêt du pipeline.")
+        logger.warning("Aucun événement récupéré. Arrêt du pipeline.")
         return False
 
-    print(f"-> {len(list_events)} événements récupérés.")
+    logger.info("-> %d événements récupérés.", len(list_events))
+    report("fetch", len(list_events), len(list_events))
+    report("prepare", 0, len(list_events))
     df = list_to_df(list_events)
-    df_cleaned = clean_df(df)
-    df_final = filter_and_dedup(df_cleaned)
-    chunks, metadatas = create_chunks_with_metadata(df_final)
+    chunks, metadatas, fingerprints = _prepare(df, n_workers)
+    report("prepare", len(list_events), len(list_events))
 
     # 3. Générer les embeddings
-    vectors = get_embed_texts(chunks, embedding_model)
+    embedded = embed(chunks, metadatas)
+    if embedded is None:
+        return False
+    chunks, vectors, metadatas = embedded
 
     # 4. Créer et sauvegarder l'index
-    if vectors and len(vectors) == len(chunks):
-        create_faiss_index_from_vectors(chunks, vectors, metadatas, embedding_model)
-        print("Pipeline d'indexation terminé avec succès.")
-        return True
-    else:
-        print("Erreur: Le nombre de vecteurs ne correspond pas aux chunks.")
-        return False
\ No newline at end of file
+    if not vectors:
+        logger.error("Aucun embedding n'a pu être généré.")
+        return False
+    report("index", 0, len(vectors))
+    with pipeline_span("index"):
+        vectorstore = create_faiss_index_from_vectors(chunks, vectors, metadatas, embedding_model, index_path, index_factory)
+        save_manifest(build_manifest(vectorstore, region, fetched_until, fingerprints), index_path)
+    report("index", len(vectors), len(vectors))
+    logger.info("Pipeline d'indexation terminé avec succès.")
+    return True
+
+
+def _run_streaming_pipeline(region, index_path, batch_size, concurrent_fetch, embedding_model, embed, index_factory=DEFAULT_INDEX_FACTORY, report=_no_progress):
+    """
+    Variante en streaming : téléchargement, nettoyage, découpage, embedding
+    et indexation s'enchaînent lot par lot. L'index commence à se construire
+    avant la fin du téléchargement et le jeu complet n'est jamais matérialisé.
+    Un index IVF / PQ n'est créé qu'une fois réunis assez de vecteurs pour
+    l'entraîner (voir `training_size`), ou à la fin du flux.
+    """
+    fetched_until = window_end()
+    pages = iter_event_pages(region, concurrent=concurrent_fetch, strict=True)
+    vectorstore = None
+    # Lots en attente de l'entraînement de l'index : chunks, vectors, metadatas
+    pending = ([], [], [])
+    to_train = None
+    total_chunks = 0
+    # Chunks déjà indexés, tenus à jour lot par lot plutôt que relus dans l'index à chaque lot
+    known_ids = set()
+    fingerprints = {}
+
+    def index_batch(chunks, vectors, metadatas):
+        nonlocal vectorstore, total_chunks
+        with pipeline_span("index"):
+            vectorstore = add_vectors_to_index(vectorstore, chunks, vectors, metadatas, embedding_model, index_factory, known_ids)
+        total_chunks += len(chunks)
+        report("index", total_chunks)
+        logger.info("-> %d chunks indexés jusqu'ici.", total_chunks)
+
+    try:
+        for chunks, metadatas in stream_chunks(pages, batch_size=batch_size, fingerprints=fingerprints):
+            embedded = embed(chunks, metadatas)
+            if embedded is None:
+                return False
+            chunks, vectors, metadatas = embedded
+            if not chunks:
+                continue
+
+            if vectorstore is None:
+                if to_train is None:
+                    to_train = training_size(index_factory, len(vectors[0]))
+                for buffer, batch in zip(pending, (chunks, vectors, metadatas)):
+                    buffer.extend(batch)
+                if len(pending[1]) < to_train:
+                    logger.info("-> %d/%d vecteurs réunis pour entraîner l'index.", len(pending[1]), to_train)
+                    continue
+                chunks, vectors, metadatas = pending
+            index_batch(chunks, vectors, metadatas)
+    except FetchError as e:
+        logger.error("Erreur lors de la récupération des événements : %s", e)
+        return False
+
+    if vectorstore is None and pending[0]:
+        # Flux terminé avant d'avoir réuni l'échantillon idéal : `build_faiss_index` adapte l'index
+        index_batch(*pending)
+
+    if vectorstore is None:
+        logger.warning("Aucun événement récupéré. Arrêt du pipeline.")
+        return False
+
+    with pipeline_span("index"):
+        save_faiss_index(vectorstore, index_path)
+        save_manifest(build_manifest(vectorstore, region, fetched_until, fingerprints), index_path)
+    logger.info("Pipeline d'indexation terminé avec succès.")
+    return True
+
+
+def _run_incremental_pipeline(region, index_path, target_path, concurrent_fetch, n_workers, embedding_model, embed, index_factory=DEFAULT_INDEX_FACTORY, report=_no_progress):
+    """
+    Mise à jour incrémentale : ne récupère que les événements modifiés depuis
+    le "high-water mark" du manifeste, ou entrés dans la fenêtre d'indexation
+    depuis la dernière exécution, supprime de l'index les anciens chunks
+    des événements modifiés ou sortis de la fenêtre d'indexation, puis ajoute
+    les nouveaux chunks. Le coût dépend du volume de changements, pas de la
+    taille totale de l'index.
+
+    L'index courant est lu depuis `index_path` et l'index mis à jour est
+    écrit dans `target_path` : la version servie n'est pas modifiée.
+    Si la récupération est interrompue, rien n'est publié : le high-water
+    mark reste celui du manifeste et les changements seront repris.
+    """
+    manifest = load_manifest(index_path)
+    if manifest is None or manifest.get('region') != region or not manifest.get('high_water_mark') or not manifest.get('window_end'):
+        logger.info("Aucun manifeste exploitable pour cet index : reconstruction complète.")
+        return _run_batch_pipeline(region, target_path, concurrent_fetch, n_workers, embedding_model, embed, index_factory, report)
+
+    vectorstore = load_faiss_index(embedding_model, index_path)
+    logger.info("-> Mise à jour incrémentale depuis le %s...", manifest['high_water_mark'])
+
+    # 1. Récupérer uniquement les événements modifiés
+    report("fetch", 0)
+    fetched_until = window_end()
+    try:
+        with pipeline_span("fetch"):
+            list_events = fetch_events(
+                region=region, concurrent=concurrent_fetch, updated_since=manifest['high_water_mark'],
+                entered_after=manifest['window_end'], strict=True
+            )
+    except FetchError as e:
+        logger.error("Erreur lors de la récupération des événements : %s", e)
+        return False
+    report("fetch", len(list_events or []), len(list_events or []))
+
+    df = list_to_df(list_events) if list_events else None
+    changed_ids = set(df['id'].astype(str)) if df is not None and 'id' in df.columns else set()
+
+    # 2. Supprimer les chunks des événements modifiés ou expirés
+    cutoff = window_start()
+    expired_ids = {
+        event_id for event_id, event in manifest['events'].items()
+        if isinstance(event.get('date_debut'), str) and event['date_debut'][:10] < cutoff
+    }
+    ids_to_remove = (changed_ids | expired_ids) & manifest['events'].keys()
+    stale_chunk_ids = [
+        chunk_id for event_id in ids_to_remove for chunk_id in _event_chunk_ids(event_id, manifest['events'][event_id])
+    ]
+    if stale_chunk_ids:
+        try:
+            delete_chunks(vectorstore, stale_chunk_ids)
+        except (ValueError, RuntimeError) as e:
+            # Index construit avant l'introduction des chunk_id comme identifiants,
+            # ou type d'index qui ne permet pas la suppression (HNSW)
+            logger.warning("Impossible de supprimer les anciens chunks (%s) : reconstruction complète.", e)
+            return _run_batch_pipeline(region, target_path, concurrent_fetch, n_workers, embedding_model, embed, index_factory, report)
+    logger.info(
+        "-> %d événements modifiés, %d expirés, %d chunks supprimés.", len(changed_ids), len(expired_ids), len(stale_chunk_ids)
+    )
+
+    # 3. Préparer, embedder et ajouter les nouveaux chunks. Le dédoublonnage part
+    #    des textes des événements restés dans l'index, comme une reconstruction complète
+    #    (les manifestes antérieurs aux empreintes n'en donnent pas)
+    fingerprints = {
+        event_id: event['fingerprint'] for event_id, event in manifest['events'].items()
+        if event_id not in ids_to_remove and 'fingerprint' in event
+    }
+    if df is not None:
+        report("prepare", 0, len(df))
+        seen_fingerprints = {bytes.fromhex(fingerprint) for fingerprint in fingerprints.values()}
+        chunks, metadatas, new_fingerprints = _prepare(df, n_workers, seen_fingerprints)
+        fingerprints.update(new_fingerprints)
+        report("prepare", len(df), len(df))
+        if chunks:
+            embedded = embed(chunks, metadatas)
+            if embedded is None:
+                return False
+            chunks, vectors, metadatas = embedded
+            if chunks:
+                with pipeline_span("index"):
+                    vectorstore = add_vectors_to_index(vectorstore, chunks, vectors, metadatas, embedding_model)
+
+    # 4. Sauvegarder l'index et le nouveau manifeste
+    new_manifest = build_manifest(vectorstore, region, fetched_until, fingerprints)
+    new_manifest['high_water_mark'] = max(filter(None, [manifest['high_water_mark'], new_manifest['high_water_mark']]))
+    report("index", 0, vectorstore.index.ntotal)
+    with pipeline_span("index"):
+        save_faiss_index(vectorstore, target_path)
+        save_manifest(new_manifest, target_path)
+    report("index", vectorstore.index.ntotal, vectorstore.index.ntotal)
+    logger.info("Mise à jour incrémentale terminée avec succès.")
+    return True
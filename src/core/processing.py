@@ -1,8 +1,37 @@
+import logging
 import re
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
 import pandas as pd
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from bs4 import BeautifulSoup
 
+logger = logging.getLogger(__name__)
+
+# Un texte sans '<' ni '&' ne contient ni balise ni entité : inutile de le parser
+HTML_HINT_PATTERN = re.compile(r"[<&]")
+
+# Toute suite de caractères hors liste blanche (espaces compris) devient un espace unique.
+# Équivaut à remplacer les caractères interdits par " " puis à réduire les espaces (\s+ -> " ").
+NON_ALLOWED_RUN_PATTERN = re.compile(r"[^a-zA-Z0-9.,'?!àâéèêëîïôùûüçÀÂÉÈÊËÎÏÔÙÛÜÇ-]+")
+
+
+def _html_to_text(text: str) -> str:
+    return BeautifulSoup(text, "html.parser").get_text(separator=" ")
+
+
+def _strip_html(series: pd.Series) -> pd.Series:
+    """Retire le HTML, en ne passant par BeautifulSoup que pour les cellules qui en contiennent."""
+    has_markup = series.str.contains(HTML_HINT_PATTERN, regex=True)
+    if not has_markup.any():
+        return series
+    series = series.astype(object)
+    series[has_markup] = series[has_markup].map(_html_to_text)
+    return series
+
 
 def list_to_df(events: list) -> pd.DataFrame:
     """
@@ -57,7 +86,7 @@ def list_to_df(events: list) -> pd.DataFrame:
         'conditions_fr':'conditions'
     })
 
-    print("-> Conversion en DataFrame terminée.")
+    logger.debug("-> Conversion en DataFrame terminée.")
     return df
 
 def clean_df(df: pd.DataFrame) -> pd.DataFrame:
@@ -65,7 +94,7 @@ def clean_df(df: pd.DataFrame) -> pd.DataFrame:
     Nettoie et structure les données des événements avec Pandas.
     Conserve les métadonnées et crée une colonne 'texte_complet' pour les embeddings.
     """
-    print("-> Début du nettoyage et de la structuration des données...")
+    logger.debug("-> Début du nettoyage et de la structuration des données...")
     
     # Utiliser .copy() au début pour éviter les avertissements de Pandas
     df_cleaned = df.copy()
@@ -87,12 +116,13 @@ def clean_df(df: pd.DataFrame) -> pd.DataFrame:
     for col in existing_text_columns:
         # S'assurer que tout est en chaîne de caractères et sans valeur nulle
         series = df_cleaned[col].fillna('').astype(str)
-        
+
         # Appliquer les nettoyages en séquence
-        series = series.apply(lambda x: BeautifulSoup(x, "html.parser").get_text(separator=" "))
-        series = series.apply(lambda x: re.sub(r"[^a-zA-Z0-9\s.,'?!àâéèêëîïôùûüçÀÂÉÈÊËÎÏÔÙÛÜÇ-]", " ", x))
-        series = series.apply(lambda x: re.sub(r'\s+', ' ', x).strip())
-        
+        series = _strip_html(series)
+        # Un seul passage remplace à la fois les caractères interdits et les
+        # suites d'espaces par un espace unique (motif précompilé => moteur `re`)
+        series = series.str.replace(NON_ALLOWED_RUN_PATTERN, ' ', regex=True).str.strip()
+
         df_cleaned[col] = series
 
     # Définir les colonnes à utiliser pour le texte sémantique
@@ -100,45 +130,138 @@ def clean_df(df: pd.DataFrame) -> pd.DataFrame:
     existing_cols_to_join = [col for col in cols_to_join if col in df_cleaned.columns]
 
     # Concaténer les colonnes pertinentes, en ignorant les valeurs vides
-    df_cleaned['texte_complet'] = df_cleaned[existing_cols_to_join].apply(
-        lambda row: ' . '.join(val for val in row if val), axis=1
-    )
+    # (colonne par colonne, sans parcourir les lignes une à une)
+    texte_complet = pd.Series('', index=df_cleaned.index, dtype=object)
+    for col in existing_cols_to_join:
+        values = df_cleaned[col].astype(object)
+        separator = pd.Series(np.where((texte_complet != '') & (values != ''), ' . ', ''), index=df_cleaned.index)
+        texte_complet = texte_complet + separator + values
+    df_cleaned['texte_complet'] = texte_complet
 
     # Supprimer les lignes où le texte complet est vide après nettoyage
     df_cleaned = df_cleaned[df_cleaned['texte_complet'] != ''].reset_index(drop=True)
 
-    print("-> Nettoyage et concaténation des données terminés.")
+    logger.debug("-> Nettoyage et concaténation des données terminés.")
     return df_cleaned
 
 
-def filter_and_dedup(df: pd.DataFrame, min_chars: int = 200) -> pd.DataFrame:
-    """Supprime les textes trop courts et les doublons en se basant sur le contenu textuel."""
-    print(f"-> Filtrage et dédoublonnage... Taille initiale : {len(df)} événements.")
+def normalize_text(text: str) -> str:
+    """Version "normalisée" d'un texte pour une comparaison fiable : en minuscules, sans espaces multiples."""
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+def _digest(normalized_text: str) -> bytes:
+    return hashlib.blake2b(normalized_text.encode('utf-8'), digest_size=16).digest()
+
+
+def text_fingerprint(text: str) -> bytes:
+    """Empreinte compacte (16 octets) du texte normalisé."""
+    return _digest(normalize_text(text))
+
+
+def event_fingerprints(df: pd.DataFrame) -> dict:
+    """Empreinte (hexadécimale) du texte complet de chaque événement, par identifiant."""
+    return dict(zip(df['id'].astype(str), df['texte_complet'].map(lambda text: text_fingerprint(text).hex())))
+
+
+def filter_and_dedup(df: pd.DataFrame, min_chars: int = 200, seen_fingerprints: set | None = None) -> pd.DataFrame:
+    """
+    Supprime les textes trop courts et les doublons en se basant sur le contenu textuel.
+
+    Si `seen_fingerprints` est fourni, les textes déjà vus dans les lots
+    précédents (ou déjà indexés) sont aussi supprimés, et ceux de ce lot y
+    sont ajoutés (sous forme d'empreintes compactes de 16 octets, voir
+    `text_fingerprint`).
+    """
+    logger.debug("-> Filtrage et dédoublonnage... Taille initiale : %d événements.", len(df))
 
     # 1. Garder uniquement les lignes où 'texte_complet' a une longueur suffisante
     df_filtered = df[df['texte_complet'].str.len() >= min_chars].copy()
 
     # 2. Créer une version "normalisée" du texte pour une comparaison fiable
-    #    - tout en minuscules
-    #    - sans espaces multiples
-    def normalize_text(text: str) -> str:
-        return re.sub(r'\s+', ' ', text.lower()).strip()
-    
-    # On applique cette normalisation sur une colonne temporaire
+    #    On applique cette normalisation sur une colonne temporaire
     df_filtered['empreinte_texte'] = df_filtered['texte_complet'].apply(normalize_text)
 
     # 3. Supprimer les doublons en se basant sur l'empreinte
     #    - drop_duplicates : supprime les lignes où 'empreinte_texte' est identique
     #    - drop : supprime la colonne temporaire qui ne nous sert plus
-    df_deduplicated = df_filtered.drop_duplicates(subset='empreinte_texte').drop(columns='empreinte_texte').reset_index(drop=True)
+    df_deduplicated = df_filtered.drop_duplicates(subset='empreinte_texte')
+
+    # 4. En mode streaming ou incrémental, on écarte aussi les textes déjà vus
+    if seen_fingerprints is not None:
+        digests = df_deduplicated['empreinte_texte'].map(_digest)
+        is_new = ~digests.isin(seen_fingerprints)
+        seen_fingerprints.update(digests[is_new])
+        df_deduplicated = df_deduplicated[is_new]
 
-    print(f"-> Taille finale : {len(df_deduplicated)} événements.")
+    df_deduplicated = df_deduplicated.drop(columns='empreinte_texte').reset_index(drop=True)
+
+    logger.info("-> Filtrage et dédoublonnage : %d événements sur %d gardés.", len(df_deduplicated), len(df))
     return df_deduplicated
 
 
-def create_chunks_with_metadata(df: pd.DataFrame, chunk_size: int = 1000, chunk_overlap: int = 100):
-    """Divise les textes en chunks et associe à chacun ses métadonnées."""
-    
+# On définit explicitement les colonnes de métadonnées utiles pour le filtrage et l'affichage.
+# 'date_mise_a_jour' sert aux mises à jour incrémentales de l'index.
+USEFUL_METADATA_COLUMNS = [
+    'id', 'titre', 'date_debut', 'date_fin', 'ville',
+    'code_postal', 'adresse', 'lieu', 'mots_cles', 'url', 'date_mise_a_jour'
+]
+
+
+class ChunkTable:
+    """
+    Représentation columnar des chunks d'un ensemble d'événements.
+
+    Les métadonnées ne sont stockées qu'une fois par événement (`events`) ;
+    chaque chunk y fait référence par sa position (`event_index`) et son rang
+    dans l'événement (`chunk_number`). Les textes des chunks sont à plat dans
+    `texts`, dans le même ordre.
+    """
+
+    def __init__(self, texts: list, event_index: np.ndarray, chunk_number: np.ndarray,
+                 events: list, event_keys: list):
+        self.texts = texts
+        self.event_index = event_index
+        self.chunk_number = chunk_number
+        self.events = events
+        self.event_keys = event_keys
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def chunk_id(self, i: int) -> str:
+        return f"{self.event_keys[self.event_index[i]]}_{self.chunk_number[i]}"
+
+    def metadata(self, i: int) -> dict:
+        """Construit le dictionnaire de métadonnées du chunk `i` (format historique)."""
+        metadata = dict(self.events[self.event_index[i]])
+        metadata['chunk_id'] = self.chunk_id(i)
+        metadata['source'] = 'openagenda'
+        return metadata
+
+    def metadatas(self) -> list:
+        return [self.metadata(i) for i in range(len(self))]
+
+    def to_lists(self) -> tuple:
+        """Vue de compatibilité : (textes, métadonnées) comme `create_chunks_with_metadata`."""
+        return self.texts, self.metadatas()
+
+    @classmethod
+    def concat(cls, tables: list) -> "ChunkTable":
+        """Recolle plusieurs tables dans l'ordre, en décalant les références aux événements."""
+        offsets = np.cumsum([0] + [len(t.events) for t in tables[:-1]])
+        return cls(
+            texts=[text for t in tables for text in t.texts],
+            event_index=np.concatenate([t.event_index + offset for t, offset in zip(tables, offsets)]).astype(np.int32),
+            chunk_number=np.concatenate([t.chunk_number for t in tables]).astype(np.int32),
+            events=[event for t in tables for event in t.events],
+            event_keys=[key for t in tables for key in t.event_keys],
+        )
+
+
+def build_chunk_table(df: pd.DataFrame, chunk_size: int = 1000, chunk_overlap: int = 100) -> ChunkTable:
+    """Divise les textes en chunks et retourne une `ChunkTable` (métadonnées une fois par événement)."""
+
     # Initialisation du "découpeur" de texte de LangChain
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
@@ -146,44 +269,123 @@ def create_chunks_with_metadata(df: pd.DataFrame, chunk_size: int = 1000, chunk_
         separators=["\n\n", "\n", ". ", " ", ""]
     )
 
-    # 1. Préparation : on crée deux listes vides pour stocker les résultats
-    all_chunks_text = []
-    all_chunks_metadata = []
-
-    # On définit explicitement les colonnes de métadonnées utiles pour le filtrage et l'affichage.
-    useful_metadata_columns = [
-        'id', 'titre', 'date_debut', 'date_fin', 'ville', 
-        'code_postal', 'adresse', 'lieu', 'mots_cles', 'url'
-    ]
-    # On s'assure de ne garder que celles qui existent réellement dans le DataFrame
-    metadata_columns = [col for col in useful_metadata_columns if col in df.columns]
+    # On s'assure de ne garder que les colonnes de métadonnées qui existent réellement
+    metadata_columns = [col for col in USEFUL_METADATA_COLUMNS if col in df.columns]
 
-    print("-> Création des chunks et des métadonnées associées...")
+    # Les métadonnées sont extraites colonne par colonne, une seule fois par événement
+    events = df[metadata_columns].to_dict('records')
+    # Identifiant utilisé dans les chunk_id : la colonne 'id', sinon l'index
+    event_keys = df['id'].tolist() if 'id' in df.columns else df.index.tolist()
 
-    # 2. On parcourt le DataFrame ligne par ligne (événement par événement)
-    for index, row in df.iterrows():
-        
-        # On découpe le texte de l'événement en plusieurs parties (chunks)
-        text_to_split = row['texte_complet']
+    # On découpe le texte de chaque événement en plusieurs parties (chunks)
+    texts = []
+    chunks_per_event = np.zeros(len(df), dtype=np.int32)
+    for position, text_to_split in enumerate(df['texte_complet'].tolist()):
         chunks = text_splitter.split_text(text_to_split)
+        texts.extend(chunks)
+        chunks_per_event[position] = len(chunks)
 
-        # 3. Pour chaque chunk créé, on prépare son "étiquette" de métadonnées
-        for i, chunk_text in enumerate(chunks):
-            
-            # On ajoute le texte du chunk à notre liste de textes
-            all_chunks_text.append(chunk_text)
-            
-            # On crée le dictionnaire de métadonnées en copiant les infos de l'événement
-            metadata = {col: row[col] for col in metadata_columns}
-            
-            # On y ajoute des informations spécifiques au chunk
-            metadata['chunk_id'] = f"{row.get('id', index)}_{i}"
-            metadata['source'] = 'openagenda'
-            
-            # On ajoute cette "étiquette" à notre liste de métadonnées
-            all_chunks_metadata.append(metadata)
-
-    print(f"-> Division en {len(all_chunks_text)} chunks terminée.")
-    
-    # 4. On retourne les deux listes : une avec les textes, l'autre avec leurs métadonnées
-    return all_chunks_text, all_chunks_metadata
\ No newline at end of file
+    # Pour chaque chunk : la position de son événement et son rang dans celui-ci
+    event_index = np.repeat(np.arange(len(df), dtype=np.int32), chunks_per_event)
+    first_chunk = np.cumsum(chunks_per_event) - chunks_per_event
+    chunk_number = (np.arange(len(texts), dtype=np.int32) - np.repeat(first_chunk, chunks_per_event)).astype(np.int32)
+
+    return ChunkTable(texts, event_index, chunk_number, events, event_keys)
+
+
+def create_chunks_with_metadata(df: pd.DataFrame, chunk_size: int = 1000, chunk_overlap: int = 100):
+    """Divise les textes en chunks et associe à chacun ses métadonnées."""
+    logger.debug("-> Création des chunks et des métadonnées associées...")
+
+    all_chunks_text, all_chunks_metadata = build_chunk_table(df, chunk_size, chunk_overlap).to_lists()
+
+    logger.info("-> Division en %d chunks terminée.", len(all_chunks_text))
+
+    # On retourne les deux listes : une avec les textes, l'autre avec leurs métadonnées
+    return all_chunks_text, all_chunks_metadata
+
+
+def _split_in_shards(df: pd.DataFrame, n_workers: int) -> list:
+    """
+    Découpe le DataFrame en tranches contiguës, en conservant l'index d'origine
+    (utilisé pour les `chunk_id` quand la colonne 'id' est absente).
+    On prévoit plusieurs tranches par processus pour mieux répartir la charge.
+    """
+    n_shards = min(len(df), n_workers * 4)
+    return [df.iloc[positions] for positions in np.array_split(np.arange(len(df)), n_shards)]
+
+
+def _process_pool(n_workers: int) -> ProcessPoolExecutor:
+    # 'spawn' : un fork d'un processus multi-thread (ex: l'API) peut se bloquer
+    return ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def clean_df_parallel(df: pd.DataFrame, n_workers: int) -> pd.DataFrame:
+    """
+    Version multiprocessus de `clean_df` : chaque tranche est nettoyée dans un
+    processus séparé, puis les résultats sont recollés dans l'ordre d'origine.
+    Le résultat est identique à celui de `clean_df(df)`.
+    """
+    if n_workers <= 1 or len(df) < 2:
+        return clean_df(df)
+
+    with _process_pool(n_workers) as executor:
+        cleaned_shards = list(executor.map(clean_df, _split_in_shards(df, n_workers)))
+    return pd.concat(cleaned_shards, ignore_index=True)
+
+
+def create_chunks_parallel(df: pd.DataFrame, n_workers: int, chunk_size: int = 1000, chunk_overlap: int = 100):
+    """
+    Version multiprocessus de `create_chunks_with_metadata`. `executor.map`
+    conserve l'ordre des tranches : les listes fusionnées (et les `chunk_id`)
+    sont identiques à celles du traitement en série.
+    """
+    if n_workers <= 1 or len(df) < 2:
+        return create_chunks_with_metadata(df, chunk_size, chunk_overlap)
+
+    with _process_pool(n_workers) as executor:
+        shards = _split_in_shards(df, n_workers)
+        # Les processus renvoient des ChunkTable : les métadonnées ne transitent qu'une fois par événement
+        tables = list(executor.map(build_chunk_table, shards, repeat(chunk_size), repeat(chunk_overlap)))
+    return ChunkTable.concat(tables).to_lists()
+
+
+def stream_chunks(pages, batch_size: int = 1000, min_chars: int = 200,
+                  chunk_size: int = 1000, chunk_overlap: int = 100, fingerprints: dict | None = None):
+    """
+    Transforme un flux de pages d'événements bruts en lots de chunks.
+
+    Les événements sont accumulés jusqu'à `batch_size`, puis nettoyés,
+    filtrés, dédoublonnés (y compris avec les lots précédents) et découpés.
+    Seul le lot en cours est en mémoire : la consommation reste stable
+    quelle que soit la taille de la région.
+
+    Args:
+        pages: Itérable de listes d'événements (ex: `iter_event_pages`).
+        fingerprints (dict, optional): Reçoit l'empreinte du texte de chaque
+            événement gardé (voir `event_fingerprints`).
+
+    Yields:
+        tuple: (textes des chunks, métadonnées des chunks) pour chaque lot.
+    """
+    seen_fingerprints = set()
+    buffer = []
+
+    def process(events):
+        df_final = filter_and_dedup(clean_df(list_to_df(events)), min_chars, seen_fingerprints)
+        if fingerprints is not None:
+            fingerprints.update(event_fingerprints(df_final))
+        return create_chunks_with_metadata(df_final, chunk_size, chunk_overlap)
+
+    for page in pages:
+        buffer.extend(page)
+        if len(buffer) >= batch_size:
+            chunks, metadatas = process(buffer)
+            buffer = []
+            if chunks:
+                yield chunks, metadatas
+
+    if buffer:
+        chunks, metadatas = process(buffer)
+        if chunks:
+            yield chunks, metadatas
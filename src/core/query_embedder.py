@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from langchain_core.embeddings import Embeddings
+from .observability import QUERY_EMBEDDING_CACHE_LOOKUPS
+
+
+class _LoopState:
+    """Requêtes en vol et micro-lot en attente, propres à une boucle d'événements."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.inflight = {}  # texte -> asyncio.Future
+        self.pending = []  # textes du prochain micro-lot
+        self.flush_handle = None
+        self.tasks = set()
+
+
+class QueryEmbedder(Embeddings):
+    """
+    Frontal d'embedding pour les questions, à placer devant le retriever.
+
+    - Cache LRU en mémoire question -> vecteur (`max_size` entrées).
+    - Coalescence : des demandes identiques en vol ne déclenchent qu'un seul
+      appel au modèle, les suivantes attendent son résultat.
+    - Micro-lots (chemin asynchrone) : des questions distinctes arrivées à
+      moins de `batch_window` secondes d'intervalle partent ensemble dans un
+      seul appel `aembed_documents` (au plus `max_batch_size` textes).
+
+    Suppose que le modèle embedde une question comme un document, ce qui est
+    le cas de mistral-embed. Les documents sont transmis tels quels au modèle.
+    """
+
+    def __init__(self, embedding_model, max_size: int = 10_000, batch_window: float = 0.005, max_batch_size: int = 64):
+        self.embedding_model = embedding_model
+        self.max_size = max_size
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread_inflight = {}  # texte -> concurrent.futures.Future
+        self._loop_states = weakref.WeakKeyDictionary()
+        self.stats = {"hits": 0, "coalesced": 0, "upstream_calls": 0, "upstream_texts": 0}
+
+    # --- Cache LRU ---
+
+    def _get_cached(self, text: str):
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.stats["hits"] += 1
+        QUERY_EMBEDDING_CACHE_LOOKUPS.inc(result="miss" if vector is None else "hit")
+        return vector
+
+    def _put_cached(self, text: str, vector) -> None:
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def _count_upstream(self, n_texts: int) -> None:
+        with self._lock:
+            self.stats["upstream_calls"] += 1
+            self.stats["upstream_texts"] += n_texts
+
+    # --- Chemin synchrone : cache + coalescence entre threads ---
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = self._get_cached(text)
+        if vector is not None:
+            return vector
+
+        with self._lock:
+            future = self._thread_inflight.get(text)
+            owner = future is None
+            if owner:
+                future = self._thread_inflight[text] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            self._count_upstream(1)
+            vector = self.embedding_model.embed_query(text)
+            self._put_cached(text, vector)
+            future.set_result(vector)
+            return vector
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._thread_inflight[text]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embedding_model.embed_documents(texts)
+
+    # --- Chemin asynchrone : cache + coalescence + micro-lots ---
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vector = self._get_cached(text)
+        if vector is not None:
+            return vector
+
+        state = self._loop_state()
+        future = state.inflight.get(text)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            future = state.inflight[text] = state.loop.create_future()
+            state.pending.append(text)
+            if len(state.pending) >= self.max_batch_size:
+                self._flush(state)
+            elif state.flush_handle is None:
+                state.flush_handle = state.loop.call_later(self.batch_window, self._flush, state)
+        # shield : l'annulation d'un appelant ne doit pas annuler le lot des autres
+        return await asyncio.shield(future)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.embedding_model.aembed_documents(texts)
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embedde un lot de questions : celles en cache sont servies directement,
+        les autres (dédoublonnées) partent en un seul appel `aembed_documents`.
+        """
+        vectors = [self._get_cached(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            self._count_upstream(len(missing))
+            new_vectors = dict(zip(missing, await self.embedding_model.aembed_documents(missing)))
+            for text, vector in new_vectors.items():
+                self._put_cached(text, vector)
+            vectors = [new_vectors[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def _loop_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loop_states.get(loop)
+        if state is None:
+            state = self._loop_states[loop] = _LoopState(loop)
+        return state
+
+    def _flush(self, state: _LoopState) -> None:
+        if state.flush_handle is not None:
+            state.flush_handle.cancel()
+            state.flush_handle = None
+        texts, state.pending = state.pending, []
+        if texts:
+            task = state.loop.create_task(self._embed_batch(state, texts))
+            state.tasks.add(task)
+            task.add_done_callback(state.tasks.discard)
+
+    async def _embed_batch(self, state: _LoopState, texts: list[str]) -> None:
+        try:
+            self._count_upstream(len(texts))
+            vectors = await self.embedding_model.aembed_documents(texts)
+        except Exception as e:
+            for text in texts:
+                future = state.inflight.pop(text)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, vector in zip(texts, vectors):
+            self._put_cached(text, vector)
+            future = state.inflight.pop(text)
+            if not future.done():
+                future.set_result(vector)
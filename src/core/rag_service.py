@@ -1,56 +1,418 @@
+import asyncio
+import logging
+import math
+import os
+import threading
 from .embedding import get_embedding_model
 from .faiss_manager import load_faiss_index
-from .chatbot import create_rag_chain, create_prompt_template
+from .chatbot import create_rag_chain, create_prompt_template, create_llm, create_generation_chain
+from .context_builder import ContextBuilder, DEFAULT_CONTEXT_TOKENS
 from .pipeline import run_indexing_pipeline
+from .index_registry import IndexRegistry
+from .jobs import RebuildJobManager
+from .retrieval import EventRetriever, load_metadata_index, load_bm25_index
+from .metadata_index import SearchFilters
+from .answer_cache import AnswerCache
+from .query_embedder import QueryEmbedder
+from .reranker import create_reranker
+from .observability import span, INDEX_CHUNKS, INDEX_VERSION, INDEX_LOADS
+
+logger = logging.getLogger(__name__)
+
+# Métadonnées d'un chunk renvoyées au client comme "source" d'une réponse
+SOURCE_FIELDS = ['titre', 'date_debut', 'date_fin', 'lieu', 'ville', 'url', 'chunk_id']
+
+
+def _int_from_env(name: str) -> int | None:
+    """Lit un entier optionnel dans les variables d'environnement."""
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def _json_safe(value):
+    # Les valeurs manquantes de pandas (NaN) ne sont pas du JSON valide
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def _float_from_env(name: str) -> float | None:
+    """Lit un réel optionnel dans les variables d'environnement."""
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+def create_answer_cache() -> AnswerCache:
+    """
+    Cache de réponses configuré par l'environnement : ANSWER_CACHE_SIZE (1000),
+    ANSWER_CACHE_TTL en secondes (3600) et ANSWER_CACHE_SIMILARITY, le seuil
+    de similarité cosinus du niveau sémantique (0.95 ; une valeur > 1 le désactive).
+    """
+    threshold = _float_from_env("ANSWER_CACHE_SIMILARITY")
+    threshold = 0.95 if threshold is None else threshold
+    return AnswerCache(
+        max_entries=_int_from_env("ANSWER_CACHE_SIZE") or 1000,
+        ttl_seconds=_float_from_env("ANSWER_CACHE_TTL") or 3600,
+        similarity_threshold=threshold if threshold <= 1 else None
+    )
+
+
+def filters_scope(filters: SearchFilters | None) -> str | None:
+    """
+    Portée d'une réponse dans le cache sémantique (voir `AnswerCache`) : deux
+    questions proches mais de filtres différents (ville, département,
+    période) n'appellent pas la même réponse.
+    """
+    return None if filters is None or filters.is_empty() else str(filters)
+
+
+def describe_sources(docs) -> list[dict]:
+    """Résume les documents récupérés (un dictionnaire de métadonnées par chunk)."""
+    return [{field: _json_safe(doc.metadata.get(field)) for field in SOURCE_FIELDS} for doc in docs]
+
 
 class RAGService:
     """
     Service encapsulant la logique RAG pour une utilisation facile par l'API.
     Charge les modèles au démarrage et les garde en mémoire.
     """
-    def __init__(self):
-        print("Initialisation du RAG Service...")
+    def __init__(
+            self,
+            max_concurrency: int | None = None,
+            load: bool = True,
+            answer_cache: AnswerCache | None = None,
+            index_path: str = "data/faiss_index",
+            embedding_model=None,
+            llm=None
+        ):
+        """
+        Args:
+            max_concurrency (int | None): Nombre maximum de questions traitées
+                en même temps par `aask` (par défaut : variable RAG_MAX_CONCURRENCY, ou 16).
+            load (bool): Si False, les composants ne sont pas chargés (tests, benchmarks).
+            answer_cache (AnswerCache | None): Cache des réponses (par défaut : `create_answer_cache()`).
+            index_path (str): Dossier racine de l'index (voir `IndexRegistry`).
+            embedding_model: Modèle d'embedding à utiliser à la place de
+                `get_embedding_model()` (benchmarks hors ligne).
+            llm: Modèle de chat à utiliser à la place de `create_llm` (benchmarks hors ligne).
+        """
+        logger.info("Initialisation du RAG Service...")
+        self.index_path = index_path
+        self.index_version = None
+        self._embedding_model_override = embedding_model
+        self._llm_override = llm
+        self._swap_lock = threading.Lock()
         self.embedding_model = None
+        self.query_embedder = None
+        self.vectorstore = None
+        self.retriever = None
+        self.generation_chain = None
         self.rag_chain = None
-        self.load_components()
-        print("RAG Service prêt.")
+        self.max_concurrency = max_concurrency or _int_from_env("RAG_MAX_CONCURRENCY") or 16
+        self._semaphore = None
+        self._semaphore_loop = None
+        self.answer_cache = answer_cache or create_answer_cache()
+        # Contexte du prompt limité en tokens (variable CONTEXT_MAX_TOKENS)
+        self.build_context = ContextBuilder(max_tokens=_int_from_env("CONTEXT_MAX_TOKENS") or DEFAULT_CONTEXT_TOKENS)
+        # Reranking optionnel des candidats (variables RERANKER et RERANK_TIME_BUDGET, en secondes),
+        # créé une seule fois : un modèle local reste chargé d'une version de l'index à l'autre
+        self.reranker = create_reranker(os.getenv("RERANKER"), _float_from_env("RERANK_TIME_BUDGET"))
+        if load:
+            self.load_components()
+        logger.info("RAG Service prêt.")
+
+    def load_components(self) -> bool:
+        """
+        Charge la version courante de l'index FAISS et construit la chaîne RAG.
+
+        Les nouveaux composants sont entièrement construits avant d'être
+        substitués aux anciens, d'un seul coup et sous verrou : une question
+        en cours termine sur l'ancien index, les suivantes utilisent le
+        nouveau. Si le chargement échoue, les anciens composants restent en place.
 
-    def load_components(self):
-        """Charge l'index FAISS et construit la chaîne RAG."""
+        Returns:
+            bool: True si les composants ont été (re)chargés.
+        """
         try:
-            self.embedding_model = get_embedding_model()
-            # 1. Charger le retriever
-            vectorstore = load_faiss_index(self.embedding_model)
-            retriever = vectorstore.as_retriever(search_kwargs={'k': 3})
+            embedding_model = self._embedding_model_override or get_embedding_model()
+            # Les questions passent par un cache LRU qui regroupe aussi les appels simultanés ;
+            # ses vecteurs restent valables d'une version de l'index à l'autre
+            query_embedder = self.query_embedder or QueryEmbedder(embedding_model)
+            # 1. Charger le retriever (projeté en mémoire, réglage optionnel des index approximatifs)
+            registry = IndexRegistry(self.index_path)
+            version, index_path = registry.current_version(), registry.current_path()
+            vectorstore = load_faiss_index(
+                query_embedder,
+                index_path,
+                nprobe=_int_from_env("FAISS_NPROBE"),
+                ef_search=_int_from_env("FAISS_EF_SEARCH"),
+                mmap=True
+            )
+            # Recherche hybride (vecteurs + BM25), pré-filtrée par ville, département et période
+            retriever = EventRetriever(
+                vectorstore=vectorstore,
+                metadata_index=load_metadata_index(vectorstore, index_path),
+                bm25=load_bm25_index(vectorstore, index_path),
+                reranker=self.reranker,
+                k=3
+            )
             # 2. Créer le prompt
             prompt = create_prompt_template()
-            # 3. Créer la chaîne RAG
-            self.rag_chain = create_rag_chain(retriever, prompt, self.embedding_model)
-            print("Composants RAG chargés avec succès.")
+            # 3. Créer la chaîne RAG (et sa partie "génération", pour le streaming)
+            llm = self._llm_override or create_llm(embedding_model.mistral_api_key)
+            generation_chain = create_generation_chain(prompt, llm)
+            rag_chain = create_rag_chain(retriever, prompt, embedding_model, llm=llm, context_builder=self.build_context)
         except Exception as e:
-            print(f"Erreur lors du chargement des composants RAG : {e}")
-            print("Veuillez d'abord construire l'index avec 'build_index.py'.")
-            self.rag_chain = None
+            INDEX_LOADS.inc(result="failure")
+            logger.error("Erreur lors du chargement des composants RAG : %s", e)
+            if self.rag_chain is None:
+                logger.error("Veuillez d'abord construire l'index avec 'build_index.py'.")
+            else:
+                logger.warning("La version précédente de l'index (%s) reste en service.", self.index_version)
+            return False
+
+        with self._swap_lock:
+            self.embedding_model = embedding_model
+            self.query_embedder = query_embedder
+            self.vectorstore = vectorstore
+            self.retriever = retriever
+            self.generation_chain = generation_chain
+            self.rag_chain = rag_chain
+            self.index_version = version
+            # Les réponses en cache ont été produites avec l'ancien index
+            self.answer_cache.clear()
+        INDEX_LOADS.inc(result="success")
+        INDEX_CHUNKS.set(vectorstore.index.ntotal)
+        INDEX_VERSION.clear()
+        INDEX_VERSION.set(1, version=version or "non versionnée")
+        logger.info("Composants RAG chargés avec succès (version de l'index : %s).", version or "non versionnée")
+        return True
 
     def ask(self, question: str) -> str:
         """Pose une question à la chaîne RAG."""
-        if not self.rag_chain:
+        rag_chain = self.rag_chain
+        if not rag_chain:
+            return "Erreur : Le système RAG n'est pas initialisé. Veuillez d'abord construire l'index."
+
+        semantic = self._semantic_cache_enabled()
+        cached = self.answer_cache.get(question, exact_only=not semantic)
+        vector = scope = None
+        if cached is None and semantic:
+            vector, scope = self.query_embedder.embed_query(question), self._cache_scope(question)
+            cached = self.answer_cache.get_similar(vector, scope)
+        if cached is not None:
+            logger.debug("Réponse trouvée en cache pour la question : %r", question)
+            return cached
+
+        logger.debug("Interrogation de la chaîne RAG avec la question : %r", question)
+        answer = rag_chain.invoke(question)
+        self._cache_answer(rag_chain, question, answer, vector, scope)
+        return answer
+
+    async def aask(self, question: str, filters: SearchFilters | None = None) -> str:
+        """
+        Version asynchrone de `ask` : la chaîne est exécutée avec `ainvoke`
+        (embedding de la question, recherche et appel au LLM sans bloquer la
+        boucle d'événements). Au plus `max_concurrency` questions sont
+        traitées simultanément, les suivantes attendent leur tour.
+        Les réponses en cache (voir `AnswerCache`) sont servies sans attendre.
+
+        `filters` restreint la recherche (ville, département, période) en plus
+        des critères que le retriever déduit de la question.
+        """
+        rag_chain = self.rag_chain
+        if not rag_chain:
             return "Erreur : Le système RAG n'est pas initialisé. Veuillez d'abord construire l'index."
+        if filters is not None and not filters.is_empty():
+            return await self._aask_filtered(question, filters)
+
+        semantic = self._semantic_cache_enabled()
+        cached = self.answer_cache.get(question, exact_only=not semantic)
+        vector = scope = None
+        if cached is None and semantic:
+            vector, scope = await self.query_embedder.aembed_query(question), self._cache_scope(question)
+            cached = self.answer_cache.get_similar(vector, scope)
+        if cached is not None:
+            logger.debug("Réponse trouvée en cache pour la question : %r", question)
+            return cached
+
+        logger.debug("Interrogation asynchrone de la chaîne RAG avec la question : %r", question)
+        async with self._get_semaphore():
+            answer = await rag_chain.ainvoke(question)
+        self._cache_answer(rag_chain, question, answer, vector, scope)
+        return answer
+
+    async def _aask_filtered(self, question: str, filters: SearchFilters) -> str:
+        """Variante de `aask` avec des filtres explicites : recherche filtrée, puis génération."""
+        with self._swap_lock:
+            rag_chain, retriever, generation_chain = self.rag_chain, self.retriever, self.generation_chain
+        # Une même question avec d'autres filtres appelle une autre réponse ; pas de cache sémantique ici
+        cache_key = f"{question}\n{filters}"
+        cached = self.answer_cache.get(cache_key, exact_only=True)
+        if cached is not None:
+            logger.debug("Réponse trouvée en cache pour la question : %r (%s)", question, filters)
+            return cached
+
+        logger.debug("Interrogation filtrée de la chaîne RAG avec la question : %r (%s)", question, filters)
+        async with self._get_semaphore():
+            docs = await retriever.asearch(question, filters)
+            answer = await generation_chain.ainvoke({"context": self.build_context(docs), "question": question})
+        self._cache_answer(rag_chain, cache_key, answer, None)
+        return answer
+
+    async def ask_many(self, questions: list[str]) -> list[dict]:
+        """
+        Répond à un lot de questions, pour les traitements de masse :
+          1. les questions déjà en cache sont servies directement ;
+          2. les autres sont embeddées en un seul appel au modèle ;
+          3. une seule recherche FAISS est faite sur la matrice des questions
+             (sauf pour les questions qui appellent un pré-filtrage, voir `EventRetriever`) ;
+          4. les générations sont lancées en parallèle, dans la limite du
+             même sémaphore que `aask`.
+
+        Returns:
+            list[dict]: Un résultat par question, dans l'ordre :
+            {"question", "answer", "error"} (`error` vaut None en cas de succès).
+        """
+        results = [{"question": question, "answer": None, "error": None} for question in questions]
+        # Tout le lot est traité avec la même version de l'index, même si elle est remplacée entre-temps
+        with self._swap_lock:
+            rag_chain, vectorstore, retriever = self.rag_chain, self.vectorstore, self.retriever
+            generation_chain, query_embedder = self.generation_chain, self.query_embedder
+        if not rag_chain or vectorstore is None:
+            for result in results:
+                result["error"] = "Le système RAG n'est pas initialisé. Veuillez d'abord construire l'index."
+            return results
+
+        to_generate = []
+        for i, question in enumerate(questions):
+            if not question or not question.strip():
+                results[i]["error"] = "La question ne peut pas être vide."
+                continue
+            cached = self.answer_cache.get(question, exact_only=True)
+            if cached is not None:
+                results[i]["answer"] = cached
+            else:
+                to_generate.append(i)
+        if not to_generate:
+            return results
+
+        logger.info("Interrogation groupée de la chaîne RAG : %d questions sur %d.", len(to_generate), len(questions))
+        pending = [questions[i] for i in to_generate]
+        try:
+            with span("embed_query"):
+                vectors = await query_embedder.aembed_queries(pending)
+            filters = [retriever.filters_for(question) for question in pending]
+            docs_per_question = await asyncio.to_thread(retriever.search_many, vectors, filters, pending)
+        except Exception as e:
+            for i in to_generate:
+                results[i]["error"] = f"Échec de la recherche : {e}"
+            return results
 
-        print(f"Interrogation de la chaîne RAG avec la question : '{question}'")
-        return self.rag_chain.invoke(question)
+        async def generate(question, docs):
+            async with self._get_semaphore():
+                return await generation_chain.ainvoke({"context": self.build_context(docs), "question": question})
+
+        answers = await asyncio.gather(
+            *(generate(question, docs) for question, docs in zip(pending, docs_per_question)),
+            return_exceptions=True
+        )
+        for i, question, vector, question_filters, answer in zip(to_generate, pending, vectors, filters, answers):
+            if isinstance(answer, Exception):
+                results[i]["error"] = str(answer)
+            else:
+                results[i]["answer"] = answer
+                self._cache_answer(rag_chain, question, answer, vector, filters_scope(question_filters))
+        return results
+
+    async def astream(self, question: str, filters: SearchFilters | None = None):
+        """
+        Variante en streaming de `aask` (mêmes `filters`). Produit des événements (dictionnaires) :
+          - {"type": "sources", "sources": [...]} dès que les documents sont récupérés ;
+          - {"type": "token", "content": "..."} pour chaque fragment de la réponse ;
+          - {"type": "done"} à la fin, ou {"type": "error", "detail": "..."} en cas d'échec.
+        """
+        with self._swap_lock:
+            retriever, generation_chain = self.retriever, self.generation_chain
+        if not retriever or not generation_chain:
+            yield {"type": "error", "detail": "Le système RAG n'est pas initialisé. Veuillez d'abord construire l'index."}
+            return
+
+        logger.debug("Interrogation en streaming de la chaîne RAG avec la question : %r", question)
+        async with self._get_semaphore():
+            try:
+                if filters is not None and not filters.is_empty():
+                    docs = await retriever.asearch(question, filters)
+                else:
+                    docs = await retriever.ainvoke(question)
+                yield {"type": "sources", "sources": describe_sources(docs)}
+                async for token in generation_chain.astream({"context": self.build_context(docs), "question": question}):
+                    yield {"type": "token", "content": token}
+            except Exception as e:
+                logger.error("Erreur pendant le streaming de la réponse : %s", e)
+                yield {"type": "error", "detail": str(e)}
+                return
+        yield {"type": "done"}
+
+    def _cache_answer(self, rag_chain, question: str, answer: str, vector, scope=None) -> None:
+        # Une réponse produite par un index qui vient d'être remplacé n'est pas mise en cache
+        if rag_chain is self.rag_chain:
+            self.answer_cache.put(question, answer, vector, scope)
+
+    def _cache_scope(self, question: str) -> str | None:
+        """Portée d'une question pour le cache sémantique : les filtres que le retriever en déduit."""
+        retriever = self.retriever
+        return filters_scope(retriever.filters_for(question) if retriever is not None else None)
+
+    def _semantic_cache_enabled(self) -> bool:
+        return self.answer_cache.semantic and self.query_embedder is not None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Un sémaphore asyncio est lié à une boucle d'événements : on en crée un par boucle
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
 
     def rebuild_index(self):
-        """Lance la reconstruction de l'index et recharge les composants."""
-        print("Début de la reconstruction de l'index...")
-        success = run_indexing_pipeline()
-        if success:
-            print("Reconstruction terminée. Rechargement des composants...")
-            self.load_components()
-            return "Index reconstruit et rechargé avec succès."
-        else:
+        """
+        Construit une nouvelle version de l'index puis la met en service sans
+        interruption : les questions continuent d'être servies par l'ancienne
+        version pendant toute la reconstruction.
+
+        La reconstruction s'exécute dans le processus courant ; l'API passe
+        plutôt par `RebuildJobManager`, qui l'isole dans un processus séparé.
+        """
+        logger.info("Début de la reconstruction de l'index...")
+        success = run_indexing_pipeline(index_path=self.index_path)
+        if not success:
             return "Erreur lors de la reconstruction de l'index."
+        logger.info("Reconstruction terminée. Rechargement des composants...")
+        if not self.load_components():
+            return "Index reconstruit, mais son chargement a échoué : l'ancienne version reste en service."
+        return "Index reconstruit et rechargé avec succès."
+
+    def rollback_index(self) -> str:
+        """
+        Revient à la version précédente de l'index (conservée sur disque) et la recharge.
+
+        Raises:
+            ValueError: S'il n'existe pas de version antérieure.
+            RuntimeError: Si la version antérieure ne peut pas être chargée.
+        """
+        registry = IndexRegistry(self.index_path)
+        current = registry.current_version()
+        version = registry.rollback()
+        logger.info("Retour à la version %s de l'index...", version)
+        if not self.load_components():
+            # La version servie reste la version courante sur disque
+            registry.set_current(current)
+            raise RuntimeError(f"La version {version} de l'index n'a pas pu être chargée.")
+        return version
 
 # Créer une instance unique (Singleton) qui sera importée par l'API
 # C'est ce qui garantit que les modèles ne sont chargés qu'UNE SEULE FOIS.
-rag_service = RAGService()
\ No newline at end of file
+rag_service = RAGService()
+
+# Les reconstructions lancées par l'API tournent dans un processus séparé ;
+# le nouvel index est mis en service dès qu'il est prêt
+rebuild_jobs = RebuildJobManager(index_path=rag_service.index_path, on_ready=rag_service.load_components)
\ No newline at end of file
@@ -0,0 +1,138 @@
+import logging
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+from .bm25 import tokenize
+from .metadata_index import SearchFilters, normalize_name, to_day
+
+logger = logging.getLogger(__name__)
+
+
+class NoOpReranker:
+    """Pas de reranking : les `k` premiers candidats sont gardés dans l'ordre du retriever."""
+    # Le retriever n'élargit sa recherche que pour un reranker actif
+    active = False
+
+    def rerank(self, question: str, docs: list, k: int, filters: SearchFilters | None = None) -> list:
+        return list(docs[:k])
+
+
+class Reranker(NoOpReranker, ABC):
+    """
+    Base des rerankers : les candidats sont rescorés par lots (`score_batch`),
+    dans l'ordre du retriever, tant que le budget de temps `time_budget` (en
+    secondes) n'est pas dépassé. Les candidats non rescorés à l'échéance
+    gardent leur rang, derrière ceux qui l'ont été : la latence ajoutée est
+    bornée par le budget plus la durée d'un lot.
+    """
+
+    active = True
+
+    def __init__(self, time_budget: float = 0.05, batch_size: int = 16):
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+
+    @abstractmethod
+    def score_batch(self, question: str, docs: list, ranks: np.ndarray, filters: SearchFilters | None) -> np.ndarray:
+        """Scores d'un lot de candidats (plus grand = plus pertinent) ; `ranks` : leurs rangs d'origine."""
+
+    def rerank(self, question: str, docs: list, k: int, filters: SearchFilters | None = None) -> list:
+        if len(docs) <= 1:
+            return list(docs[:k])
+        deadline = time.perf_counter() + self.time_budget
+        scores = []
+        for start in range(0, len(docs), self.batch_size):
+            if scores and time.perf_counter() > deadline:
+                break
+            batch = docs[start:start + self.batch_size]
+            scores.append(np.asarray(self.score_batch(question, batch, np.arange(start, start + len(batch)), filters), dtype=np.float32))
+        scores = np.concatenate(scores)
+        ranked = [docs[i] for i in np.argsort(-scores, kind="stable")] + list(docs[len(scores):])
+        return ranked[:k]
+
+
+class FeatureReranker(Reranker):
+    """
+    Reranker sans modèle, par combinaison linéaire de caractéristiques
+    calculées pour tout un lot de candidats :
+      - `rank` : rang donné par le retriever (1 / (1 + rang)) ;
+      - `lexical` : part des termes de la question présents dans le chunk ;
+      - `date` : l'événement chevauche la période demandée (0.5 sans période ou sans date) ;
+      - `city` : l'événement a lieu dans la ville demandée (0.5 sans ville demandée).
+    """
+    FEATURES = ("rank", "lexical", "date", "city")
+    DEFAULT_WEIGHTS = {"rank": 1.0, "lexical": 1.0, "date": 0.5, "city": 0.5}
+
+    def __init__(self, weights: dict | None = None, time_budget: float = 0.05, batch_size: int = 64):
+        super().__init__(time_budget=time_budget, batch_size=batch_size)
+        weights = {**self.DEFAULT_WEIGHTS, **(weights or {})}
+        self.weights = np.array([weights[name] for name in self.FEATURES], dtype=np.float32)
+
+    def features(self, question: str, docs: list, ranks: np.ndarray, filters: SearchFilters | None) -> np.ndarray:
+        """Matrice (candidats x `FEATURES`)."""
+        features = np.full((len(docs), len(self.FEATURES)), 0.5, dtype=np.float32)
+        features[:, 0] = 1.0 / (1.0 + ranks)
+
+        terms = set(tokenize(question))
+        if terms:
+            features[:, 1] = [len(terms.intersection(tokenize(doc.page_content))) / len(terms) for doc in docs]
+
+        if filters is not None and (filters.date_from is not None or filters.date_to is not None):
+            starts = np.array([to_day(doc.metadata.get("date_debut")) for doc in docs], dtype="datetime64[D]")
+            ends = np.array([to_day(doc.metadata.get("date_fin")) for doc in docs], dtype="datetime64[D]")
+            ends = np.where(np.isnat(ends), starts, ends)
+            overlaps = np.ones(len(docs), dtype=bool)
+            if filters.date_to is not None:
+                overlaps &= starts <= np.datetime64(filters.date_to, "D")
+            if filters.date_from is not None:
+                overlaps &= ends >= np.datetime64(filters.date_from, "D")
+            features[:, 2] = np.where(np.isnat(starts), 0.5, overlaps.astype(np.float32))
+
+        if filters is not None and filters.city is not None:
+            city = normalize_name(filters.city)
+            features[:, 3] = [float(normalize_name(doc.metadata.get("ville") or "") == city) for doc in docs]
+        return features
+
+    def score_batch(self, question, docs, ranks, filters):
+        return self.features(question, docs, ranks, filters) @ self.weights
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Reranker par un cross-encoder local, sur CPU (dépendance optionnelle
+    `sentence-transformers`). Le modèle lit la question et le chunk ensemble :
+    plus précis qu'une similarité d'embeddings, mais plus lent ; d'où les lots
+    et le budget de temps.
+    """
+    DEFAULT_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, time_budget: float = 0.15, batch_size: int = 8):
+        from sentence_transformers import CrossEncoder
+
+        super().__init__(time_budget=time_budget, batch_size=batch_size)
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score_batch(self, question, docs, ranks, filters):
+        return self.model.predict([(question, doc.page_content) for doc in docs], batch_size=self.batch_size)
+
+
+def create_reranker(name: str | None = None, time_budget: float | None = None):
+    """
+    Crée le reranker désigné par `name` : "none" (par défaut), "features" ou
+    "cross-encoder" (suivi éventuellement du nom du modèle : "cross-encoder:<modèle>").
+    Si le cross-encoder ne peut pas être chargé, aucun reranking n'est fait.
+    """
+    name = (name or "none").strip()
+    options = {} if time_budget is None else {"time_budget": time_budget}
+    if name == "features":
+        return FeatureReranker(**options)
+    if name.startswith("cross-encoder"):
+        _, _, model_name = name.partition(":")
+        try:
+            return CrossEncoderReranker(model_name or CrossEncoderReranker.DEFAULT_MODEL, **options)
+        except Exception as e:
+            logger.warning("Cross-encoder indisponible (%s) : pas de reranking.", e)
+            return NoOpReranker()
+    if name != "none":
+        logger.warning("Reranker inconnu '%s' : pas de reranking.", name)
+    return NoOpReranker()
@@ -0,0 +1,215 @@
+import asyncio
+import os
+from dataclasses import replace
+from datetime import date
+from typing import Any
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, AsyncCallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from .metadata_index import MetadataIndex, SearchFilters, search_params, selector_from_mask
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .diversity import collapse_by_event, reconstruct_vectors, maximal_marginal_relevance
+from .observability import span
+
+
+def load_metadata_index(vectorstore, index_path: str | None = None) -> MetadataIndex:
+    """
+    Index des métadonnées d'un vectorstore : lu depuis `metadata_index.npz`
+    s'il a été sauvegardé avec l'index, sinon reconstruit depuis les chunks.
+    """
+    metadata_index = MetadataIndex.load(index_path) if index_path and os.path.isdir(index_path) else None
+    if metadata_index is not None and len(metadata_index) == vectorstore.index.ntotal:
+        return metadata_index
+    docstore, index_to_docstore_id = vectorstore.docstore, vectorstore.index_to_docstore_id
+    return MetadataIndex.from_metadatas(
+        docstore.search(index_to_docstore_id[position]).metadata for position in range(vectorstore.index.ntotal)
+    )
+
+
+def load_bm25_index(vectorstore, index_path: str | None = None) -> BM25Index:
+    """
+    Index BM25 d'un vectorstore : lu depuis `bm25_index.npz` s'il a été
+    sauvegardé avec l'index, sinon construit à partir des textes des chunks.
+    """
+    bm25 = BM25Index.load(index_path) if index_path and os.path.isdir(index_path) else None
+    if bm25 is not None and len(bm25) == vectorstore.index.ntotal:
+        return bm25
+    docstore, index_to_docstore_id = vectorstore.docstore, vectorstore.index_to_docstore_id
+    return BM25Index.build(
+        docstore.search(index_to_docstore_id[position]).page_content for position in range(vectorstore.index.ntotal)
+    )
+
+
+class EventRetriever(BaseRetriever):
+    """
+    Retriever des chunks d'événements, avec pré-filtrage par métadonnées.
+
+    Les filtres (ville, département, période) sont soit explicites, soit
+    déduits de la question (`extract_filters`). Ils sont appliqués pendant
+    la recherche FAISS (voir `MetadataIndex.selector`) : les `k` chunks
+    retournés sont les plus proches parmi ceux qui respectent les filtres.
+    Quand aucun chunk ne les respecte, les filtres déduits de la question
+    sont relâchés (voir `SearchFilters.relaxed`) ; les filtres explicites,
+    eux, peuvent donner une liste vide.
+
+    Avec un index `bm25`, la recherche est hybride : les `candidates`
+    meilleurs chunks de la recherche vectorielle et de la recherche lexicale
+    (qui retrouve les noms propres : lieux, festivals...) sont fusionnés par
+    Reciprocal Rank Fusion.
+
+    Les candidats sont ensuite diversifiés : un seul chunk par événement
+    (`collapse_events`, le mieux classé), puis, si `mmr_lambda` est donné
+    (0.7 par exemple), sélection Maximal Marginal Relevance pour ne pas
+    remplir le contexte d'événements quasi identiques. Désactivée par défaut :
+    une fois les chunks regroupés par événement, elle n'apporte pas
+    d'événements distincts en plus (`benchmarks/bench_event_diversity.py`).
+
+    Avec un `reranker`, les `rerank_pool` meilleurs candidats ainsi
+    sélectionnés sont rescorés à partir du texte de la question (voir
+    `src/core/reranker.py`) et seuls les `k` premiers sont gardés.
+    """
+    vectorstore: Any
+    metadata_index: Any = None
+    bm25: Any = None
+    k: int = 3
+    candidates: int = 20
+    rrf_constant: int = 60
+    extract_filters: bool = True
+    # Date de référence des périodes citées dans les questions ("en mars", "ce week-end") ; aujourd'hui par défaut
+    today: date | None = None
+    collapse_events: bool = True
+    mmr_lambda: float | None = None
+    reranker: Any = None
+    rerank_pool: int = 10
+
+    @property
+    def search_kwargs(self) -> dict:
+        # Même interface que les retrievers de LangChain
+        return {"k": self.k}
+
+    def filters_for(self, question: str, filters: SearchFilters | None = None) -> SearchFilters | None:
+        """Filtres d'une question : les critères explicites priment sur ceux déduits de la question."""
+        if self.metadata_index is None:
+            return None
+        extracted = self.metadata_index.extract_filters(question, self.today) if self.extract_filters else SearchFilters()
+        if filters is None:
+            return extracted
+        explicit = {name: value for name, value in vars(filters).items() if name != "guessed" and value is not None}
+        return replace(extracted, **explicit, guessed=tuple(name for name in extracted.guessed if name not in explicit))
+
+    def search_by_vector(self, vector, filters: SearchFilters | None = None, question: str | None = None) -> list[Document]:
+        return self.search_many([vector], [filters], None if question is None else [question])[0]
+
+    def search_many(self, vectors, filters: list | None = None, questions: list | None = None) -> list[list[Document]]:
+        """
+        Recherche les chunks de plusieurs questions. Les questions sans
+        filtre partagent une seule recherche FAISS ; les autres sont
+        recherchées une à une avec leur sélecteur. Si les `questions` sont
+        fournies et qu'un index BM25 est disponible, la recherche est hybride.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        filters = filters or [None] * len(vectors)
+        rerank = self.reranker is not None and self.reranker.active and questions is not None
+        pool = max(self.k, self.rerank_pool) if rerank else self.k
+        with span("search"):
+            results = self._candidates(vectors, filters, questions, pool)
+        if rerank:
+            with span("rerank"):
+                results = [self.reranker.rerank(q, docs, self.k, f) for q, docs, f in zip(questions, results, filters)]
+        return results
+
+    def _candidates(self, vectors: np.ndarray, filters: list, questions: list | None, pool: int) -> list[list[Document]]:
+        """Les `pool` meilleurs chunks de chaque question : recherche FAISS (et BM25), fusion, diversification."""
+        hybrid = self.bm25 is not None and questions is not None
+        # Une seule recherche FAISS par question, élargie aux candidats à fusionner, diversifier ou rescorer
+        depth = max(pool, self.candidates) if hybrid or self._diversifies else pool
+        index = self.vectorstore.index
+        masks = [self._mask(f) for f in filters]
+        rankings = [None] * len(vectors)
+
+        unfiltered = []
+        for i, mask in enumerate(masks):
+            if mask is None:
+                unfiltered.append(i)
+            elif not mask.any():
+                rankings[i] = []
+            else:
+                selector, bitmap = selector_from_mask(mask)
+                _, indices = index.search(vectors[i:i + 1], depth, params=search_params(index, selector))
+                rankings[i] = indices[0]
+
+        if unfiltered:
+            _, indices = index.search(vectors[unfiltered], depth)
+            for i, row in zip(unfiltered, indices):
+                rankings[i] = row
+
+        results = []
+        for i, ranking in enumerate(rankings):
+            ranking = [position for position in ranking if position != -1]
+            fused = hybrid and (masks[i] is None or masks[i].any())
+            if fused:
+                lexical, _ = self.bm25.search(questions[i], depth, masks[i])
+                ranking = reciprocal_rank_fusion([ranking, lexical], 2 * depth, self.rrf_constant)
+            results.append(self._documents(self._diversify(ranking, vectors[i], fused, pool)))
+        return results
+
+    def _mask(self, filters: SearchFilters | None) -> np.ndarray | None:
+        """
+        Masque des positions qui respectent `filters`. Si aucun chunk ne les
+        respecte, les critères déduits de la question (une ville citée au
+        passage, un mois pris pour la mauvaise année...) sont relâchés plutôt
+        que de ne rien retourner ; les critères explicites restent stricts.
+        """
+        if self.metadata_index is None:
+            return None
+        mask = self.metadata_index.mask(filters)
+        if mask is None or mask.any():
+            return mask
+        for fallback in filters.relaxed():
+            mask = self.metadata_index.mask(fallback)
+            if mask is None or mask.any():
+                return mask
+        return mask
+
+    @property
+    def _diversifies(self) -> bool:
+        return self.mmr_lambda is not None or (self.collapse_events and self.metadata_index is not None)
+
+    def _diversify(self, ranking, vector: np.ndarray, fused: bool, k: int) -> np.ndarray:
+        """Les `k` positions retenues parmi les candidats classés : un chunk par événement, puis MMR."""
+        positions = np.asarray(ranking, dtype=np.int64)
+        if self.collapse_events and self.metadata_index is not None and len(positions):
+            positions = collapse_by_event(positions, self.metadata_index.events)
+        if self.mmr_lambda is None or len(positions) <= k:
+            return positions[:k]
+        candidate_vectors = reconstruct_vectors(self.vectorstore.index, positions)
+        if candidate_vectors is None:
+            return positions[:k]
+        if fused:
+            # Le classement fusionné n'a pas de similarité commune : pertinence dérivée du rang
+            relevance = (self.rrf_constant + 1) / (self.rrf_constant + 1 + np.arange(len(positions)))
+        else:
+            norms = np.linalg.norm(candidate_vectors, axis=1) * max(np.linalg.norm(vector), 1e-12)
+            relevance = candidate_vectors @ vector / np.maximum(norms, 1e-12)
+        return positions[maximal_marginal_relevance(relevance, candidate_vectors, k, self.mmr_lambda)]
+
+    def _documents(self, positions) -> list[Document]:
+        docstore, index_to_docstore_id = self.vectorstore.docstore, self.vectorstore.index_to_docstore_id
+        return [docstore.search(index_to_docstore_id[i]) for i in positions if i != -1]
+
+    def search(self, question: str, filters: SearchFilters | None = None) -> list[Document]:
+        with span("embed_query"):
+            vector = self.vectorstore.embedding_function.embed_query(question)
+        return self.search_by_vector(vector, self.filters_for(question, filters), question)
+
+    async def asearch(self, question: str, filters: SearchFilters | None = None) -> list[Document]:
+        with span("embed_query"):
+            vector = await self.vectorstore.embedding_function.aembed_query(question)
+        return await asyncio.to_thread(self.search_by_vector, vector, self.filters_for(question, filters), question)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        return self.search(query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        return await self.asearch(query)